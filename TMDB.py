@@ -1,4 +1,4 @@
-import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from io import BytesIO
 import os
@@ -9,6 +9,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# --- IMPORT IMAGE ENGINE ---
+from image_engine import STATIC_LAYERS, get_font, open_image
+
 TMDB_BEARER_TOKEN = os.getenv('TMDB_BEARER_TOKEN')
 TMDB_BASE_URL = os.getenv('TMDB_BASE_URL')
 LANGUAGE = os.getenv("TMDB_LANGUAGE")
@@ -64,7 +67,7 @@ truetype_url = 'https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto
 truetype_path = 'Roboto-Light.ttf'
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = http_client.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -78,32 +81,32 @@ if not os.path.exists(truetype_path):
 
 # Fetching genres for movies
 genres_url = f'{TMDB_BASE_URL}/genre/movie/list?language={LANGUAGE}'
-genres_response = requests.get(genres_url, headers=headers)
+genres_response = http_client.get(genres_url, headers=headers)
 genres_data = genres_response.json()
 movie_genres = {genre['id']: genre['name'] for genre in genres_data.get('genres', [])}
 
 # Fetching genres for TV shows
 genres_url = f'{TMDB_BASE_URL}/genre/tv/list?language={LANGUAGE}'
-genres_response = requests.get(genres_url, headers=headers)
+genres_response = http_client.get(genres_url, headers=headers)
 genres_data = genres_response.json()
 tv_genres = {genre['id']: genre['name'] for genre in genres_data.get('genres', [])}
 
 # Fetching TV show details
 def get_tv_show_details(tv_id):
     tv_details_url = f'{TMDB_BASE_URL}/tv/{tv_id}?language={LANGUAGE}'
-    tv_details_response = requests.get(tv_details_url, headers=headers)
+    tv_details_response = http_client.get(tv_details_url, headers=headers)
     return tv_details_response.json()
 
 # Fetching movie details
 def get_movie_details(movie_id):
     movie_details_url = f'{TMDB_BASE_URL}/movie/{movie_id}?language={LANGUAGE}'
-    movie_details_response = requests.get(movie_details_url, headers=headers)
+    movie_details_response = http_client.get(movie_details_url, headers=headers)
     return movie_details_response.json()
 
 # Function to fetch keywords for a movie
 def get_movie_keywords(movie_id):
     keywords_url = f"{TMDB_BASE_URL}/movie/{movie_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
+    response = http_client.get(keywords_url, headers=headers)
     if response.status_code == 200:
         # Extract and return the names of the keywords
         return [keyword['name'].lower() for keyword in response.json().get('keywords', [])]
@@ -112,7 +115,7 @@ def get_movie_keywords(movie_id):
 # Function to fetch keywords for a TV show
 def get_tv_keywords(tv_id):
     keywords_url = f"{TMDB_BASE_URL}/tv/{tv_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
+    response = http_client.get(keywords_url, headers=headers)
     if response.status_code == 200:
         return [keyword['name'].lower() for keyword in response.json().get('results', [])]
     return []
@@ -192,7 +195,7 @@ trending_tvshows_url = f'{TMDB_BASE_URL}/trending/tv/week?language={LANGUAGE}'
 # Fetch more than required to allow filtering
 initial_fetch_count = numberofmovies + 10  # Fetch 15 to get at least 5 valid ones
 trending_movies_url = f'{TMDB_BASE_URL}/trending/movie/week?language={LANGUAGE}'
-trending_movies_response = requests.get(trending_movies_url, headers=headers)
+trending_movies_response = http_client.get(trending_movies_url, headers=headers)
 all_movies = trending_movies_response.json().get('results', [])[:initial_fetch_count]
 
 # Filter manually
@@ -212,7 +215,7 @@ trending_movies = {'results': valid_movies}
 # Fetching trending TV shows
 initial_fetch_count = numberoftvshows + 10  # Fetch more than needed
 trending_tvshows_url = f'{TMDB_BASE_URL}/trending/tv/week?language={LANGUAGE}'
-trending_tvshows_response = requests.get(trending_tvshows_url, headers=headers)
+trending_tvshows_response = http_client.get(trending_tvshows_url, headers=headers)
 all_tvshows = trending_tvshows_response.json().get('results', [])[:initial_fetch_count]
 
 # Filter manually
@@ -280,7 +283,7 @@ def get_logo(media_type, media_id, language):
 
     # Build TMDB API URL
     url = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language={LANGUAGE}"
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
     if response.status_code != 200:
         return None
 
@@ -289,7 +292,7 @@ def get_logo(media_type, media_id, language):
     # If no logos at all, try English fallback
     if not logos:
         url_en = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language=en"
-        response_en = requests.get(url_en, headers=headers)
+        response_en = http_client.get(url_en, headers=headers)
         if response_en.status_code == 200:
             logos_en = response_en.json().get("logos", [])
             if logos_en:
@@ -312,31 +315,29 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         return
 
     # Download the background image with a timeout of 10 seconds
-    response = requests.get(image_url, timeout=10)
+    response = http_client.get(image_url, timeout=10)
     if response.status_code == 200:
         # Open the image
-        image = Image.open(BytesIO(response.content))
+        image = open_image(response.content, min_height=1500)
 
         # Resize the image to have a width of 1500 pixels while preserving aspect ratio
         image = resize_image(image, 1500)
 
-        # Open overlay images
-        bckg = Image.open(os.path.join(os.path.dirname(__file__), "bckg.png"))
-        overlay = Image.open(os.path.join(os.path.dirname(__file__), "overlay.png"))
+        # Background and overlay come pre-composed from the engine's static layer cache
+        layers = STATIC_LAYERS.get(os.path.join(os.path.dirname(__file__), "bckg.png"), os.path.join(os.path.dirname(__file__), "overlay.png"), (1175, 0))
         tmdblogo = Image.open(os.path.join(os.path.dirname(__file__), "tmdblogo.png"))
 
         # Paste images
-        bckg.paste(image, (1175, 0))
-        bckg.paste(overlay, (1175, 0), overlay)
+        bckg = layers.compose(image)
         bckg.paste(tmdblogo, (680, 890), tmdblogo)
 
         # Add title text with shadow
         draw = ImageDraw.Draw(bckg)
 
         # Text font
-        font_title = ImageFont.truetype(truetype_path, size=190)
-        font_overview = ImageFont.truetype(truetype_path, size=50)
-        font_custom = ImageFont.truetype(truetype_path, size=60)
+        font_title = get_font(truetype_path, size=190)
+        font_overview = get_font(truetype_path, size=50)
+        font_custom = get_font(truetype_path, size=60)
 
         # --- DYNAMIC LAYOUT ---
         padding = 25
@@ -350,7 +351,7 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         logo_path = get_logo("movie" if is_movie else "tv", movie['id'] if is_movie else tvshow['id'], language="en")
         if logo_path:
             logo_url = f"https://image.tmdb.org/t/p/original{logo_path}"
-            logo_response = requests.get(logo_url)
+            logo_response = http_client.get(logo_url)
             if logo_response.status_code == 200:
                 try:
                     logo_image = Image.open(BytesIO(logo_response.content)).convert('RGBA')
@@ -388,7 +389,6 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         draw.text((current_x, current_y), custom_text, font=font_custom, fill="white")
 
         # Save the resized image
-        bckg = bckg.convert('RGB')
         bckg.save(filename)
         print(f"Image saved: {filename}")
     else:
@@ -1,5 +1,5 @@
 # TMDB background generator using a colored background and vignetting effect
-import requests
+import http_client
 import numpy as np
 import re
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
@@ -12,6 +12,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# --- IMPORT IMAGE ENGINE ---
+from image_engine import blur_background, apply_dither, get_font, open_image, vignette_mask
+
 TMDB_BEARER_TOKEN = os.getenv('TMDB_BEARER_TOKEN')
 TMDB_BASE_URL = os.getenv('TMDB_BASE_URL')
 LANGUAGE = os.getenv("TMDB_LANGUAGE", "en-US")
@@ -70,7 +73,7 @@ truetype_url = 'https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto
 truetype_path = 'Roboto-Light.ttf'
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = http_client.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -85,32 +88,32 @@ if not os.path.exists(truetype_path):
 
 # Fetching genres for movies
 genres_url = f'{TMDB_BASE_URL}/genre/movie/list?language={LANGUAGE}'
-genres_response = requests.get(genres_url, headers=headers)
+genres_response = http_client.get(genres_url, headers=headers)
 genres_data = genres_response.json()
 movie_genres = {genre['id']: genre['name'] for genre in genres_data.get('genres', [])}
 
 # Fetching genres for TV shows
 genres_url = f'{TMDB_BASE_URL}/genre/tv/list?language={LANGUAGE}'
-genres_response = requests.get(genres_url, headers=headers)
+genres_response = http_client.get(genres_url, headers=headers)
 genres_data = genres_response.json()
 tv_genres = {genre['id']: genre['name'] for genre in genres_data.get('genres', [])}
 
 # Fetching TV show details
 def get_tv_show_details(tv_id):
     tv_details_url = f'{TMDB_BASE_URL}/tv/{tv_id}?language={LANGUAGE}'
-    tv_details_response = requests.get(tv_details_url, headers=headers)
+    tv_details_response = http_client.get(tv_details_url, headers=headers)
     return tv_details_response.json()
 
 # Fetching movie details
 def get_movie_details(movie_id):
     movie_details_url = f'{TMDB_BASE_URL}/movie/{movie_id}?language={LANGUAGE}'
-    movie_details_response = requests.get(movie_details_url, headers=headers)
+    movie_details_response = http_client.get(movie_details_url, headers=headers)
     return movie_details_response.json()
 
 # Function to fetch keywords for a movie
 def get_movie_keywords(movie_id):
     keywords_url = f"{TMDB_BASE_URL}/movie/{movie_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
+    response = http_client.get(keywords_url, headers=headers)
     if response.status_code == 200:
         # Extract and return the names of the keywords
         return [keyword['name'].lower() for keyword in response.json().get('keywords', [])]
@@ -119,7 +122,7 @@ def get_movie_keywords(movie_id):
 # Function to fetch keywords for a TV show
 def get_tv_keywords(tv_id):
     keywords_url = f"{TMDB_BASE_URL}tv/{tv_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
+    response = http_client.get(keywords_url, headers=headers)
     if response.status_code == 200:
         return [keyword['name'].lower() for keyword in response.json().get('results', [])]
     return []
@@ -200,7 +203,7 @@ trending_tvshows_url = f'{TMDB_BASE_URL}/trending/tv/week?language={LANGUAGE}'
 # Fetch more than required to allow filtering
 initial_fetch_count = numberofmovies + 10  # Fetch 15 to get at least 5 valid ones
 trending_movies_url = f'{TMDB_BASE_URL}/trending/movie/week?language={LANGUAGE}'
-trending_movies_response = requests.get(trending_movies_url, headers=headers)
+trending_movies_response = http_client.get(trending_movies_url, headers=headers)
 all_movies = trending_movies_response.json().get('results', [])[:initial_fetch_count]
 
 # Filter manually
@@ -220,7 +223,7 @@ trending_movies = {'results': valid_movies}
 # Fetching trending TV shows
 initial_fetch_count = numberoftvshows + 10  # Fetch more than needed
 trending_tvshows_url = f'{TMDB_BASE_URL}/trending/tv/week?language={LANGUAGE}'
-trending_tvshows_response = requests.get(trending_tvshows_url, headers=headers)
+trending_tvshows_response = http_client.get(trending_tvshows_url, headers=headers)
 all_tvshows = trending_tvshows_response.json().get('results', [])[:initial_fetch_count]
 
 # Filter manually
@@ -282,52 +285,18 @@ def resize_logo(image, width, height):
 
 
 
-def vignette_side(h, w, fade_ratio=5, fade_power=5.0, position="bottom-left", offset_left=0, offset_bottom=0):
-    """
-    Create a vignette mask for the given position.
-    offset_left / offset_bottom allow shifting the start of the fade inward in pixels.
-    """
-    y, x = np.ogrid[0:h, 0:w]
-    rx, ry = w * fade_ratio, h * fade_ratio
-
-    dist_x, dist_y = np.ones_like(x, dtype=np.float32), np.ones_like(y, dtype=np.float32)
-
-    if "left" in position:
-        dist_x = np.clip((x - offset_left) / rx, 0, 1)
-    elif "right" in position:
-        dist_x = np.clip((w - x) / rx, 0, 1)
-
-    if "top" in position:
-        dist_y = np.clip(y / ry, 0, 1)
-    elif "bottom" in position:
-        dist_y = np.clip((h - y - offset_bottom) / ry, 0, 1)
-
-    if any(corner in position for corner in ["left", "right"]) and \
-       any(corner in position for corner in ["top", "bottom"]):
-        alpha = np.minimum(dist_x, dist_y)
-    else:
-        alpha = dist_x * dist_y
-
-    alpha = (alpha ** fade_power * 255).astype(np.uint8)
-    mask = Image.fromarray(alpha)
-    return mask
-
-def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16):
+def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16, darken=1.0):
     """
     Create a blurry canvas background from the input image, with strong noise to prevent banding.
     """
-    bg = image.resize(size, Image.LANCZOS)
-    bg = bg.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    bg_array = np.array(bg).astype(np.float32)
+    bg = blur_background(image, size=size, blur_radius=blur_radius)
 
-    # Add dithering noise
-    noise = np.random.uniform(-dither_strength, dither_strength, bg_array.shape)
-    bg_array = np.clip(bg_array + noise, 0, 255).astype(np.uint8)
-    bg_img = Image.fromarray(bg_array)
+    # Add dithering noise (and darken)
+    bg_img = apply_dither(bg, strength=dither_strength, darken=darken)
 
     # Detect uniformity
     gray = np.array(bg_img.convert("L"))
-    is_uniform = gray.std() < 15  # threshold for "too uniform"
+    is_uniform = gray.std() < 15 * darken  # threshold for "too uniform"
 
     if is_uniform:
         print("[Background] Detected uniform image, will soften vignette.")
@@ -336,11 +305,7 @@ def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_s
 
 def generate_background_fast(input_img, target_width=3000):
     # Step 1: Create blurry/dark canvas
-    canvas_rgb, is_uniform = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800)
-
-    canvas_array = np.array(canvas_rgb).astype(np.float32)
-    canvas_array = (canvas_array * 0.4).clip(0, 255).astype(np.uint8)  # darken
-    canvas_rgb = Image.fromarray(canvas_array)
+    canvas_rgb, is_uniform = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800, darken=0.4)
 
     canvas = Image.new("RGBA", canvas_rgb.size, (0, 0, 0, 255))
     canvas.paste(canvas_rgb, (0, 0))
@@ -352,15 +317,15 @@ def generate_background_fast(input_img, target_width=3000):
 
     # Step 3: Apply vignette
     h, w = img_resized.height, img_resized.width
-    mask = vignette_side(
+    mask = vignette_mask(
         h, w,
         fade_ratio=0.3,
         fade_power=2.5,
         position="bottom-left",
         offset_left=0,
-        offset_bottom=150
+        offset_bottom=150,
+        blur_radius=60
     )
-    mask = mask.filter(ImageFilter.GaussianBlur(radius=60))
 
     img_resized.putalpha(mask)
 
@@ -383,7 +348,7 @@ def get_logo(media_type, media_id, language):
 
     # Build TMDB API URL
     url = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language={LANGUAGE}"
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
     if response.status_code != 200:
         return None
 
@@ -392,7 +357,7 @@ def get_logo(media_type, media_id, language):
     # If no logos at all, try English fallback
     if not logos:
         url_en = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language=en"
-        response_en = requests.get(url_en, headers=headers)
+        response_en = http_client.get(url_en, headers=headers)
         if response_en.status_code == 200:
             logos_en = response_en.json().get("logos", [])
             if logos_en:
@@ -415,9 +380,9 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         print(f"Skipping {title} - Background already exists.")
         return
 
-    response = requests.get(image_url, timeout=10)
+    response = http_client.get(image_url, timeout=10)
     if response.status_code == 200:
-        input_img = Image.open(BytesIO(response.content))
+        input_img = open_image(response.content, min_width=3000)
 
         # Generate blurred/vignette background instead of static overlay
         bckg = generate_background_fast(input_img, target_width=3000)
@@ -428,9 +393,9 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         tmdblogo = Image.open(os.path.join(os.path.dirname(__file__), "tmdblogo.png"))
 
         # Fonts
-        font_title = ImageFont.truetype(truetype_path, size=190)
-        font_overview = ImageFont.truetype(truetype_path, size=50)
-        font_custom = ImageFont.truetype(truetype_path, size=60)
+        font_title = get_font(truetype_path, size=190)
+        font_overview = get_font(truetype_path, size=50)
+        font_custom = get_font(truetype_path, size=60)
 
         # --- DYNAMIC LAYOUT ---
         padding = 25
@@ -444,7 +409,7 @@ def process_image(image_url, title, is_movie, genre, year, rating, duration=None
         logo_path = get_logo("movie" if is_movie else "tv", movie['id'] if is_movie else tvshow['id'], language="en")
         if logo_path:
             logo_url = f"https://image.tmdb.org/t/p/original{logo_path}"
-            logo_response = requests.get(logo_url)
+            logo_response = http_client.get(logo_url)
             if logo_response.status_code == 200:
                 try:
                     logo_image = Image.open(BytesIO(logo_response.content)).convert('RGBA')
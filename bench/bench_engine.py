@@ -0,0 +1,246 @@
+"""
+Microbenchmarks for the ImageGenerator hot paths.
+
+Runs offline against synthetic artwork/logos (no network, no media server) at 1080p
+and 4K source sizes, reports per-call latency percentiles and tracemalloc peak memory,
+and writes the results to a JSON baseline. With --compare, the run is checked against
+an earlier baseline and regressions beyond --threshold make the script exit with 1.
+
+    python bench/bench_engine.py                       # run everything, write bench/baseline.json
+    python bench/bench_engine.py --only draw_summary --repeat 50
+    python bench/bench_engine.py --compare bench/baseline.json --out /tmp/new.json
+
+Note: tracemalloc sees numpy buffers but not Pillow's internal image memory, so the
+peak figures are a lower bound for Pillow-heavy calls; "images" (Pillow's own count of
+image allocations per call) covers the Pillow side.
+"""
+import os
+import sys
+import io
+import json
+import time
+import platform
+import shutil
+import tempfile
+import argparse
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+# Path to repo root (bench/ lives one level below)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from image_engine import ImageGenerator
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SUMMARY = ("A team of explorers travel through a wormhole in space in an attempt to ensure humanity's "
+           "survival. As their ship drifts further from home, the crew must decide what they are "
+           "willing to sacrifice to bring back an answer for the people they left behind on Earth.")
+TAGS = ["2014", "Science Fiction", "Drama", "Adventure", "2h 49min", "IMDb: 8.7", "FSK 12"]
+
+# --- SYNTHETIC INPUTS ---
+def synthetic_artwork(size, seed=0):
+    """A smooth colour field with some detail, so resampling/JPEG behave like real backdrops."""
+    w, h = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    r = 128 + 100 * np.sin(x / w * 3.1 + 0.5)
+    g = 128 + 100 * np.cos(y / h * 2.3)
+    b = 128 + 100 * np.sin((x + y) / (w + h) * 5.0)
+    img = np.stack([r, g, b], axis=-1) + rng.normal(0, 12, (h, w, 3))
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8), "RGB")
+
+def synthetic_logo(size, dark=False):
+    """A transparent logo with a few filled shapes; dark logos trigger the recolor path."""
+    w, h = size
+    logo = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    d = ImageDraw.Draw(logo)
+    fill = (30, 30, 40, 255) if dark else (235, 200, 90, 255)
+    pad = min(w, h) // 8
+    d.rounded_rectangle((pad, pad, w // 2 - pad, h - pad), radius=pad, fill=fill)
+    d.ellipse((w // 2, pad, w - pad, h - pad), fill=fill)
+    return logo
+
+def synthetic_jpeg(image):
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+def find_font(engine_font):
+    """The engine's font, or the first bundled font if that is missing."""
+    if os.path.exists(os.path.join(BASE_DIR, engine_font)):
+        return engine_font
+    fonts_dir = os.path.join(BASE_DIR, "fonts")
+    for name in sorted(os.listdir(fonts_dir)):
+        if name.lower().endswith((".ttf", ".otf")):
+            return os.path.join("fonts", name)
+    raise RuntimeError("No font available for benchmarking")
+
+# --- CASES ---
+def build_cases(engine, res_name, out_path):
+    """Returns [(case_name, callable, setup)] for one source resolution."""
+    size = RESOLUTIONS[res_name]
+    art = synthetic_artwork(size)
+    art_jpeg = synthetic_jpeg(art)
+    logo = synthetic_logo((size[0] // 3, size[1] // 6))
+    dark_logo = synthetic_logo((size[0] // 3, size[1] // 6), dark=True)
+
+    def fresh_canvas():
+        engine.create_canvas(art.copy())
+
+    def from_jpeg():
+        # Decode included: create_canvas is normally fed a freshly opened download
+        return Image.open(io.BytesIO(art_jpeg))
+
+    cases = [
+        ("create_canvas", lambda: engine.create_canvas(from_jpeg())),
+        ("create_color_canvas", lambda: engine.create_color_canvas(from_jpeg())),
+        ("_create_blurry_background", lambda: engine._create_blurry_background(art, darken=0.4)),
+        ("_vignette_side", lambda: engine._vignette_side(art.height, art.width, fade_ratio=0.3, fade_power=2.5)),
+        ("ensure_high_contrast", lambda: engine.ensure_high_contrast(logo)),
+        ("ensure_high_contrast[dark]", lambda: engine.ensure_high_contrast(dark_logo)),
+        ("_smart_resize_logo", lambda: engine._smart_resize_logo(logo)),
+        ("measure_tags_width", lambda: engine.measure_tags_width(TAGS)),
+        ("draw_summary", lambda: (engine.reset_layout(), engine.draw_summary(SUMMARY))),
+        ("save", lambda: engine.save(out_path)),
+        ("get_bytes", lambda: engine.get_bytes()),
+    ]
+    # Drawing/encoding cases need a canvas in the current render context
+    needs_canvas = {"draw_summary", "save", "get_bytes"}
+    return [(f"{name}@{res_name}", fn, name in needs_canvas and fresh_canvas) for name, fn in cases]
+
+# --- MEASUREMENT ---
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def measure(fn, setup, repeat, warmup):
+    quiet = open(os.devnull, "w")
+    with contextlib.redirect_stdout(quiet):
+        if setup: setup()
+        for _ in range(warmup):
+            fn()
+
+        # Pillow counts every image it allocates; full-frame copies show up here
+        allocs_before = Image.core.get_stats()["new_count"]
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        pil_images = (Image.core.get_stats()["new_count"] - allocs_before) / repeat
+
+        # Memory is traced on a separate call; tracemalloc itself slows allocation down
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    quiet.close()
+
+    times.sort()
+    return {
+        "calls": repeat,
+        "min_ms": round(times[0], 3),
+        "mean_ms": round(sum(times) / len(times), 3),
+        "p50_ms": round(percentile(times, 50), 3),
+        "p90_ms": round(percentile(times, 90), 3),
+        "p99_ms": round(percentile(times, 99), 3),
+        "max_ms": round(times[-1], 3),
+        "peak_kb": round(peak / 1024, 1),
+        "pil_images": round(pil_images, 1),
+    }
+
+def run(args):
+    engine = ImageGenerator(font_path=find_font(args.font), resolution=args.profile)
+    engine.set_memory_budget(args.memory_budget * 1024 * 1024)
+    out_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "render.jpg")
+    results = {}
+    with engine.render_context():
+        for res_name in args.resolution:
+            for name, fn, setup in build_cases(engine, res_name, out_path):
+                if args.only and not any(o in name for o in args.only):
+                    continue
+                stats = measure(fn, setup, args.repeat, args.warmup)
+                results[name] = stats
+                print(f"{name:<40} p50 {stats['p50_ms']:>9.2f} ms   p90 {stats['p90_ms']:>9.2f} ms   "
+                      f"p99 {stats['p99_ms']:>9.2f} ms   peak {stats['peak_kb'] / 1024:>8.1f} MB   "
+                      f"images {stats['pil_images']:>5.1f}")
+    shutil.rmtree(os.path.dirname(out_path), ignore_errors=True)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "profile": args.profile,
+            "memory_budget_mb": args.memory_budget,
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, threshold, metric):
+    """Prints a comparison table; returns the names of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<40} {'baseline':>10} {'current':>10} {'change':>8}   ({metric}, threshold {threshold:.0%})")
+    for name, stats in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get(metric):
+            print(f"{name:<40} {'-':>10} {stats[metric]:>10.2f}      new")
+            continue
+        change = stats[metric] / old[metric] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<40} {old[metric]:>10.2f} {stats[metric]:>10.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="ImageGenerator microbenchmarks")
+    parser.add_argument("--resolution", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=15, help="timed calls per case")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed calls per case (fills caches)")
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these")
+    parser.add_argument("--font", default="Roboto-Light.ttf")
+    parser.add_argument("--profile", default="2160", help="engine output resolution profile (1080 or 2160)")
+    parser.add_argument("--memory-budget", type=int, default=0, help="run the engine in memory-budget mode (MB, 0 = off)")
+    parser.add_argument("--out", default=DEFAULT_BASELINE, help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p90_ms", "p99_ms", "mean_ms", "peak_kb", "pil_images"])
+    args = parser.parse_args()
+
+    # Read the baseline first: --out may point at the same file
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    current = run(args)
+    with open(args.out, "w") as f:
+        json.dump(current, f, indent=4)
+    print(f"\nResults written to {args.out}")
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold, args.metric)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
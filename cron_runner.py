@@ -3,7 +3,7 @@ import sys
 import time
 import argparse
 import json
-import requests
+import http_client
 import subprocess
 import tempfile
 import base64
@@ -12,7 +12,10 @@ from datetime import datetime
 
 # Path to own module folder
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from gui_editor import load_config, save_config
+from gui_editor import CONFIG_STORE, load_config, save_config
+from image_engine import EDGE_COLORS, OutputEncoder, backdrop_edge_color
+from PIL import Image
+from io import BytesIO
 
 # Config
 API_URL = "http://127.0.0.1:5000/api/save_image"
@@ -22,14 +25,56 @@ STOP_SIGNAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cro
 def log(msg):
     print(msg)
     try:
-        requests.post(LOG_URL, json={"message": msg}, timeout=1)
+        http_client.post(LOG_URL, json={"message": msg}, timeout=1)
     except:
         pass
 
-def run_node_renderer(layout_path, metadata):
-    # 1. Prepare Data - DIRECT PASS-THROUGH
-    # We simply pass the Jellyfin URLs directly to Node.js.
-    # Node.js will fetch them internally.
+def node_output_options(encoder):
+    """
+    Output settings for render_task.js. node-canvas only writes JPEG/PNG and has no
+    byte-budget search, so anything else is rendered losslessly and encoded here.
+    """
+    if encoder.format == 'jpeg' and not encoder.target_bytes:
+        return {
+            "format": "jpeg",
+            "quality": encoder.quality / 100,
+            "progressive": encoder.progressive,
+            "chromaSubsampling": encoder.subsampling != "4:4:4"
+        }
+    return {"format": "png"}
+
+def backdrop_assets(url):
+    """
+    Backdrop inputs for Node, with a single download between Python and Node. The auto-color
+    edge mean is cached by URL: on a hit only edge_color is passed and Node loads backdrop_url
+    itself. On a miss the backdrop is downloaded here and its bytes written to a temp file
+    (backdrop_path) that render_task.js draws instead of fetching the URL again; the caller
+    removes it. Returns {} on failure; Node then fetches and samples the backdrop itself.
+    """
+    if not url:
+        return {}
+    mean = EDGE_COLORS.cached(url)
+    if mean is not None:
+        return {"edge_color": list(mean)}
+    try:
+        r = http_client.get(url, timeout=30)
+        r.raise_for_status()
+        mean, _ = backdrop_edge_color(r.content, brightness=100, digest=url)
+    except Exception as e:
+        log(f"Backdrop edge color failed, Node will sample it: {e}")
+        return {}
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.img') as f:
+        f.write(r.content)
+    return {
+        "edge_color": list(mean),
+        "backdrop_path": f.name,
+        "backdrop_type": r.headers.get('Content-Type', 'image/jpeg').split(';')[0]
+    }
+
+def run_node_renderer(layout_path, metadata, encoder=None):
+    # 1. Prepare Data
+    # URLs are passed through to Node.js (the saved layout keeps them); the backdrop is
+    # downloaded at most once, here or by Node (see backdrop_assets).
     
     payload = {
         "layout_file": layout_path,
@@ -37,8 +82,10 @@ def run_node_renderer(layout_path, metadata):
         "assets": {
             # Pass the raw URL including the api_key
             "backdrop_url": metadata.get('backdrop_url'),
-            "logo_url": metadata.get('logo_url')
-        }
+            "logo_url": metadata.get('logo_url'),
+            **backdrop_assets(metadata.get('backdrop_url'))
+        },
+        "output": node_output_options(encoder or OutputEncoder())
     }
     
     # 2. Write Payload to temp file
@@ -73,8 +120,14 @@ def run_node_renderer(layout_path, metadata):
             # Read Resulting Image
             if os.path.exists(output_image_path):
                 with open(output_image_path, 'rb') as img_f:
-                    file_b64 = base64.b64encode(img_f.read()).decode('utf-8')
-                    image_b64 = f"data:image/jpeg;base64,{file_b64}"
+                    image_data = img_f.read()
+                mimetype = "image/jpeg"
+                if payload["output"]["format"] == "png":
+                    encoded = (encoder or OutputEncoder()).encode(Image.open(BytesIO(image_data)))
+                    log(f"Encoded {encoded}")
+                    image_data, mimetype = encoded.data, encoded.mimetype
+                file_b64 = base64.b64encode(image_data).decode('utf-8')
+                image_b64 = f"data:{mimetype};base64,{file_b64}"
             
             if os.path.exists(output_json_path):
                 with open(output_json_path, 'r', encoding='utf-8') as json_f:
@@ -93,7 +146,7 @@ def run_node_renderer(layout_path, metadata):
     
     finally:
         # Cleanup
-        for p in [payload_path, output_image_path, output_json_path]:
+        for p in [payload_path, output_image_path, output_json_path, payload["assets"].get("backdrop_path")]:
             if p and os.path.exists(p):
                 try: os.remove(p)
                 except: pass
@@ -107,6 +160,7 @@ def fetch_items_and_process(job=None):
     log(f"Starting Cron Job: {job_name}")
     
     config = load_config()
+    encoder = OutputEncoder.from_config(config)
     
     layout_dir = os.path.join(os.path.dirname(__file__), 'layouts')
     layout_name = job.get('layout_name', 'Default')
@@ -128,7 +182,7 @@ def fetch_items_and_process(job=None):
     boxset_ids = set()
     try:
         bs_url = f"{base_url}/Users/{jf['user_id']}/Items?IncludeItemTypes=BoxSet&Recursive=true&Fields=Id"
-        r_bs = requests.get(bs_url, headers=headers, timeout=10)
+        r_bs = http_client.get(bs_url, headers=headers, timeout=10)
         if r_bs.status_code == 200:
             for b in r_bs.json().get('Items', []):
                 boxset_ids.add(b['Id'])
@@ -176,7 +230,7 @@ def fetch_items_and_process(job=None):
     url = f"{base_url}/Users/{jf['user_id']}/Items?{query_string}"
     
     try:
-        req = requests.get(url, headers=headers)
+        req = http_client.get(url, headers=headers)
         items = req.json().get('Items', [])
     except Exception as e:
         log(f"Jellyfin Error: {e}")
@@ -189,9 +243,10 @@ def fetch_items_and_process(job=None):
         
         # FIX: Check if job is still valid in config (Self-Termination on Delete)
         # This allows the process to stop itself if the user deletes the job from the UI
+        # (read-only view of the cached config; the file is re-read only after it changed)
         if job.get('id'):
             try:
-                curr_conf = load_config()
+                curr_conf = CONFIG_STORE.peek(max_age=1.0)
                 curr_jobs = curr_conf.get('cron_jobs', [])
                 active = next((j for j in curr_jobs if j.get('id') == job['id']), None)
                 if not active:
@@ -209,7 +264,7 @@ def fetch_items_and_process(job=None):
             log(f"[Dry Run] Processing: {safe_title}")
             continue
             
-        filename = f"{safe_title} - {item.get('ProductionYear')}.jpg"
+        filename = f"{safe_title} - {item.get('ProductionYear')}{encoder.extension}"
 
         # --- Overwrite Check ---
         if not job.get('overwrite', False):
@@ -240,14 +295,16 @@ def fetch_items_and_process(job=None):
             "officialRating": item.get('OfficialRating'),
             "genres": ", ".join(item.get('Genres', [])),
             "runtime": runtime,
-            "backdrop_url": f"{base_url}/Items/{item['Id']}/Images/Backdrop?api_key={jf['api_key']}",
+            # The image tag versions the URL, which keys the cached edge color (backdrop_assets)
+            "backdrop_url": f"{base_url}/Items/{item['Id']}/Images/Backdrop?api_key={jf['api_key']}"
+                            + (f"&tag={item['BackdropImageTags'][0]}" if item.get('BackdropImageTags') else ""),
             "logo_url": None if is_in_boxset else (f"{base_url}/Items/{item['Id']}/Images/Logo?api_key={jf['api_key']}" if 'Logo' in item.get('ImageTags', {}) else None),
             "action_url": f"jellyfin://items/{item['Id']}",
             "provider_ids": item.get('ProviderIds', {})
         }
 
         log(f"Rendering: {meta['title']}")
-        img_b64, json_data = run_node_renderer(layout_full_path, meta)
+        img_b64, json_data = run_node_renderer(layout_full_path, meta, encoder)
         
         if img_b64 and json_data:
             payload = {
@@ -259,12 +316,15 @@ def fetch_items_and_process(job=None):
                 "target_type": "gallery"
             }
             try:
-                requests.post(API_URL, json=payload)
+                http_client.post(API_URL, json=payload)
             except Exception as e:
                 log(f"Upload failed: {e}")
         else:
             log("Rendering failed.")
 
+    for host, stats in http_client.stats().items():
+        log(f"HTTP {host}: {stats['requests']} requests, {stats['errors']} errors, "
+            f"p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms")
     log("Batch Finished.")
 
 def run_scheduler():
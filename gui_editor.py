@@ -6,11 +6,15 @@ import random
 import traceback
 import io
 import requests
+import http_client
 import time
 import base64
 import shutil
 import re
 import uuid
+import copy
+import errno
+import tempfile
 import threading
 import subprocess
 from datetime import datetime, timedelta
@@ -22,7 +26,9 @@ from urllib.parse import quote
 sys.dont_write_bytecode = True
 
 # --- IMPORT IMAGE ENGINE ---
-from image_engine import ImageGenerator
+from image_engine import ImageGenerator, OutputEncoder, LOGOS, bytes_digest, resolution_profile
+from proxy_cache import ProxyCache
+from metadata_catalog import MetadataCatalog, normalize_age
 
 # Blueprint Setup
 gui_editor_bp = Blueprint('gui_editor', __name__)
@@ -35,23 +41,24 @@ LATEST_GENERATED_IMAGE = None
 # Global to track running cron process
 CRON_PROCESS = None
 
-# Initialize Image Generator for Proxy Processing
+# Shared Image Generator (proxy processing and server-side previews)
 image_gen = ImageGenerator()
 
+# Disk cache behind /api/proxy/image (size and max age from editor.proxy_cache_mb / proxy_cache_max_age,
+# set by apply_engine_settings before the index is loaded on first use; importers such as
+# cron_runner that never proxy never touch the directory)
+PROXY_CACHE = ProxyCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'proxy_cache'))
+PROXY_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
+
 # --- METADATA CACHE MANAGER (In-Memory) ---
-METADATA_CACHE = {"genres": set(), "ages": set(), "years": set(), "images": []}
+METADATA_CATALOG = MetadataCatalog()
 METADATA_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metadata_cache.json')
 CACHE_SAVE_TIMER = None
 
 def _save_metadata_cache_now():
     """Writes the cache to disk."""
     try:
-        data = {
-            "genres": sorted(list(METADATA_CACHE["genres"])),
-            "ages": sorted(list(METADATA_CACHE["ages"])),
-            "years": sorted(list(METADATA_CACHE["years"])),
-            "images": METADATA_CACHE["images"]
-        }
+        data = METADATA_CATALOG.to_dict()
         with open(METADATA_CACHE_FILE, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
         print("Metadata cache saved to disk.")
@@ -59,68 +66,32 @@ def _save_metadata_cache_now():
         print(f"Error saving metadata cache: {e}")
 
 def _merge_metadata_to_cache(metadata, filepath=None, layout_name=None):
-    """Merges new metadata into the in-memory sets."""
-    if not metadata: return
-    
-    # Genres (comma separated string)
-    genres_str = metadata.get('genres', '')
-    if genres_str:
-        parts = [g.strip() for g in genres_str.split(',') if g.strip()]
-        METADATA_CACHE["genres"].update(parts)
-        
-    # Ages (OfficialRating)
-    rating = metadata.get('officialRating')
-    if rating:
-        METADATA_CACHE["ages"].add(str(rating).strip())
-        
-    # Years
-    year = metadata.get('year')
-    if year:
-        METADATA_CACHE["years"].add(str(year).strip())
-        
-    # Update Image Inventory (if path provided)
-    if filepath and layout_name:
-        # Remove existing entry for this file if exists (to allow updates)
-        METADATA_CACHE["images"] = [img for img in METADATA_CACHE["images"] if img['path'] != filepath]
-        
-        # Parse Rating (Try different fields)
-        rating = 0.0
-        for field in ['rating', 'CommunityRating', 'VoteAverage', 'OfficialRating']:
-            val = metadata.get(field)
-            if val is not None:
-                try:
-                    rating = float(val)
-                    break
-                except: pass
-        
-        image_entry = {
-            "path": filepath,
-            "layout": layout_name,
-            "genres": metadata.get('genres', ''),
-            "officialRating": metadata.get('officialRating', ''),
-            "year": metadata.get('year'),
-            "rating": rating,
-            "title": metadata.get('title'),
-            "action_url": metadata.get('action_url')
-        }
-        METADATA_CACHE["images"].append(image_entry)
+    """Adds or replaces the catalog record of an image (O(1), indexes included)."""
+    if not metadata or not (filepath and layout_name): return
+    METADATA_CATALOG.upsert(filepath, layout_name, metadata)
 
-def update_metadata_cache(new_metadata, filepath=None, layout_name=None):
-    """Updates the cache and schedules a debounced save."""
+def _schedule_metadata_save():
+    """Debounced save (wait 5 seconds before writing to disk to save I/O)."""
     global CACHE_SAVE_TIMER
-    _merge_metadata_to_cache(new_metadata, filepath, layout_name)
-    
-    # Debounce save (wait 5 seconds before writing to disk to save I/O)
     if CACHE_SAVE_TIMER:
         CACHE_SAVE_TIMER.cancel()
     
     CACHE_SAVE_TIMER = threading.Timer(5.0, _save_metadata_cache_now)
     CACHE_SAVE_TIMER.start()
 
+def update_metadata_cache(new_metadata, filepath=None, layout_name=None):
+    """Updates the cache and schedules a debounced save."""
+    _merge_metadata_to_cache(new_metadata, filepath, layout_name)
+    _schedule_metadata_save()
+
+def remove_from_metadata_cache(filepath):
+    """Drops a deleted image (or its JSON) from the cache and schedules a debounced save."""
+    if METADATA_CATALOG.delete(filepath):
+        _schedule_metadata_save()
+
 def _scan_and_rebuild_cache():
     """Scans all JSONs and rebuilds the cache. Returns number of files scanned."""
-    global METADATA_CACHE
-    METADATA_CACHE = {"genres": set(), "ages": set(), "years": set(), "images": []}
+    METADATA_CATALOG.clear()
     
     print("Building/Rebuilding metadata cache from files...")
     base_path = os.path.dirname(os.path.abspath(__file__))
@@ -152,15 +123,11 @@ def _scan_and_rebuild_cache():
 
 def initialize_metadata_cache():
     """Loads cache from disk or rebuilds it from files on startup."""
-    global METADATA_CACHE
     if os.path.exists(METADATA_CACHE_FILE):
         try:
             with open(METADATA_CACHE_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                METADATA_CACHE["genres"] = set(data.get("genres", []))
-                METADATA_CACHE["ages"] = set(data.get("ages", []))
-                METADATA_CACHE["years"] = set(data.get("years", []))
-                METADATA_CACHE["images"] = data.get("images", [])
+                METADATA_CATALOG.load(data)
                 print("Loaded metadata cache from disk.")
                 return
         except Exception as e:
@@ -206,37 +173,163 @@ if not os.path.exists(FONTS_DIR):
 if not os.path.exists(CUSTOM_ICONS_DIR):
     os.makedirs(CUSTOM_ICONS_DIR)
 
-# --- CONFIGURATION LOGIC ---
-def load_config():
-    defaults = {
-        "general": {"overwrite_existing": False, "timezone_offset": 1},
-        "jellyfin": {"url": "", "api_key": "", "user_id": "", "excluded_libraries": ""},
-        "plex": {"url": "", "token": ""},
-        "tmdb": {"api_key": "", "language": "de-DE"},
-        "radarr": {"url": "", "api_key": ""},
-        "sonarr": {"url": "", "api_key": ""},
-        "jellyseerr": {"url": "", "api_key": ""},
-        "trakt": {"api_key": "", "username": "", "listname": ""},
-        "editor": {"resolution": "1080"},
-        "cron": {"enabled": False, "start_time": "00:00", "frequency": "1"}
-    }
+# Image files the gallery lists (the encoder can write JPEG, WebP or AVIF)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.avif')
+DATA_URI_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/avif': '.avif'}
 
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
+def remove_stale_images(image_path):
+    """ Deletes images with the same stem but another extension (a re-save in a different format). """
+    root, ext = os.path.splitext(image_path)
+    for other in IMAGE_EXTENSIONS:
+        if other != ext.lower() and os.path.exists(root + other):
             try:
-                loaded = json.load(f)
-                for key, value in loaded.items():
-                    if key in defaults and isinstance(defaults[key], dict) and isinstance(value, dict):
-                        defaults[key].update(value)
-                    else:
-                        defaults[key] = value
-            except:
-                pass
-    return defaults
+                os.remove(root + other)
+            except OSError as e:
+                print(f"Could not remove stale image {root + other}: {e}")
+
+def image_for_json(json_path):
+    """ Returns the image stored next to a metadata .json (any supported extension). """
+    root = os.path.splitext(json_path)[0]
+    for ext in IMAGE_EXTENSIONS:
+        if os.path.exists(root + ext):
+            return root + ext
+    return root + '.jpg'
+
+# --- CONFIGURATION LOGIC ---
+CONFIG_DEFAULTS = {
+    "general": {"overwrite_existing": False, "timezone_offset": 1},
+    "jellyfin": {"url": "", "api_key": "", "user_id": "", "excluded_libraries": ""},
+    "plex": {"url": "", "token": ""},
+    "tmdb": {"api_key": "", "language": "de-DE"},
+    "radarr": {"url": "", "api_key": ""},
+    "sonarr": {"url": "", "api_key": ""},
+    "jellyseerr": {"url": "", "api_key": ""},
+    "trakt": {"api_key": "", "username": "", "listname": ""},
+    "editor": {
+        "resolution": "1080",
+        "memory_budget_mb": 0,
+        "proxy_cache_mb": 512,
+        "proxy_cache_max_age": 86400,
+        "output": {"format": "jpeg", "quality": 95, "progressive": False, "optimize": False,
+                   "subsampling": "4:2:0", "target_bytes": 0}
+    },
+    "cron": {"enabled": False, "start_time": "00:00", "frequency": "1"}
+}
+
+class ConfigStore:
+    """
+    Parsed config.json (merged over CONFIG_DEFAULTS) kept in memory. The file is only
+    re-read when its inode, mtime or size changes, and save() writes atomically
+    (temp file + rename; rewritten in place where the file can't be replaced, e.g. a
+    single-file bind mount) and updates the cached copy under the same lock.
+    get() returns a private copy callers may modify; peek() returns the shared copy (read-only)
+    and with max_age skips even the stat() if the file was checked that recently.
+    """
+    def __init__(self, path, defaults):
+        self.path = path
+        self.defaults = defaults
+        self.loads = 0
+        self._config = None
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _merge(self, loaded):
+        config = copy.deepcopy(self.defaults)
+        for key, value in loaded.items():
+            if key in config and isinstance(config[key], dict) and isinstance(value, dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+        return config
+
+    def peek(self, max_age=0.0):
+        now = time.monotonic()
+        with self._lock:
+            if self._config is not None and max_age and now - self._checked < max_age:
+                return self._config
+            signature = self._stat()
+            self._checked = now
+            if self._config is None or signature != self._signature:
+                loaded = {}
+                if signature is not None:
+                    try:
+                        with open(self.path, 'r') as f:
+                            loaded = json.load(f)
+                    except:
+                        pass
+                self._config = self._merge(loaded if isinstance(loaded, dict) else {})
+                self._signature = signature
+                self.loads += 1
+            return self._config
+
+    def get(self, max_age=0.0):
+        return copy.deepcopy(self.peek(max_age))
+
+    def _replace(self, text):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            # mkstemp creates 0600 files; keep the existing file's permissions
+            os.chmod(tmp, os.stat(self.path).st_mode & 0o777 if os.path.exists(self.path) else 0o644)
+            os.replace(tmp, self.path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _rewrite(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save(self, config_data):
+        text = json.dumps(config_data, indent=4)
+        with self._lock:
+            try:
+                self._replace(text)
+            except OSError as e:
+                # A config.json bind-mounted as a single file (docker-compose.yml) cannot be
+                # renamed over (EBUSY, or EXDEV); nor can a temp file be created in a read-only dir
+                if e.errno not in (errno.EBUSY, errno.EXDEV, errno.EACCES, errno.EPERM):
+                    raise
+                self._rewrite(text)
+            self._config = self._merge(copy.deepcopy(config_data))
+            self._signature = self._stat()
+            self._checked = time.monotonic()
+
+CONFIG_STORE = ConfigStore(CONFIG_FILE, CONFIG_DEFAULTS)
+
+def load_config():
+    return CONFIG_STORE.get()
 
 def save_config(config_data):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config_data, f, indent=4)
+    CONFIG_STORE.save(config_data)
+
+def apply_engine_settings(config):
+    """ Applies editor.resolution, editor.memory_budget_mb and editor.output to the shared engine (and the proxy cache limits). """
+    editor = config.get('editor') or {}
+    profile = resolution_profile(editor.get('resolution', '2160'))
+    if profile is not image_gen.profile:
+        image_gen.set_resolution(profile.name)
+    budget = int(editor.get('memory_budget_mb') or 0) * 1024 * 1024
+    if budget != (image_gen.memory_budget or 0):
+        image_gen.set_memory_budget(budget)
+    image_gen.encoder = OutputEncoder.from_config(config)
+    PROXY_CACHE.max_bytes = int(editor.get('proxy_cache_mb', 512)) * 1024 * 1024
+    PROXY_CACHE.max_age = int(editor.get('proxy_cache_max_age', 86400))
+
+apply_engine_settings(load_config())
 
 def clean_tmdb_url(path):
     """ Safely constructs a TMDB image URL from a path. """
@@ -249,46 +342,113 @@ def clean_tmdb_url(path):
 # --- API ROUTES ---
 @gui_editor_bp.route('/api/proxy/image')
 def proxy_image():
-    """ Proxies an image URL to bypass CORS/CORB blocks. """
+    """ Proxies an image URL to bypass CORS/CORB blocks (cached on disk, see PROXY_CACHE). """
     url = request.args.get('url')
     raw = request.args.get('raw', 'false').lower() == 'true'
     if not url:
         return "Missing URL", 400
-    try:
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
-        resp = requests.get(url, headers=headers, timeout=10)
-        
-        if resp.status_code != 200:
-            return f"Upstream Error: {resp.status_code}", resp.status_code
-            
-        # Check if this is likely a logo (PNG or contains 'logo' in path)
-        # This prevents processing backdrops (JPGs) which would turn white if dark.
-        is_likely_logo = 'logo' in url.lower() or url.lower().endswith('.png')
-        
-        if is_likely_logo and not raw:
-            try:
-                img = Image.open(io.BytesIO(resp.content))
-                # Apply the contrast logic from image_engine.py
-                img = image_gen.ensure_high_contrast(img)
-                output = io.BytesIO()
-                img.save(output, format='PNG')
-                output.seek(0)
-                return send_file(output, mimetype='image/png')
-            except Exception as e:
-                print(f"Error processing proxy image: {e}")
 
-        return send_file(
-            io.BytesIO(resp.content),
-            mimetype=resp.headers.get('Content-Type') or 'image/jpeg'
-        )
+    # Check if this is likely a logo (PNG or contains 'logo' in path)
+    # This prevents processing backdrops (JPGs) which would turn white if dark.
+    is_likely_logo = 'logo' in url.lower() or url.lower().endswith('.png')
+    variant = 'logo' if is_likely_logo and not raw else 'raw'
+
+    entry = PROXY_CACHE.get(url, variant)
+    if entry is not None and entry.is_fresh(PROXY_CACHE.max_age):
+        cached = serve_cached(entry)
+        if cached is not None:
+            return cached
+
+    try:
+        headers = dict(PROXY_HEADERS)
+        if entry is not None:
+            headers.update(entry.validators())
+        resp = http_client.get(url, headers=headers, timeout=10, stream=True)
+
+        with resp:
+            if resp.status_code == 304 and entry is not None:
+                PROXY_CACHE.revalidated_ok(entry, resp.headers)
+                cached = serve_cached(entry)
+                if cached is not None:
+                    return cached
+                # Evicted in the meantime: fetch it unconditionally
+                return proxy_image_uncached(url, variant)
+
+            if resp.status_code != 200:
+                return f"Upstream Error: {resp.status_code}", resp.status_code
+
+            mimetype = resp.headers.get('Content-Type') or 'image/jpeg'
+            cacheable = PROXY_CACHE.cacheable(resp.headers)
+            length = resp.headers.get('Content-Length', '')
+            if variant == 'logo':
+                data, mimetype = process_proxy_logo(resp.content, mimetype)
+            elif cacheable and length.isdigit() and int(length) <= PROXY_CACHE.max_bytes:
+                # Known to fit: stream the body straight into the cache
+                entry = PROXY_CACHE.put(url, variant, resp.iter_content(64 * 1024), mimetype, resp.headers)
+                cached = serve_cached(entry) if entry is not None else None
+                if cached is not None:
+                    return cached
+                # Evicted right away (or the length was wrong): fetch it unconditionally
+                return proxy_image_uncached(url, variant)
+            else:
+                # Unknown length or larger than the whole cache: keep the body we already have
+                data = resp.content
+
+            if cacheable and len(data) <= PROXY_CACHE.max_bytes:
+                PROXY_CACHE.put(url, variant, data, mimetype, resp.headers)
+            return send_file(io.BytesIO(data), mimetype=mimetype)
     except requests.exceptions.RequestException as e:
         print(f"Proxy Connection Error for {url}: {e}", file=sys.stderr)
+        if entry is not None:
+            # Upstream unreachable: a stale copy beats a broken image
+            cached = serve_cached(entry)
+            if cached is not None:
+                return cached
         return str(e), 502
     except Exception as e:
         print(f"Proxy Error for {url}: {e}", file=sys.stderr)
         traceback.print_exc()
         return str(e), 500
 
+def serve_cached(entry):
+    """ send_file response for a cache entry, or None if it is no longer on disk. """
+    f = PROXY_CACHE.open(entry)
+    if f is None:
+        return None
+    return send_file(f, mimetype=entry.mimetype)
+
+def process_proxy_logo(content, mimetype):
+    """ Contrast-fixes a logo and returns (png bytes, mimetype); the original body if that fails. """
+    try:
+        # Apply the contrast logic from image_engine.py (memoised by content hash,
+        # so a repeat hit skips decoding and processing)
+        digest = bytes_digest(content)
+        img = LOGOS.get(digest, 100, None, None)
+        if img is None:
+            img = image_gen.ensure_high_contrast(Image.open(io.BytesIO(content)))
+            LOGOS.put(digest, 100, None, None, img)
+        output = io.BytesIO()
+        img.save(output, format='PNG')
+        return output.getvalue(), 'image/png'
+    except Exception as e:
+        print(f"Error processing proxy image: {e}")
+        return content, mimetype
+
+def proxy_image_uncached(url, variant):
+    """ Plain fetch without the cache (entry evicted while this request was serving it). """
+    resp = http_client.get(url, headers=PROXY_HEADERS, timeout=10)
+    if resp.status_code != 200:
+        return f"Upstream Error: {resp.status_code}", resp.status_code
+    data, mimetype = resp.content, resp.headers.get('Content-Type') or 'image/jpeg'
+    if variant == 'logo':
+        data, mimetype = process_proxy_logo(data, mimetype)
+    return send_file(io.BytesIO(data), mimetype=mimetype)
+
+@gui_editor_bp.route('/api/http/stats')
+def http_stats():
+    """ Per-host upstream latency (shared HTTP client) and image proxy cache counters. """
+    return jsonify({"hosts": http_client.stats(), "proxy_cache": PROXY_CACHE.stats()})
+
 # --- NEW: Server-Side Generation Example ---
 @gui_editor_bp.route('/api/generate_preview_server', methods=['POST'])
 def generate_preview_server():
@@ -298,71 +458,67 @@ def generate_preview_server():
     """
     data = request.json
     
-    # Initialize Engine (Loads fonts/backgrounds once)
-    engine = ImageGenerator()
-    
-    # Simulate getting an image (in reality you'd download it from data['backdrop_url'])
-    # For demo, we use the base background as a placeholder for artwork
-    artwork = engine.base_bg 
+    # Reuse the shared engine (fonts/backgrounds are loaded once); the render
+    # context keeps this request's canvas separate from concurrent requests.
+    engine = image_gen
     
-    # 1. Create Canvas
-    engine.create_canvas(artwork)
-    
-    # 2. Draw Elements (Dynamic Layout happens automatically inside)
-    engine.draw_logo_or_title(title_text=data.get('title', 'No Title'))
-    engine.draw_info_text(f"{data.get('year')} • {data.get('rating')}")
-    engine.draw_summary(data.get('overview', ''))
-    engine.draw_custom_text_and_provider_logo("Preview Generated by Engine", "jellyfinlogo.png")
-    
-    # 3. Return Image
-    return send_file(engine.get_bytes(), mimetype='image/jpeg')
+    with engine.render_context():
+        # Simulate getting an image (in reality you'd download it from data['backdrop_url'])
+        # For demo, we use the base background as a placeholder for artwork
+        artwork = engine.base_bg 
+        
+        # 1. Create Canvas
+        engine.create_canvas(artwork)
+        
+        # 2. Draw Elements (Dynamic Layout happens automatically inside)
+        engine.draw_logo_or_title(title_text=data.get('title', 'No Title'))
+        engine.draw_info_text(f"{data.get('year')} • {data.get('rating')}")
+        engine.draw_summary(data.get('overview', ''))
+        engine.draw_custom_text_and_provider_logo("Preview Generated by Engine", "jellyfinlogo.png")
+        
+        # 3. Return Image
+        image_bytes = engine.get_bytes()
+        encoded = engine.last_encode
+    response = send_file(image_bytes, mimetype=encoded.mimetype)
+    response.headers['X-Encode-Bytes'] = str(encoded.size)
+    response.headers['X-Encode-Ms'] = f"{encoded.seconds * 1000:.1f}"
+    response.headers['X-Encode-Quality'] = str(encoded.quality)
+    return response
 
 # --- CACHED METADATA ROUTES ---
 @gui_editor_bp.route('/api/genres/list')
 def list_genres_cached():
     # Reads strictly from RAM
-    return jsonify(sorted(list(METADATA_CACHE["genres"])))
+    return jsonify(sorted(METADATA_CATALOG.values('genres')))
 
 @gui_editor_bp.route('/api/ages/list')
 def list_ages_cached():
     # Reads strictly from RAM
-    return jsonify(sorted(list(METADATA_CACHE["ages"])))
+    return jsonify(sorted(METADATA_CATALOG.values('ages')))
 
 @gui_editor_bp.route('/api/year/list')
 def list_years_cached():
     # Reads strictly from RAM
-    return jsonify(sorted(list(METADATA_CACHE["years"]), reverse=True))
+    return jsonify(sorted(METADATA_CATALOG.values('years'), reverse=True))
 
 @gui_editor_bp.route('/api/ratings/list')
 def list_ratings_cached():
-    # Extract unique integer ratings on the fly from the image list
-    rating_levels = set()
-    for img in METADATA_CACHE["images"]:
-        r = img.get('rating', 0)
-        if r > 0:
-            rating_levels.add(int(r))
-    return jsonify(sorted(list(rating_levels), reverse=True))
+    # Integer rating levels (e.g. 7 for 7.0-7.9), reference-counted by the catalog
+    return jsonify(METADATA_CATALOG.rating_levels())
 
 @gui_editor_bp.route('/api/cache/rebuild', methods=['POST'])
 def rebuild_cache_endpoint():
     """API endpoint to manually trigger a cache rebuild from all image JSONs."""
     try:
         count = _scan_and_rebuild_cache()
-        
-        # Extract unique integer ratings for display (e.g. 7 for 7.0-7.9)
-        rating_levels = set()
-        for img in METADATA_CACHE["images"]:
-            r = img.get('rating', 0)
-            if r > 0:
-                rating_levels.add(int(r))
                 
         return jsonify({
             "status": "success", 
             "message": f"Cache rebuilt successfully from {count} files.",
-            "genres": sorted(list(METADATA_CACHE["genres"])),
-            "ages": sorted(list(METADATA_CACHE["ages"])),
-            "years": sorted(list(METADATA_CACHE["years"]), reverse=True),
-            "ratings": sorted(list(rating_levels), reverse=True)
+            "genres": sorted(METADATA_CATALOG.values('genres')),
+            "ages": sorted(METADATA_CATALOG.values('ages')),
+            "years": sorted(METADATA_CATALOG.values('years'), reverse=True),
+            "ratings": METADATA_CATALOG.rating_levels()
         })
     except Exception as e:
         print(f"Error during manual cache rebuild: {e}")
@@ -413,7 +569,7 @@ def get_random_media():
         excluded_paths = []
         if excluded_list:
             try:
-                r_libs = requests.get(f"{clean_url}/Library/VirtualFolders", headers=headers, timeout=5)
+                r_libs = http_client.get(f"{clean_url}/Library/VirtualFolders", headers=headers, timeout=5)
                 if r_libs.status_code == 200:
                     libs = r_libs.json()
                     for lib in libs:
@@ -425,7 +581,7 @@ def get_random_media():
         url = f"{clean_url}/Users/{jf['user_id']}/Items?Recursive=true&IncludeItemTypes=Movie,Series&ExcludeItemTypes=BoxSet&SortBy=Random&Limit=50&Fields=Type,Overview,Genres,CommunityRating,ProductionYear,RunTimeTicks,ImageTags,Path,ProviderIds,OfficialRating,InheritedParentalRatingValue"
         
         try:
-            r = requests.get(url, headers=headers, timeout=5)
+            r = http_client.get(url, headers=headers, timeout=5)
             r.raise_for_status()
             items = r.json().get('Items', [])
             
@@ -472,7 +628,7 @@ def get_media_list():
         excluded_paths = []
         if excluded_list:
             try:
-                r_libs = requests.get(f"{clean_url}/Library/VirtualFolders", headers=headers, timeout=5)
+                r_libs = http_client.get(f"{clean_url}/Library/VirtualFolders", headers=headers, timeout=5)
                 if r_libs.status_code == 200:
                     libs = r_libs.json()
                     for lib in libs:
@@ -530,7 +686,7 @@ def get_media_list():
         url = f"{clean_url}/Users/{jf['user_id']}/Items?{base_params}{sort_params}"
 
         try:
-            r = requests.get(url, headers=headers, timeout=10)
+            r = http_client.get(url, headers=headers, timeout=10)
             r.raise_for_status()
             items = r.json().get('Items', [])
             
@@ -587,7 +743,7 @@ def search_media():
     url = f"{clean_url}/Users/{jf['user_id']}/Items?Recursive=true&IncludeItemTypes=Movie,Series&ExcludeItemTypes=BoxSet&SearchTerm={query}&Limit=10&Fields=Name,ProductionYear"
     
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = http_client.get(url, headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify(r.json().get('Items', []))
     except:
@@ -602,7 +758,7 @@ def get_media_item(item_id):
         clean_url = jf['url'].rstrip('/')
         url = f"{clean_url}/Users/{jf['user_id']}/Items/{item_id}?Fields=Type,Overview,Genres,CommunityRating,ProductionYear,RunTimeTicks,ImageTags,Path,ProviderIds,OfficialRating,InheritedParentalRatingValue"
         try:
-            r = requests.get(url, headers=headers, timeout=5)
+            r = http_client.get(url, headers=headers, timeout=5)
             r.raise_for_status()
             return jsonify(format_jellyfin_item(r.json(), clean_url, jf['api_key']))
         except Exception as e:
@@ -614,6 +770,7 @@ def update_settings():
     global CRON_PROCESS
     config_data = request.json
     save_config(config_data)
+    apply_engine_settings(config_data)
     
     # Check if any job needs immediate execution
     jobs = config_data.get('cron_jobs', [])
@@ -637,7 +794,7 @@ def receive_cron_log():
     msg = data.get('message')
     if msg:
         try:
-            config = load_config()
+            config = CONFIG_STORE.peek()
             offset = int(config.get('general', {}).get('timezone_offset', 1))
             now = datetime.utcnow() + timedelta(hours=offset)
             timestamp = now.strftime("%H:%M:%S")
@@ -696,7 +853,7 @@ def test_jellyfin():
     try:
         headers = {"X-Emby-Token": api_key}
         # Test connection by fetching system info
-        r = requests.get(f"{url.rstrip('/')}/System/Info", headers=headers, timeout=5)
+        r = http_client.get(f"{url.rstrip('/')}/System/Info", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": f"Connected: {r.json().get('ServerName')}"})
     except Exception as e:
@@ -712,7 +869,7 @@ def test_plex():
     try:
         headers = {'X-Plex-Token': token, 'Accept': 'application/json'}
         # Check identity endpoint
-        r = requests.get(f"{url.rstrip('/')}/identity", headers=headers, timeout=5)
+        r = http_client.get(f"{url.rstrip('/')}/identity", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": "Connected to Plex"})
     except Exception as e:
@@ -727,11 +884,11 @@ def test_tmdb():
     try:
         # Try as Bearer Token first (v4)
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json;charset=utf-8"}
-        r = requests.get("https://api.themoviedb.org/3/authentication", headers=headers, timeout=5)
+        r = http_client.get("https://api.themoviedb.org/3/authentication", headers=headers, timeout=5)
         
         if r.status_code == 401:
             # Fallback: Try as v3 API Key query param
-            r = requests.get(f"https://api.themoviedb.org/3/authentication?api_key={api_key}", timeout=5)
+            r = http_client.get(f"https://api.themoviedb.org/3/authentication?api_key={api_key}", timeout=5)
             
         r.raise_for_status()
         return jsonify({"status": "success", "message": "Connected to TMDB"})
@@ -747,7 +904,7 @@ def test_radarr():
         return jsonify({"status": "error", "message": "URL and API Key required"}), 400
     try:
         headers = {'X-Api-Key': api_key}
-        r = requests.get(f"{url.rstrip('/')}/api/v3/system/status", headers=headers, timeout=5)
+        r = http_client.get(f"{url.rstrip('/')}/api/v3/system/status", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": f"Connected to Radarr ({r.json().get('version', 'Unknown')})"})
     except Exception as e:
@@ -762,7 +919,7 @@ def test_sonarr():
         return jsonify({"status": "error", "message": "URL and API Key required"}), 400
     try:
         headers = {'X-Api-Key': api_key}
-        r = requests.get(f"{url.rstrip('/')}/api/v3/system/status", headers=headers, timeout=5)
+        r = http_client.get(f"{url.rstrip('/')}/api/v3/system/status", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": f"Connected to Sonarr ({r.json().get('version', 'Unknown')})"})
     except Exception as e:
@@ -777,7 +934,7 @@ def test_jellyseerr():
         return jsonify({"status": "error", "message": "URL and API Key required"}), 400
     try:
         headers = {'X-Api-Key': api_key}
-        r = requests.get(f"{url.rstrip('/')}/api/v1/status", headers=headers, timeout=5)
+        r = http_client.get(f"{url.rstrip('/')}/api/v1/status", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": f"Connected to Jellyseerr ({r.json().get('version', 'Unknown')})"})
     except Exception as e:
@@ -796,7 +953,7 @@ def test_trakt():
             'trakt-api-version': '2',
             'trakt-api-key': client_id
         }
-        r = requests.get(f"https://api.trakt.tv/users/{username}/profile", headers=headers, timeout=5)
+        r = http_client.get(f"https://api.trakt.tv/users/{username}/profile", headers=headers, timeout=5)
         r.raise_for_status()
         return jsonify({"status": "success", "message": f"Connected to Trakt (User: {r.json().get('username')})"})
     except Exception as e:
@@ -1259,7 +1416,7 @@ def get_wallpaper_status():
     max_rating_filter = request.args.get('max_rating')
     min_year_filter = request.args.get('min_year')
     max_year_filter = request.args.get('max_year')
-    sort_mode = request.args.get('sort', 'random') # random, year, rating
+    sort_mode = request.args.get('sort', 'random') # random, year, rating, latest
 
     safe_layout = "".join(c for c in layout_name if c.isalnum() or c in " ._-").strip()
     base_path = os.path.dirname(os.path.abspath(__file__))
@@ -1271,69 +1428,31 @@ def get_wallpaper_status():
         "title": None
     }
 
-    # 1. Collect Candidates from RAM Cache (No Disk I/O)
-    # Filter by layout first
-    candidates = [img for img in METADATA_CACHE["images"] if img.get('layout') == safe_layout]
-    
-    if not candidates:
-        return jsonify(response)
-
-    # 2. Filter
-    filtered = candidates
-    
-    # Rating Filter
+    # 1. Parse filters (bad numbers disable that filter, as before)
+    rating_range = year_range = None
     if min_rating_filter or max_rating_filter:
         try:
-            min_r = float(min_rating_filter) if min_rating_filter else 0.0
-            max_r = float(max_rating_filter) if max_rating_filter else 10.0
-            filtered = [c for c in filtered if min_r <= float(c.get('rating', 0)) <= max_r]
+            rating_range = (float(min_rating_filter) if min_rating_filter else 0.0,
+                            float(max_rating_filter) if max_rating_filter else 10.0)
         except: pass
-    
-    # Year Filter (Range)
+
     if min_year_filter or max_year_filter:
         try:
-            min_y = int(min_year_filter) if min_year_filter else 0
-            max_y = int(max_year_filter) if max_year_filter else 9999
-            filtered = [c for c in filtered if min_y <= int(c.get('year', 0) or 0) <= max_y]
+            year_range = (int(min_year_filter) if min_year_filter else 0,
+                          int(max_year_filter) if max_year_filter else 9999)
         except: pass
 
-    if genre_filter:
-        # Split by comma for multi-select (OR logic)
-        g_terms = [g.strip().lower() for g in genre_filter.split(',') if g.strip()]
-        if g_terms:
-            filtered = [c for c in filtered if any(term in str(c.get('genres', '')).lower() for term in g_terms)]
-        
-    if age_rating_filter:
-        # Split by comma for multi-select (OR logic)
-        a_terms = [a.strip().lower() for a in age_rating_filter.split(',') if a.strip()]
-        if a_terms:
-            # Normalize terms (remove non-alnum)
-            norm_terms = ["".join(c for c in t if c.isalnum()) for t in a_terms]
-            filtered = [c for c in filtered if any(term in "".join(k for k in str(c.get('officialRating', '')).lower() if k.isalnum()) for term in norm_terms)]
-
-    # Fallback if filter too strict
-    # If rating filter was applied and result is empty, we might want to return nothing (404 logic)
-    # or fallback to candidates. The user requested: "return fallback image (without filter)"
-    if not filtered and candidates:
-        # If specific filters failed, fallback to any image from this layout
-        filtered = candidates
-    elif not filtered:
-        return jsonify(response)
+    # Comma separated multi-select (OR logic)
+    genre_terms = [g.strip().lower() for g in (genre_filter or '').split(',') if g.strip()]
+    age_terms = [normalize_age(a.strip()) for a in (age_rating_filter or '').split(',') if a.strip()]
 
-    # 3. Sort / Pick
-    selected = None
-    if sort_mode == 'year':
-        filtered.sort(key=lambda x: int(x.get('year', 0) or 0), reverse=True)
-        selected = filtered[0]
-    elif sort_mode == 'rating':
-        filtered.sort(key=lambda x: float(x.get('rating', 0)), reverse=True)
-        selected = filtered[0]
-    elif sort_mode == 'latest':
-        # We don't have mtime in cache yet, fallback to random or add mtime to cache if needed
-        # For now, random is better than crashing
-        selected = filtered[0]
-    else: # random
-        selected = random.choice(filtered)
+    # 2. Query the layout's columns in RAM (no disk I/O). If the filters are too strict this
+    # falls back to any image of the layout; sort is year/rating/latest (top-1) or random.
+    matches = METADATA_CATALOG.query(safe_layout, rating_range=rating_range, year_range=year_range,
+                                     genre_terms=genre_terms, age_terms=age_terms, sort=sort_mode)
+    if not matches:
+        return jsonify(response)
+    selected = matches[0]
 
     # 4. Construct Response
     if selected:
@@ -1341,24 +1460,25 @@ def get_wallpaper_status():
         # The cache stores absolute path. We need relative to editor_backgrounds/LayoutName
         # But get_gallery_image expects filename relative to the folder param.
         
-        full_path = selected['path']
-        filename = os.path.basename(full_path).replace('.json', '.jpg')
+        full_path = selected.path
+        image_path = image_for_json(full_path)
+        filename = os.path.basename(image_path)
         
         # Check if it's in a subfolder (Genre sorting)
         # We can try to deduce it from the path
         layout_dir = os.path.join(base_path, 'editor_backgrounds', safe_layout)
         if full_path.startswith(layout_dir):
-            rel_path = os.path.relpath(full_path, layout_dir)
-            # rel_path might be "Action/Movie.json"
-            filename = rel_path.replace('.json', '.jpg')
+            rel_path = os.path.relpath(image_path, layout_dir)
+            # rel_path might be "Action/Movie.jpg"
+            filename = rel_path
             # Ensure slashes are correct for URL
             filename = filename.replace('\\', '/')
 
         # Use layout subfolder logic for URL
         folder_param = f"Layout: {safe_layout}"
         response["imageUrl"] = url_for('gui_editor.get_gallery_image', folder=folder_param, filename=filename, _external=True)
-        response["actionUrl"] = selected.get("action_url")
-        response["title"] = selected.get("title")
+        response["actionUrl"] = selected.action_url
+        response["title"] = selected.title
             
     return jsonify(response)
 
@@ -1431,8 +1551,9 @@ def delete_all_gallery_images():
     try:
         for filename in os.listdir(target_dir):
             file_path = os.path.join(target_dir, filename)
-            if os.path.isfile(file_path) and filename.lower().endswith(('.jpg', '.jpeg', '.png', '.json')):
+            if os.path.isfile(file_path) and filename.lower().endswith(IMAGE_EXTENSIONS + ('.json',)):
                 os.remove(file_path)
+                remove_from_metadata_cache(file_path)
         
         # Check if directory is empty and remove it if so (only for subfolders)
         if not os.listdir(target_dir) and target_dir != os.path.join(base_path, "editor_backgrounds"):
@@ -1457,8 +1578,11 @@ def save_editor_image():
     if not image_data:
         return jsonify({"status": "error", "message": "No image data"}), 400
     
+    # The data URI header tells us what the encoder produced (jpeg/webp/avif)
+    image_ext = '.jpg'
     if ',' in image_data:
-        image_data = image_data.split(',')[1]
+        header, image_data = image_data.split(',', 1)
+        image_ext = DATA_URI_EXTENSIONS.get(header[5:].split(';')[0], '.jpg')
     
     if target_type == 'layout_preview':
         folder = os.path.join("layouts", "previews")
@@ -1498,11 +1622,15 @@ def save_editor_image():
             
             filename = " - ".join(parts) + ".jpg"
 
+    # The extension always follows the encoded format (also for overwrite_filename)
+    filename = os.path.splitext(filename)[0] + image_ext
+
     filepath = os.path.join(full_path, filename)
     
     try:
         with open(filepath, "wb") as f:
             f.write(base64.b64decode(image_data))
+        remove_stale_images(filepath)
             
         # Save JSON data if provided
         if canvas_json:
@@ -1598,12 +1726,12 @@ def list_gallery_images():
                     subdirs = [d for d in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, d))]
                     if not subdirs:
                         # Fallback for root files
-                        images = [f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+                        images = [f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
                         if images: gallery["Editor (Unsorted)"] = sorted(images)
                     else:
                         for subdir in subdirs:
                             sub_path = os.path.join(folder_path, subdir)
-                            images = [f for f in os.listdir(sub_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+                            images = [f for f in os.listdir(sub_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
                             if images: gallery[f"Layout: {subdir}"] = sorted(images)
                 except: pass
             elif folder == "layouts":
@@ -1614,11 +1742,11 @@ def list_gallery_images():
                         subdirs = [d for d in os.listdir(previews_dir) if os.path.isdir(os.path.join(previews_dir, d))]
                         for subdir in subdirs:
                             sub_path = os.path.join(previews_dir, subdir)
-                            images = [f for f in os.listdir(sub_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+                            images = [f for f in os.listdir(sub_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
                             if images: gallery[f"LayoutPreview: {subdir}"] = sorted(images)
                     except: pass
             elif folder != "layouts":
-                images = [f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+                images = [f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
                 if images:
                     gallery[folder] = sorted(images)
     return jsonify(gallery)
@@ -0,0 +1,147 @@
+"""
+Shared HTTP client for all upstream providers (Jellyfin, Plex, TMDB, Trakt, Radarr/Sonarr, ...).
+
+One requests.Session per host, so repeated calls reuse keep-alive connections instead of
+opening a new TCP/TLS connection every time. Every call gets DEFAULT_TIMEOUT unless it passes
+its own, and per-host request counts, errors and latencies are kept (see stats()).
+The sessions are shared by all callers, so they never store cookies (pass cookies= per call).
+Drop-in for the requests module functions:
+
+    import http_client
+    r = http_client.get(url, headers=headers, params=params)
+
+Latency is measured up to the response headers (for stream=True, the body is not included).
+"""
+import os
+import time
+import threading
+from collections import deque
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+POOL_CONNECTIONS = 4       # connection pools kept per session (one session per host)
+POOL_MAXSIZE = 16          # keep-alive connections per host (Flask threads + batch workers)
+
+class HostStats:
+    """Request count, errors and recent latencies for one host."""
+    def __init__(self, max_samples=500):
+        self.requests = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, seconds, ok):
+        self.requests += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def to_dict(self):
+        samples = sorted(self.samples)
+        pick = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else 0.0
+        return {"requests": self.requests, "errors": self.errors,
+                "mean_ms": round(self.total / self.requests * 1000, 1) if self.requests else 0.0,
+                "p50_ms": pick(0.5), "p95_ms": pick(0.95)}
+
+class HttpClient:
+    """Per-host pooled sessions with default timeouts and latency metrics."""
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+        self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        """scheme://host[:port] of a URL (credentials dropped), the key for sessions and stats."""
+        parts = urlsplit(url)
+        return f"{parts.scheme.lower()}://{parts.netloc.rsplit('@', 1)[-1].lower()}"
+
+    def session(self, url):
+        """The shared Session for the URL's host (created on first use)."""
+        host = self.host(url)
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Shared by every caller of the host: never keep cookies from one for the next
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Like requests.request(), on the host's pooled session and with the default timeout."""
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session(url).request(method, url, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._record(url, time.perf_counter() - start, ok)
+
+    def _record(self, url, seconds, ok):
+        host = self.host(url)
+        with self._lock:
+            entry = self._stats.get(host)
+            if entry is None:
+                entry = self._stats[host] = HostStats()
+            entry.add(seconds, ok)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def stats(self):
+        """{host: {requests, errors, mean_ms, p50_ms, p95_ms}}."""
+        with self._lock:
+            return {host: entry.to_dict() for host, entry in sorted(self._stats.items())}
+
+    def close(self):
+        """Closes all pooled connections (sessions are recreated on the next request)."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _after_fork(self):
+        # A forked child must not share the parent's sockets; it starts with fresh pools
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+# Process-wide client used by the module-level helpers
+CLIENT = HttpClient()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=CLIENT._after_fork)
+
+def request(method, url, **kwargs):
+    return CLIENT.request(method, url, **kwargs)
+
+def get(url, **kwargs):
+    return CLIENT.get(url, **kwargs)
+
+def post(url, **kwargs):
+    return CLIENT.post(url, **kwargs)
+
+def head(url, **kwargs):
+    return CLIENT.head(url, **kwargs)
+
+def stats():
+    return CLIENT.stats()
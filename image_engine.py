@@ -1,93 +1,1376 @@
 import os
-import textwrap
+import json
+import math
+import hashlib
+import logging
+import time
+import threading
+import tracemalloc
 import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, wraps
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageColor
 import numpy as np
-from PIL import ImageFilter
+from PIL import ImageFilter, features
+
+logger = logging.getLogger(__name__)
+
+class FontRegistry:
+    """
+    Process-wide cache of loaded FreeType fonts with LRU eviction.
+    Keyed by (path, size, index, layout engine), so every engine instance and script
+    asking for the same face gets the same object instead of re-parsing the font file.
+    """
+    def __init__(self, max_fonts=64):
+        self.max_fonts = max_fonts
+        self.loads = 0
+        self.hits = 0
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, size, index=0, layout_engine=None):
+        key = (os.path.abspath(path) if isinstance(path, str) else path, size, index, layout_engine)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+
+        # Load outside the lock; raises like ImageFont.truetype if the font is missing
+        font = ImageFont.truetype(path, size=size, index=index, layout_engine=layout_engine)
+        with self._lock:
+            self.loads += 1
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+    def stats(self):
+        with self._lock:
+            return {"loads": self.loads, "hits": self.hits, "cached": len(self._fonts)}
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+
+FONTS = FontRegistry()
+
+def get_font(path, size, index=0, layout_engine=None):
+    """Returns a cached ImageFont.truetype() font from the process-wide registry."""
+    return FONTS.get(path, size, index=index, layout_engine=layout_engine)
+
+def draft_image(image, min_width=None, min_height=None):
+    """
+    Lets a not-yet-decoded JPEG decode at the smallest power-of-two scale (1/2, 1/4, 1/8)
+    that still covers min_width x min_height (aspect ratio kept if only one is given).
+    The caller does the final high-quality resize. No-op for other formats or loaded images.
+    """
+    if getattr(image, 'format', None) != 'JPEG' or not (min_width or min_height):
+        return image
+    w, h = image.size
+    if not min_width: min_width = math.ceil(w * min_height / h)
+    if not min_height: min_height = math.ceil(h * min_width / w)
+    image.draft(image.mode, (min_width, min_height))
+    return image
+
+def open_image(source, min_width=None, min_height=None):
+    """Opens an image from bytes, a path or a file object, decoding JPEGs at reduced scale when possible."""
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    return draft_image(Image.open(source), min_width=min_width, min_height=min_height)
+
+def _file_signature(path):
+    """(mtime, size) of a file, used to notice when cached assets change on disk."""
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def _scaled(image, scale):
+    """Resizes a 4K-reference asset for another resolution profile."""
+    if scale == 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+class StaticLayers:
+    """
+    Decoded background + overlay for one (background, overlay, artwork position) combination.
+    `composed` is the background with the overlay already blended in, so per item only the
+    artwork region has to be replaced and re-blended with the overlay. Canvases are RGB;
+    alpha only lives on the source layers (overlay, logos, text sprites).
+    """
+    def __init__(self, background_path, overlay_path, position, scale=1.0):
+        self.signature = (_file_signature(background_path), _file_signature(overlay_path))
+        self.position = position
+        self.base = _scaled(Image.open(background_path).convert('RGBA'), scale)
+        self.overlay = _scaled(Image.open(overlay_path).convert('RGBA'), scale)
+        self.composed = self.base.convert('RGB')
+        self.composed.paste(self.overlay, position, self.overlay)
+        self._overlay_crops = {}
+
+    def _overlay_for(self, size):
+        """Overlay cropped to the artwork footprint (cached per artwork size)."""
+        w = min(size[0], self.overlay.width)
+        h = min(size[1], self.overlay.height)
+        if (w, h) == self.overlay.size:
+            return self.overlay
+        if (w, h) not in self._overlay_crops:
+            self._overlay_crops[(w, h)] = self.overlay.crop((0, 0, w, h))
+        return self._overlay_crops[(w, h)]
+
+    def compose(self, artwork):
+        """Returns a new canvas: background, artwork at `position`, overlay on top."""
+        canvas = self.composed.copy()
+        canvas.paste(artwork, self.position)
+        overlay = self._overlay_for(artwork.size)
+        canvas.paste(overlay, self.position, overlay)
+        return canvas
+
+class StaticLayerCache:
+    """Process-wide StaticLayers cache; entries are rebuilt when either file changes on disk."""
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, background_path, overlay_path, position=(1175, 0), scale=1.0):
+        key = (os.path.abspath(background_path), os.path.abspath(overlay_path), tuple(position), scale)
+        signature = (_file_signature(key[0]), _file_signature(key[1]))
+        with self._lock:
+            layers = self._entries.get(key)
+        if layers is None or layers.signature != signature:
+            layers = StaticLayers(key[0], key[1], key[2], scale)
+            with self._lock:
+                self._entries[key] = layers
+        return layers
+
+STATIC_LAYERS = StaticLayerCache()
+
+# Multi-resolution blur: large radii are blurred on a small proxy and upsampled again.
+# The proxy is sized so the blur radius shrinks to ~BLUR_PROXY_RADIUS px, but never below BLUR_PROXY_MIN_EDGE.
+BLUR_PROXY_RADIUS = 8
+BLUR_PROXY_MIN_EDGE = 128
+
+def blur_scale(size, blur_radius):
+    """Returns the downsample factor used to blur an output of `size` with `blur_radius`."""
+    if blur_radius <= BLUR_PROXY_RADIUS:
+        return 1.0
+    return max(1.0, min(blur_radius / BLUR_PROXY_RADIUS, min(size) / BLUR_PROXY_MIN_EDGE))
+
+def blur_background(image, size=(3840, 2160), blur_radius=800):
+    """
+    Resizes the image to `size` and applies a Gaussian blur of `blur_radius`.
+    The blur runs on a downsampled proxy at the equivalent radius, then gets upsampled.
+    Close to resize + GaussianBlur at full size: on photos the mean deviation stays below 2 and
+    the maximum around 12 per channel (8-bit), see tests/test_image_engine.py.
+    """
+    scale = blur_scale(size, blur_radius)
+    if scale <= 1.0:
+        return image.resize(size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(radius=blur_radius))
+
+    proxy_size = (max(1, round(size[0] / scale)), max(1, round(size[1] / scale)))
+    proxy = image.resize(proxy_size, Image.LANCZOS, reducing_gap=3.0)
+    proxy = proxy.filter(ImageFilter.GaussianBlur(radius=blur_radius / scale))
+    return proxy.resize(size, Image.BILINEAR)
+
+# Dithering: a small tileable blue-noise texture is built once and tiled over the frame.
+DITHER_TILE_SIZE = 128
+
+@lru_cache(maxsize=4)
+def dither_tile(strength=16, size=DITHER_TILE_SIZE):
+    """
+    Returns a tileable blue-noise tile (size x size x 3, int16) evenly spread over [-strength, strength].
+    White noise is high-passed in the frequency domain (periodic, so it tiles seamlessly)
+    and rank-mapped back to a uniform distribution. Cached tiles are shared: treat them as read-only.
+    """
+    rng = np.random.default_rng(0)
+    white = rng.standard_normal((3, size, size))
+    fy, fx = np.fft.fftfreq(size)[:, None], np.fft.fftfreq(size)[None, :]
+    noise = np.real(np.fft.ifft2(np.fft.fft2(white) * np.sqrt(fx ** 2 + fy ** 2)))
+
+    ranks = noise.reshape(3, -1).argsort(axis=1).argsort(axis=1)
+    tile = np.rint(ranks / (size * size - 1) * 2 * strength - strength)
+    return tile.reshape(3, size, size).transpose(1, 2, 0).astype(np.int16)
+
+def _dither_rows(work, row, darken):
+    """Adds the tiled noise rows (if any) to an int16 block starting on a tile boundary, then darkens it in place."""
+    if row is not None:
+        th = row.shape[0]
+        for y in range(0, work.shape[0], th):
+            band = work[y:y + th]
+            band += row[:band.shape[0]]
+        np.clip(work, 0, 255, out=work)
+
+    if darken != 1.0:
+        # Fixed-point multiply (8 fractional bits); values are 0-255 here, so the uint16 view is safe
+        scaled = work.view(np.uint16)
+        scaled *= min(256, max(0, round(darken * 256)))
+        scaled >>= 8
+
+def apply_dither(image, strength=16, darken=1.0, strip_rows=None):
+    """
+    Adds tiled dither noise to an RGB image and scales it by `darken` in a single int16 pass.
+    Equivalent to clip(img + noise) * darken, without full-frame float or noise buffers.
+    With strip_rows the frame is processed in horizontal strips of about that many rows,
+    written back into `image` (same result, only one strip is ever widened to int16).
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    w, h = image.size
+    row = None
+    if strength:
+        tile = dither_tile(strength)
+        row = np.tile(tile, (1, -(-w // tile.shape[1]), 1))[:, :w]
+
+    if not strip_rows:
+        work = np.array(image, dtype=np.int16)
+        _dither_rows(work, row, darken)
+        return Image.fromarray(work.astype(np.uint8))
+
+    # Strips start on tile boundaries so the noise pattern is the same as in one pass
+    rows = -(-strip_rows // DITHER_TILE_SIZE) * DITHER_TILE_SIZE
+    for y in range(0, h, rows):
+        box = (0, y, w, min(h, y + rows))
+        work = np.asarray(image.crop(box), dtype=np.int16)
+        _dither_rows(work, row, darken)
+        image.paste(Image.fromarray(work.astype(np.uint8)), box[:2])
+    return image
+
+def gray_std(image):
+    """Standard deviation of an image's grayscale values, computed from its histogram."""
+    hist = np.array(image.convert('L').histogram(), dtype=np.float64)
+    levels = np.arange(256)
+    mean = (hist * levels).sum() / hist.sum()
+    return float(np.sqrt((hist * (levels - mean) ** 2).sum() / hist.sum()))
+
+def _vignette_ramp(length, fade_ratio, fade_power, offset=0, reverse=False):
+    """1D fade ramp (0-255) along one axis, already raised to fade_power."""
+    pos = np.arange(length, dtype=np.float64)
+    dist = (length - pos - offset) if reverse else (pos - offset)
+    ramp = np.clip(dist / (length * fade_ratio), 0, 1) ** fade_power * 255
+    return ramp.astype(np.uint8)
+
+@lru_cache(maxsize=8)
+def vignette_mask(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left", offset_left=0, offset_bottom=0, blur_radius=0):
+    """
+    Builds (and caches) an 'L' vignette mask of size w x h fading towards `position`.
+    offset_left / offset_bottom shift the start of the fade inward in pixels.
+    The mask is built from two 1D ramps broadcast against each other, so only the
+    final uint8 frame is allocated. Cached masks are shared: treat them as read-only.
+    """
+    horizontal = "left" in position or "right" in position
+    vertical = "top" in position or "bottom" in position
+
+    ramp_x = np.full(w, 255, dtype=np.uint8)
+    ramp_y = np.full(h, 255, dtype=np.uint8)
+    if "left" in position: ramp_x = _vignette_ramp(w, fade_ratio, fade_power, offset=offset_left)
+    elif "right" in position: ramp_x = _vignette_ramp(w, fade_ratio, fade_power, reverse=True)
+    if "top" in position: ramp_y = _vignette_ramp(h, fade_ratio, fade_power)
+    elif "bottom" in position: ramp_y = _vignette_ramp(h, fade_ratio, fade_power, offset=offset_bottom, reverse=True)
+
+    # Corners use the minimum of both fades (identical to min() before the power, as x**p is monotonic)
+    if horizontal and vertical:
+        alpha = np.minimum(ramp_y[:, None], ramp_x[None, :])
+    else:
+        alpha = np.ascontiguousarray(np.broadcast_to(ramp_y[:, None] if vertical else ramp_x[None, :], (h, w)))
+
+    mask = Image.fromarray(alpha)
+    if blur_radius:
+        mask = mask.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    return mask
+
+class TextSpriteCache:
+    """
+    LRU cache of pre-rendered text sprites (text + drop shadow as one RGBA image).
+    A cached sprite is composited onto the canvas with a single alpha paste.
+    Bounded by the total size of the stored sprites (max_bytes).
+    """
+    SUBPIXEL_STEPS = 4  # horizontal/vertical positions are quantised to 1/4 px
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text, font, fill, shadow, shadow_offset, pos):
+        """Returns (sprite, (x, y)) with the canvas position the sprite must be pasted at."""
+        x, y = pos
+        ix, iy = math.floor(x), math.floor(y)
+        fx = round((x - ix) * self.SUBPIXEL_STEPS) / self.SUBPIXEL_STEPS
+        fy = round((y - iy) * self.SUBPIXEL_STEPS) / self.SUBPIXEL_STEPS
+        key = (getattr(font, 'path', id(font)), getattr(font, 'size', 0), getattr(font, 'index', 0),
+               getattr(font, 'layout_engine', None), text, str(fill), str(shadow), shadow_offset, fx, fy)
+
+        with self._lock:
+            entry = self._sprites.get(key)
+            if entry is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            entry = self._render(text, font, fill, shadow, shadow_offset, fx, fy)
+            self._store(key, entry)
+
+        sprite, (ox, oy) = entry
+        return sprite, (ix + ox, iy + oy)
+
+    def _render(self, text, font, fill, shadow, shadow_offset, fx, fy):
+        left, top, right, bottom = font.getbbox(text)
+        # 1px margin for subpixel offsets, plus room for the shadow
+        x0 = left - 1 + min(0, shadow_offset)
+        y0 = top - 1 + min(0, shadow_offset)
+        size = (right - left + abs(shadow_offset) + 3, bottom - top + abs(shadow_offset) + 3)
+
+        layers = []
+        for color, off in ((shadow, shadow_offset), (fill, 0)):
+            rgba = ImageColor.getcolor(color, 'RGBA') if isinstance(color, str) else (tuple(color) + (255,))[:4]
+            # The color's own alpha scales the glyph coverage (semi-transparent text stays translucent)
+            mask = Image.new('L', size, 0)
+            ImageDraw.Draw(mask).text((fx - x0 + off, fy - y0 + off), text, font=font, fill=rgba[3])
+            layer = Image.new('RGBA', size, rgba[:3] + (255,))
+            layer.putalpha(mask)
+            layers.append(layer)
+
+        # Porter-Duff "over" is associative, so pasting the composite equals drawing shadow then fill
+        return Image.alpha_composite(layers[0], layers[1]), (x0, y0)
+
+    def _store(self, key, entry):
+        nbytes = entry[0].width * entry[0].height * 4
+        with self._lock:
+            self.misses += 1
+            if key in self._sprites or nbytes > self.max_bytes:
+                return
+            self._sprites[key] = entry
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (old, _) = self._sprites.popitem(last=False)
+                self.current_bytes -= old.width * old.height * 4
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._sprites), "bytes": self.current_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._sprites.clear()
+            self.current_bytes = 0
+
+# Shared by all ImageGenerator instances in the process
+TEXT_SPRITES = TextSpriteCache()
+
+def image_digest(image):
+    """Content hash of an image's decoded pixels (mode and size included)."""
+    h = hashlib.sha1(f"{image.mode}{image.size}".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+def bytes_digest(data):
+    """Content hash of encoded image bytes (e.g. a download), usable before decoding."""
+    return hashlib.sha1(data).hexdigest()
+
+class LogoCache:
+    """
+    LRU cache of processed logos (contrast fix, auto-crop, resize) keyed by the source's
+    content hash plus (threshold, max_w, max_h); max_w/max_h are None for contrast-only results.
+    Bounded by the total size of the stored RGBA logos (max_bytes).
+    Cached logos are shared, so callers must not modify them in place.
+    """
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._logos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest, threshold, max_w, max_h):
+        key = (digest, threshold, max_w, max_h)
+        with self._lock:
+            logo = self._logos.get(key)
+            if logo is None:
+                self.misses += 1
+            else:
+                self._logos.move_to_end(key)
+                self.hits += 1
+            return logo
+
+    def put(self, digest, threshold, max_w, max_h, logo):
+        key = (digest, threshold, max_w, max_h)
+        nbytes = logo.width * logo.height * len(logo.getbands())
+        with self._lock:
+            if key in self._logos or nbytes > self.max_bytes:
+                return
+            self._logos[key] = logo
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, old = self._logos.popitem(last=False)
+                self.current_bytes -= old.width * old.height * len(old.getbands())
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._logos), "bytes": self.current_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._logos.clear()
+            self.current_bytes = 0
+
+# Shared by all ImageGenerator instances and the image proxy
+LOGOS = LogoCache()
+
+# --- BACKDROP EDGE COLOR (auto background color, shared with render_task.js) ---
+EDGE_SAMPLE_SIZE = 200
+EDGE_BORDER = 10  # 5% of the sample, like the editor
+
+@lru_cache(maxsize=8)
+def _edge_mask(size, border):
+    """Border pixels of a size x size sample, with the same bounds as render_task.js."""
+    idx = np.arange(size)
+    edge = (idx < border) | (idx > size - border)
+    return edge[:, None] | edge[None, :]
+
+def edge_mean(image, size=EDGE_SAMPLE_SIZE, border=EDGE_BORDER):
+    """Average (r, g, b) of the border of the image scaled to size x size, floored like the JS sampler."""
+    sample = np.asarray(image.convert('RGB').resize((size, size), Image.BILINEAR, reducing_gap=3.0))
+    edge = sample[_edge_mask(size, border)]
+    return tuple(int(c) for c in edge.sum(axis=0, dtype=np.int64) // len(edge))
+
+def edge_color(mean, brightness=20):
+    """Applies the brightness percentage (bgBrightness) to an edge mean; returns ((r, g, b), '#rrggbb')."""
+    factor = brightness / 100
+    rgb = tuple(max(0, min(255, math.floor(c * factor))) for c in mean)
+    return rgb, '#%02x%02x%02x' % rgb
+
+class EdgeColorCache:
+    """
+    LRU cache of backdrop edge means keyed by the backdrop's content hash, or by any other
+    stable key such as its URL (so a hit can skip the download). Only the unscaled mean is
+    stored; the brightness factor is applied per call.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._means = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, key):
+        """Edge mean stored under key, or None (a miss is counted when get() computes it)."""
+        with self._lock:
+            mean = self._means.get(key)
+            if mean is not None:
+                self._means.move_to_end(key)
+                self.hits += 1
+            return mean
+
+    def get(self, source, digest=None):
+        """Edge mean of a backdrop given as encoded bytes or an Image (cached only with a digest or key)."""
+        if digest is None and isinstance(source, (bytes, bytearray)):
+            digest = bytes_digest(source)
+        if digest is not None:
+            mean = self.cached(digest)
+            if mean is not None:
+                return mean
+            with self._lock:
+                self.misses += 1
+
+        if isinstance(source, (bytes, bytearray)):
+            source = open_image(source, min_width=EDGE_SAMPLE_SIZE, min_height=EDGE_SAMPLE_SIZE)
+        mean = edge_mean(source)
+        if digest is not None:
+            with self._lock:
+                self._means[digest] = mean
+                while len(self._means) > self.max_entries:
+                    self._means.popitem(last=False)
+        return mean
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._means)}
+
+    def clear(self):
+        with self._lock:
+            self._means.clear()
+
+# Shared by the Python color canvases and the Node renderer payload
+EDGE_COLORS = EdgeColorCache()
+
+def backdrop_edge_color(source, brightness=20, digest=None):
+    """Auto background color of a backdrop (bytes or Image): ((r, g, b), '#rrggbb')."""
+    return edge_color(EDGE_COLORS.get(source, digest=digest), brightness)
+
+class TextMetrics:
+    """
+    Analytic text measurement (visual bounding boxes) without temporary canvases.
+    Line boxes come from font.getbbox and are memoised per (font, text) in a bounded LRU.
+    getbbox spans the glyph boxes rather than the inked pixels, so sizes are never smaller
+    than a pixel scan of the drawn text and at most ~1/4 of the font size larger
+    (e.g. Andika Bold at 190 pt: +19 px wide, +33 px high); see tests/test_image_engine.py.
+    """
+    MULTILINE_SPACING = 4  # Pillow's default spacing between lines
+
+    def __init__(self, max_entries=8192):
+        self.max_entries = max_entries
+        self._boxes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def font_key(font):
+        return (getattr(font, 'path', id(font)), getattr(font, 'size', 0), getattr(font, 'index', 0), getattr(font, 'layout_engine', None))
+
+    @staticmethod
+    def _line_box(font, line):
+        if not line.strip(): return None
+        box = font.getbbox(line)
+        return box if box[2] > box[0] and box[3] > box[1] else None
+
+    def ink_bbox(self, font, text):
+        """Visual bounding box of `text` drawn at (0, 0), or None if nothing is visible."""
+        key = (self.font_key(font), text)
+        with self._lock:
+            if key in self._boxes:
+                self._boxes.move_to_end(key)
+                return self._boxes[key]
+
+        box = None
+        line_spacing = font.getbbox("A")[3] + self.MULTILINE_SPACING
+        for n, line in enumerate(text.split('\n')):
+            ink = self._line_box(font, line)
+            if not ink: continue
+            y = n * line_spacing
+            ink = (ink[0], ink[1] + y, ink[2], ink[3] + y)
+            box = ink if box is None else (min(box[0], ink[0]), min(box[1], ink[1]), max(box[2], ink[2]), max(box[3], ink[3]))
+
+        with self._lock:
+            self._boxes[key] = box
+            if len(self._boxes) > self.max_entries:
+                self._boxes.popitem(last=False)
+        return box
+
+    def visual_size(self, font, text, shadow_offset=0):
+        """(width, height) of the text plus its drop shadow."""
+        box = self.ink_bbox(font, text) if text else None
+        if not box: return 0, 0
+        return round(box[2] - box[0]) + abs(shadow_offset), round(box[3] - box[1]) + abs(shadow_offset)
+
+    def run_width(self, font, pieces, shadow_offset=0):
+        """Visual width of text pieces drawn one after another (advancing by getlength), plus shadow."""
+        cursor = 0.0
+        left = right = None
+        for piece in pieces:
+            box = self.ink_bbox(font, piece)
+            if box:
+                left = cursor + box[0] if left is None else min(left, cursor + box[0])
+                right = cursor + box[2] if right is None else max(right, cursor + box[2])
+            cursor += font.getlength(piece)
+        if left is None: return 0
+        return round(right - left) + abs(shadow_offset)
+
+TEXT_METRICS = TextMetrics()
+
+class TextWrapper:
+    """
+    Pixel-width word wrapping from cached glyph advances.
+    Advances are fetched once per (font, character); a string's cumulative widths come from
+    one numpy cumsum and line breaks are found by binary search. Each finished line is checked
+    once with font.getlength (kerning included). Results are memoised per (font, text, width, lines).
+    """
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._advances = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cumulative(self, font, fkey, text):
+        """cum[i] = advance width of text[:i]."""
+        table = self._advances.get(fkey)
+        if table is None:
+            table = self._advances.setdefault(fkey, {})
+        for ch in set(text).difference(table):
+            table[ch] = font.getlength(ch)
+        advances = np.fromiter((table[ch] for ch in text), dtype=np.float64, count=len(text))
+        cum = np.empty(len(text) + 1)
+        cum[0] = 0.0
+        np.cumsum(advances, out=cum[1:])
+        return cum
+
+    @staticmethod
+    def _fit(font, text, cum, spaces, start, limit):
+        """End (exclusive) of the longest line from `start` no wider than `limit`, breaking at spaces when possible."""
+        n = len(text)
+        # Largest end with cum[end] - cum[start] <= limit
+        end = int(np.searchsorted(cum, cum[start] + limit, side='right')) - 1
+        if end >= n:
+            end = n
+        else:
+            k = int(np.searchsorted(spaces, end, side='right')) - 1
+            end = int(spaces[k]) if k >= 0 and spaces[k] > start else max(end, start + 1)
+
+        # Summed advances ignore kerning; confirm with one real measurement, backing off if needed
+        while end > start + 1 and font.getlength(text[start:end]) > limit:
+            k = int(np.searchsorted(spaces, end - 1, side='right')) - 1
+            end = int(spaces[k]) if k >= 0 and spaces[k] > start else end - 1
+        return end
+
+    def wrap(self, font, text, max_width, max_lines=None, ellipsis="..."):
+        """
+        Wraps text into lines no wider than max_width pixels. Words longer than a line are split.
+        With max_lines, overflowing text is cut at a word boundary and ended with the ellipsis.
+        """
+        text = " ".join((text or "").split())
+        if not text:
+            return []
+        fkey = TextMetrics.font_key(font)
+        key = (fkey, text, max_width, max_lines, ellipsis)
+        with self._lock:
+            lines = self._results.get(key)
+            if lines is not None:
+                self._results.move_to_end(key)
+                return list(lines)
+
+        cum = self._cumulative(font, fkey, text)
+        spaces = np.flatnonzero(np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32) == 32)
+        n = len(text)
+        lines = []
+        start = 0
+        while start < n:
+            end = self._fit(font, text, cum, spaces, start, max_width)
+            if max_lines and len(lines) == max_lines - 1 and end < n:
+                # Last allowed line: leave room for the ellipsis
+                end = self._fit(font, text, cum, spaces, start, max_width - font.getlength(ellipsis))
+                lines.append(text[start:end].rstrip(" ,;:.-") + ellipsis)
+                break
+            lines.append(text[start:end])
+            start = end + 1 if end < n and text[end] == ' ' else end
+
+        with self._lock:
+            self._results[key] = tuple(lines)
+            if len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return lines
+
+TEXT_WRAPPER = TextWrapper()
+
+def wrap_text(font, text, max_width, max_lines=None, ellipsis="..."):
+    """Wraps text to a pixel width (see TextWrapper.wrap)."""
+    return TEXT_WRAPPER.wrap(font, text, max_width, max_lines, ellipsis)
+
+# Output formats: config name -> (Pillow format, file extension, mimetype)
+ENCODER_FORMATS = {
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'avif': ('AVIF', '.avif', 'image/avif'),
+}
+
+def encoder_supported(name):
+    """True if this Pillow build can write the given output format."""
+    if name not in ENCODER_FORMATS:
+        return False
+    if name == 'jpeg':
+        return True
+    Image.init()
+    if ENCODER_FORMATS[name][0] not in Image.SAVE:
+        return False
+    try:
+        return features.check_module(name)
+    except ValueError:
+        return False
+
+class EncodeResult:
+    """An encoded image plus what it cost: size in bytes and encode time."""
+    def __init__(self, data, format, quality, seconds, attempts=1):
+        self.data = data
+        self.format = format
+        self.quality = quality
+        self.seconds = seconds
+        self.attempts = attempts
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def extension(self):
+        return ENCODER_FORMATS[self.format][1]
+
+    @property
+    def mimetype(self):
+        return ENCODER_FORMATS[self.format][2]
+
+    def __repr__(self):
+        return (f"{self.format.upper()} q{self.quality}: {self.size / 1024:.0f} KB "
+                f"in {self.seconds * 1000:.0f} ms ({self.attempts} pass{'es' if self.attempts != 1 else ''})")
+
+# Default quality of ImageGenerator.save() when no editor.output is configured (Pillow's JPEG default,
+# what the provider scripts always wrote)
+SCRIPT_JPEG_QUALITY = 75
+
+class OutputEncoder:
+    """
+    Encodes finished canvases. Configured from config.json's editor.output block:
+    format (jpeg/webp/avif), quality, progressive, optimize, subsampling ("4:4:4", "4:2:2", "4:2:0")
+    and target_bytes. With a byte target the highest quality between min_quality and quality
+    that fits is searched for; if nothing fits, min_quality is used.
+    """
+    def __init__(self, format='jpeg', quality=95, progressive=False, optimize=False,
+                 subsampling=None, target_bytes=0, min_quality=50):
+        format = str(format or 'jpeg').lower()
+        if format == 'jpg':
+            format = 'jpeg'
+        if not encoder_supported(format):
+            print(f"Output format '{format}' is not supported by this Pillow build, using JPEG.")
+            format = 'jpeg'
+        self.format = format
+        self.quality = max(1, min(100, int(quality)))
+        self.progressive = bool(progressive)
+        self.optimize = bool(optimize)
+        self.subsampling = subsampling or None
+        self.target_bytes = int(target_bytes or 0)
+        self.min_quality = max(1, min(self.quality, int(min_quality)))
+
+    @classmethod
+    def from_config(cls, config):
+        opts = ((config or {}).get('editor') or {}).get('output') or {}
+        try:
+            return cls(format=opts.get('format', 'jpeg'), quality=opts.get('quality', 95),
+                       progressive=opts.get('progressive', False), optimize=opts.get('optimize', False),
+                       subsampling=opts.get('subsampling'), target_bytes=opts.get('target_bytes', 0),
+                       min_quality=opts.get('min_quality', 50))
+        except (TypeError, ValueError) as e:
+            print(f"Invalid editor.output settings ({e}), using defaults.")
+            return cls()
+
+    @property
+    def extension(self):
+        return ENCODER_FORMATS[self.format][1]
+
+    @property
+    def mimetype(self):
+        return ENCODER_FORMATS[self.format][2]
+
+    def _options(self, quality):
+        opts = {'quality': quality}
+        if self.format == 'jpeg':
+            opts['optimize'] = self.optimize
+            opts['progressive'] = self.progressive
+            if self.subsampling:
+                opts['subsampling'] = self.subsampling
+        elif self.format == 'webp':
+            # Lossy WebP is always 4:2:0; optimize buys the slowest/best method
+            opts['method'] = 6 if self.optimize else 4
+        elif self.format == 'avif':
+            if self.subsampling:
+                opts['subsampling'] = self.subsampling
+            if self.optimize:
+                opts['speed'] = 4
+        return opts
+
+    def _encode(self, image, quality):
+        buf = BytesIO()
+        image.save(buf, ENCODER_FORMATS[self.format][0], **self._options(quality))
+        return buf.getvalue()
+
+    def encode(self, image):
+        """Encodes an image and returns an EncodeResult."""
+        start = time.perf_counter()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        tried = {self.quality: self._encode(image, self.quality)}
+        quality = self.quality
+        if self.target_bytes and len(tried[quality]) > self.target_bytes:
+            # Binary search for the highest quality that fits the budget
+            quality = self.min_quality
+            lo, hi = self.min_quality, self.quality - 1
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                tried[mid] = self._encode(image, mid)
+                if len(tried[mid]) <= self.target_bytes:
+                    quality = mid
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            if quality not in tried:
+                tried[quality] = self._encode(image, quality)
+
+        return EncodeResult(tried[quality], self.format, quality, time.perf_counter() - start, len(tried))
+
+class RenderTrace:
+    """
+    Timings of one render. Every traced method and stage adds a span
+    (stage, nesting depth, start offset, duration); times are perf_counter seconds.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+        self.finished = False
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.spans.append((stage, self.depth, start - self.started, time.perf_counter() - start))
+
+    @property
+    def total_seconds(self):
+        return sum(d for _, depth, _, d in self.spans if depth == 0)
+
+    def stage_totals(self):
+        """{stage: (calls, seconds)} summed over the render."""
+        totals = {}
+        for stage, _, _, duration in self.spans:
+            count, total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + 1, total + duration)
+        return totals
+
+    def to_dict(self):
+        return {
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "stages": {stage: {"count": c, "total_ms": round(t * 1000, 3)} for stage, (c, t) in self.stage_totals().items()},
+            "spans": [{"stage": stage, "depth": depth, "start_ms": round(start * 1000, 3), "ms": round(d * 1000, 3)}
+                      for stage, depth, start, d in sorted(self.spans, key=lambda sp: sp[2])],
+        }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+class TraceStats:
+    """Aggregates finished RenderTraces: per-stage call count, total and p50/p95 call time."""
+    def __init__(self, max_samples=2000):
+        self.max_samples = max_samples
+        self.renders = 0
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self.renders += 1
+            for stage, _, _, duration in trace.spans:
+                entry = self._stages.get(stage)
+                if entry is None:
+                    entry = self._stages[stage] = [0, 0.0, deque(maxlen=self.max_samples)]
+                entry[0] += 1
+                entry[1] += duration
+                entry[2].append(duration)
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for stage, (count, total, samples) in self._stages.items():
+                p50, p95 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95])
+                out[stage] = {"count": count, "total_ms": round(total * 1000, 3),
+                              "p50_ms": round(p50 * 1000, 3), "p95_ms": round(p95 * 1000, 3)}
+            return {"renders": self.renders, "stages": out}
+
+    def to_json(self, path=None):
+        text = json.dumps(self.stats(), indent=2)
+        if path:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def clear(self):
+        with self._lock:
+            self.renders = 0
+            self._stages.clear()
+
+# --- MEMORY BUDGET MODE ---
+MEMORY_STRIP_ROWS = 256  # rows per strip for full-frame numpy passes
+# Starting estimate of a render's peak RSS growth, in full RGB frames of the profile: a cold 4K
+# color render of a 4K backdrop peaks at 104-112 MB (4.4-4.7 frames). Larger sources need more; once
+# renders have run, render_footprint() follows their measured peaks instead (see MemoryProbe).
+# Plus the resident size of an idle render worker (interpreter, numpy, Pillow, fonts, layers;
+# ~135 MB at 4K).
+MEMORY_FRAMES_PER_RENDER = 5
+MEMORY_WORKER_BASE = 160 * 1024 * 1024
+
+def _proc_status_bytes(field):
+    """A 'kB' field of /proc/self/status in bytes (None where /proc is unavailable)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """Resets the process peak RSS (Linux 4.0+); returns False if the kernel does not allow it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss():
+    """Peak resident set size of the process in bytes (since the last reset_peak_rss())."""
+    peak = _proc_status_bytes('VmHWM')
+    if peak is None:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            peak = 0
+    return peak
+
+_TRACEMALLOC_LOCK = threading.Lock()
+_TRACEMALLOC_USERS = 0
+_TRACEMALLOC_OWNED = False  # started by a probe (not by the application), so stopped by the last one
+
+class MemoryProbe:
+    """
+    Peak memory of one render: process peak RSS (reset when the probe starts where the kernel
+    allows it) and the tracemalloc peak. tracemalloc only sees Python/numpy allocations, not
+    Pillow's image memory, and both figures are per process. With reset_rss=False (several
+    renders running at once, where resetting would corrupt the others' figures) the peak RSS
+    is not reset and render_peak falls back to the tracemalloc peak.
+    """
+    def __init__(self, budget=None, reset_rss=True):
+        global _TRACEMALLOC_USERS, _TRACEMALLOC_OWNED
+        self.budget = budget
+        self.result = None
+        self.started = time.perf_counter()
+        self.rss_reset = reset_rss and reset_peak_rss()
+        self.rss_start = _proc_status_bytes('VmRSS') or 0
+        with _TRACEMALLOC_LOCK:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _TRACEMALLOC_OWNED = True
+            else:
+                tracemalloc.reset_peak()
+            _TRACEMALLOC_USERS += 1
+
+    def finish(self):
+        """Stops the probe (releasing tracemalloc if it was the last user) and returns its figures; idempotent."""
+        global _TRACEMALLOC_USERS, _TRACEMALLOC_OWNED
+        if self.result is not None:
+            return self.result
+        with _TRACEMALLOC_LOCK:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            _TRACEMALLOC_USERS -= 1
+            if _TRACEMALLOC_USERS == 0 and _TRACEMALLOC_OWNED:
+                tracemalloc.stop()
+                _TRACEMALLOC_OWNED = False
+        peak = peak_rss()
+        delta = max(0, peak - self.rss_start) if self.rss_reset else None
+        self.result = {
+            "peak_rss": peak,
+            "peak_rss_delta": delta,
+            "traced_peak": traced_peak,
+            "render_peak": traced_peak if delta is None else delta,
+            "budget": self.budget,
+            "seconds": round(time.perf_counter() - self.started, 4),
+        }
+        return self.result
+
+def traced(fn=None, new_render=False, finishes_render=False):
+    """
+    Times an ImageGenerator method into the current render's trace when engine.tracing is on.
+    new_render starts a fresh trace; finishes_render hands the trace to engine.trace_stats
+    once the outermost span closes. With tracing off this is just the flag check.
+    In memory-budget mode the same hooks start and finish the render's MemoryProbe.
+    """
+    if fn is None:
+        return lambda f: traced(f, new_render, finishes_render)
+    stage = fn.__name__
+
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if not (self.tracing or self.memory_budget):
+            return fn(self, *args, **kwargs)
+        ctx = self.context
+        if new_render and self.memory_budget:
+            # Probes only cover renders (create_canvas .. save/encode); helpers called on
+            # their own, e.g. ensure_high_contrast for the image proxy, never start one
+            self._finish_memory(ctx)
+            ctx.memory = MemoryProbe(self.memory_budget, reset_rss=self.render_slots() == 1)
+        try:
+            if not self.tracing:
+                result = fn(self, *args, **kwargs)
+            else:
+                if new_render or ctx.trace is None:
+                    ctx.trace = RenderTrace()
+                trace = ctx.trace
+                with trace.span(stage):
+                    result = fn(self, *args, **kwargs)
+                if finishes_render and trace.depth == 0 and not trace.finished:
+                    trace.finished = True
+                    self.trace_stats.add(trace)
+        except BaseException:
+            self._finish_memory(ctx)  # a failed render must not keep tracemalloc running
+            raise
+        if finishes_render:
+            self._finish_memory(ctx)
+        return result
+    return wrapper
+
+class ResolutionProfile:
+    """
+    Output geometry for one render resolution. Layout constants are written against the
+    4K reference frame (3840x2160) and converted with px(); fonts and assets scale the same way.
+    """
+    REFERENCE_WIDTH = 3840
+
+    def __init__(self, name, width, height):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.scale = width / self.REFERENCE_WIDTH
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def px(self, value):
+        """Converts a 4K-reference length to this profile's pixels."""
+        return int(round(value * self.scale))
+
+# editor.resolution values (and common aliases) -> (width, height)
+RESOLUTION_PROFILES = {
+    '1080': (1920, 1080),
+    '2160': (3840, 2160),
+}
+RESOLUTION_ALIASES = {'1080p': '1080', 'fhd': '1080', '2160p': '2160', '4k': '2160', 'uhd': '2160'}
+
+@lru_cache(maxsize=None)
+def resolution_profile(name='2160'):
+    """Returns the ResolutionProfile for an editor.resolution value; unknown values fall back to 4K."""
+    key = str(name).strip().lower()
+    key = RESOLUTION_ALIASES.get(key, key)
+    if key not in RESOLUTION_PROFILES:
+        print(f"Unknown resolution '{name}', using 4K.")
+        key = '2160'
+    return ResolutionProfile(key, *RESOLUTION_PROFILES[key])
+
+class RenderContext:
+    """
+    Per-image render state: the canvas being drawn and the layout cursor.
+    Each in-flight render owns one; fonts and base images stay on the shared ImageGenerator.
+    """
+    def __init__(self, origin=(210, 200)):
+        self.canvas = None
+        self.draw = None
+        self.current_x, self.current_y = origin
+        self.settings = None  # ResolutionSettings captured by render_context() (None: follow the engine)
+        self.last_element_width = 0
+        self.last_encode = None
+        self.trace = None
+        self.memory = None
+        self.last_memory = None
+
+    def finish_memory(self):
+        """Finishes the running MemoryProbe, if any, into last_memory; returns its figures (else None)."""
+        if self.memory is None:
+            return None
+        self.last_memory = self.memory.finish()
+        self.memory = None
+        return self.last_memory
+
+class ResolutionSettings:
+    """
+    Everything that depends on the resolution profile: layout lengths and the scaled fonts.
+    Built complete and then swapped in as one object, so renders already running keep theirs.
+    """
+    def __init__(self, profile, font_path):
+        px = profile.px
+        self.profile = profile
+        self.padding = px(25)
+        self.shadow_offset = max(1, px(2))
+        self.art_height = px(1500)
+        self.art_position = (px(1175), 0)
+        self.origin = (px(210), px(200))
+        self.fonts = {}
+        try:
+            self.fonts['title'] = get_font(font_path, size=px(190))
+            self.fonts['info'] = get_font(font_path, size=px(55))
+            self.fonts['summary'] = get_font(font_path, size=px(50))
+            self.fonts['custom'] = get_font(font_path, size=px(60))
+            self.fonts['metadata'] = get_font(font_path, size=px(50))
+        except Exception as e:
+            print(f"Error loading fonts: {e}")
+
+def _settings_attr(name):
+    """Proxies an ImageGenerator attribute to the ResolutionSettings in effect for the caller."""
+    return property(lambda self: getattr(self.settings, name))
+
+def _context_attr(name):
+    """Proxies an ImageGenerator attribute to the active RenderContext."""
+    return property(lambda self: getattr(self.context, name),
+                    lambda self, value: setattr(self.context, name, value))
+
+_NO_STAGE = nullcontext()
+
+# Logo luminance is estimated from LUMA_SAMPLE_PIXELS randomly drawn pixels (a fixed seed keeps
+# the decision reproducible). Random rather than strided sampling, so regular patterns such as
+# stripes cannot alias with the stride. The estimate is only trusted when it is more than
+# LUMA_CONFIDENCE standard errors (and at least LUMA_EXACT_MARGIN) away from the threshold;
+# otherwise every pixel is checked.
+LUMA_SAMPLE_PIXELS = 65536
+LUMA_MIN_SAMPLES = 1024
+LUMA_CONFIDENCE = 6
+LUMA_EXACT_MARGIN = 1
+LUMA_WEIGHTS = np.array([299, 587, 114], dtype=np.int32)  # 0.299 R + 0.587 G + 0.114 B, x1000
+
+def masked_luminance(rgba):
+    """Mean luminance of the non-transparent pixels of an RGBA image, in integer arithmetic (None if all transparent)."""
+    data = np.asarray(rgba)
+    mask = data[..., 3] > 0
+    count = int(np.count_nonzero(mask))
+    if count == 0:
+        return None
+    total = int((data[..., :3][mask].astype(np.int32) @ LUMA_WEIGHTS).sum(dtype=np.int64))
+    return total / (1000 * count)
+
+def sampled_luminance(rgba, samples=LUMA_SAMPLE_PIXELS, seed=0):
+    """(mean, standard error) of the luminance of randomly sampled non-transparent pixels (None if too few are opaque)."""
+    data = np.asarray(rgba).reshape(-1, 4)
+    picked = data[np.random.default_rng(seed).integers(0, len(data), samples)]
+    picked = picked[picked[:, 3] > 0]
+    if len(picked) < LUMA_MIN_SAMPLES:
+        return None
+    lum = (picked[:, :3].astype(np.int32) @ LUMA_WEIGHTS) / 1000
+    return float(lum.mean()), float(lum.std(ddof=1)) / math.sqrt(len(lum))
 
 class ImageGenerator:
-    def __init__(self, font_path='Roboto-Light.ttf', background_path='bckg.png', overlay_path='overlay.png'):
+    # Per-render state lives in the calling thread's RenderContext, so one engine
+    # can serve several threads rendering at the same time.
+    # Lengths passed to the drawing methods (target_width, max_w, margin_x, ...) are in
+    # 4K reference pixels and scaled by the resolution profile.
+    canvas = _context_attr('canvas')
+    draw = _context_attr('draw')
+    current_x = _context_attr('current_x')
+    current_y = _context_attr('current_y')
+    last_element_width = _context_attr('last_element_width')
+    last_encode = _context_attr('last_encode')
+    trace = _context_attr('trace')
+    last_memory = _context_attr('last_memory')
+    # Resolution-dependent values: fixed for the duration of a render_context()
+    profile = _settings_attr('profile')
+    padding = _settings_attr('padding')
+    shadow_offset = _settings_attr('shadow_offset')
+    art_height = _settings_attr('art_height')
+    art_position = _settings_attr('art_position')
+    origin = _settings_attr('origin')
+    fonts = _settings_attr('fonts')
+
+    def __init__(self, font_path='Roboto-Light.ttf', background_path='bckg.png', overlay_path='overlay.png', resolution='2160'):
         self.base_path = os.path.dirname(os.path.abspath(__file__))
         self.font_path = os.path.join(self.base_path, font_path)
         self.background_path = os.path.join(self.base_path, background_path)
         self.overlay_path = os.path.join(self.base_path, overlay_path)
         
-        self.fonts = {}
-        self._load_resources()
-        
-        # Layout State
-        self.padding = 25
-        self.shadow_offset = 2
-        self.current_x = 210
-        self.current_y = 200
-        self.last_element_width = 0
-        self.draw = None
-        self.canvas = None
+        self._local = threading.local()
+        # Memory-budget mode (see set_memory_budget); off by default
+        self.memory_budget = None
+        self._slots = threading.Condition()
+        self._active_renders = 0
+        self._measured_peaks = {}  # profile name -> largest measured render peak
+        self.set_resolution(resolution)
+        self.encoder = OutputEncoder(quality=SCRIPT_JPEG_QUALITY)  # replaced from editor.output where configured
+        # Per-stage timing (see RenderTrace); off by default
+        self.tracing = False
+        self.trace_stats = TraceStats()
 
-    def _load_resources(self):
-        # Load Fonts
+    def set_resolution(self, resolution):
+        """
+        Switches the resolution profile ('1080' or '2160'). The scaled fonts and base images are
+        loaded first and then swapped in at once; renders already in a render_context() finish
+        with the settings they started with.
+        """
+        settings = ResolutionSettings(resolution_profile(resolution), self.font_path)
         try:
-            self.fonts['title'] = ImageFont.truetype(self.font_path, size=190)
-            self.fonts['info'] = ImageFont.truetype(self.font_path, size=55)
-            self.fonts['summary'] = ImageFont.truetype(self.font_path, size=50)
-            self.fonts['custom'] = ImageFont.truetype(self.font_path, size=60)
-            self.fonts['metadata'] = ImageFont.truetype(self.font_path, size=50)
+            STATIC_LAYERS.get(self.background_path, self.overlay_path, settings.art_position, settings.profile.scale)
         except Exception as e:
-            print(f"Error loading fonts: {e}")
+            print(f"Error loading base images: {e}")
+        self._settings = settings
+        self._slots_changed()
+
+    def set_memory_budget(self, budget):
+        """
+        Memory-budget mode: `budget` bytes shared by all renders running at once on this engine
+        (None or 0 turns it off). Renders then dither in strips and report their peak memory in
+        last_memory; render_context() lets at most render_slots() renders run concurrently and
+        render_many() sizes its process pool the same way.
+        """
+        self.memory_budget = budget or None
+        self._slots_changed()
+
+    def render_footprint(self, worker=False):
+        """
+        Estimated peak bytes of one budget-mode render at this resolution (plus a worker process):
+        MEMORY_FRAMES_PER_RENDER frames, or the largest peak measured here if that is more.
+        """
+        frame = self.profile.width * self.profile.height * 3
+        footprint = max(int(frame * MEMORY_FRAMES_PER_RENDER), self._measured_peaks.get(self.profile.name, 0))
+        return footprint + (MEMORY_WORKER_BASE if worker else 0)
+
+    def render_slots(self, worker=False):
+        """How many renders (or render worker processes) fit the memory budget; None without one."""
+        if not self.memory_budget:
+            return None
+        return max(1, self.memory_budget // self.render_footprint(worker))
+
+    def _slots_changed(self):
+        """Wakes renders waiting in render_context() after the budget or footprint changed."""
+        with self._slots:
+            self._slots.notify_all()
+
+    def _finish_memory(self, ctx):
+        """Finishes the render's MemoryProbe and feeds its peak into render_footprint()."""
+        memory = ctx.finish_memory()
+        if not memory or not memory["render_peak"]:
+            return
+        name = (ctx.settings or self._settings).profile.name
+        with self._slots:
+            if memory["render_peak"] > self._measured_peaks.get(name, 0):
+                self._measured_peaks[name] = memory["render_peak"]
+
+    def _static_layers(self):
+        """Cached background/overlay layers (reloaded if the files changed on disk)."""
+        return STATIC_LAYERS.get(self.background_path, self.overlay_path, self.art_position, self.profile.scale)
+
+    @property
+    def base_bg(self):
+        return self._static_layers().base
+
+    @property
+    def overlay(self):
+        return self._static_layers().overlay
 
-        # Load Base Images
+    @property
+    def settings(self):
+        """The ResolutionSettings of the calling thread's render, else the engine's current ones."""
+        ctx = getattr(self._local, 'context', None)
+        if ctx is not None and ctx.settings is not None:
+            return ctx.settings
+        return self._settings
+
+    @property
+    def context(self):
+        """The RenderContext of the calling thread (created on first use)."""
+        ctx = getattr(self._local, 'context', None)
+        if ctx is None:
+            ctx = self._local.context = RenderContext(self.origin)
+        return ctx
+
+    @contextmanager
+    def render_context(self):
+        """Runs the enclosed render in a fresh RenderContext, restoring the previous one afterwards."""
+        # In memory-budget mode, wait for a render slot (nested contexts reuse the thread's slot).
+        # The limit is re-read on every wake-up, so it follows budget and footprint changes.
+        slot = bool(self.memory_budget) and not getattr(self._local, 'slot', False)
+        if slot:
+            with self._slots:
+                while self.memory_budget and self._active_renders >= self.render_slots():
+                    self._slots.wait()
+                self._active_renders += 1
+            self._local.slot = True
+        previous = getattr(self._local, 'context', None)
+        # Nested contexts keep the outer render's settings
+        settings = previous.settings if previous is not None and previous.settings is not None else self._settings
+        ctx = RenderContext(settings.origin)
+        ctx.settings = settings
+        self._local.context = ctx
         try:
-            self.base_bg = Image.open(self.background_path).convert('RGBA')
-            self.overlay = Image.open(self.overlay_path).convert('RGBA')
-        except Exception as e:
-            print(f"Error loading base images: {e}")
+            yield ctx
+        finally:
+            self._finish_memory(ctx)
+            self._local.context = previous
+            if slot:
+                self._local.slot = False
+                with self._slots:
+                    self._active_renders -= 1
+                    self._slots.notify()
+
+    def _stage(self, name):
+        """Times a block inside a traced method; a no-op context when tracing is off."""
+        if self.tracing and self.context.trace is not None:
+            return self.context.trace.span(name)
+        return _NO_STAGE
 
     def reset_layout(self):
         """Resets the Y-cursor to the top position for a new image."""
-        self.current_y = 200
+        self.current_y = self.origin[1]
         self.last_element_width = 0
 
+    @traced(new_render=True)
     def create_canvas(self, artwork_image):
         """Creates the base canvas with artwork and overlay."""
         self.reset_layout()
-        self.canvas = self.base_bg.copy()
         
-        # Resize artwork to height 1500 maintaining aspect ratio
-        ratio = 1500 / artwork_image.height
-        width = int(artwork_image.width * ratio)
-        resized_art = artwork_image.resize((width, 1500))
+        # Resize artwork to height 1500 (4K) maintaining aspect ratio (oversized JPEGs decode at reduced scale)
+        art_h = self.art_height
+        with self._stage('decode'):
+            draft_image(artwork_image, min_height=art_h)
+            artwork_image.load()
+        with self._stage('resize'):
+            ratio = art_h / artwork_image.height
+            width = int(artwork_image.width * ratio)
+            resized_art = artwork_image.resize((width, art_h))
         
-        # Paste artwork and overlay
-        self.canvas.paste(resized_art, (1175, 0))
-        self.canvas.paste(self.overlay, (1175, 0), self.overlay)
+        # Paste artwork into the pre-composed background and blend the cached overlay
+        with self._stage('compose'):
+            self.canvas = self._static_layers().compose(resized_art)
         
         self.draw = ImageDraw.Draw(self.canvas)
         return self.canvas
 
+    @traced(new_render=True)
     def create_color_canvas(self, artwork_image, target_width=3000):
         """Creates a dynamic, blurred color canvas from the artwork."""
         self.reset_layout()
 
-        # Step 1: Create blurry/dark canvas
-        canvas_rgb, _ = self._create_blurry_background(artwork_image, size=(3840, 2160), blur_radius=800)
-        canvas_array = (np.array(canvas_rgb).astype(np.float32) * 0.4).clip(0, 255).astype(np.uint8)
-        canvas_rgb = Image.fromarray(canvas_array)
+        px = self.profile.px
+        target_width = px(target_width)
+
+        # Oversized JPEGs only need to be decoded at target width
+        with self._stage('decode'):
+            draft_image(artwork_image, min_width=target_width)
+            artwork_image.load()
 
-        self.canvas = Image.new("RGBA", canvas_rgb.size, (0, 0, 0, 255))
-        self.canvas.paste(canvas_rgb, (0, 0))
+        # Step 1: Create blurry/dark canvas (dither and darkening in one pass)
+        canvas_rgb, _ = self._create_blurry_background(artwork_image, size=self.profile.size, blur_radius=px(800), darken=0.4)
+
+        # The blurred background is already a fresh RGB frame; draw on it directly
+        self.canvas = canvas_rgb
 
         # Step 2: Resize input to target width and apply vignette
-        w_percent = target_width / artwork_image.width
-        new_size = (target_width, int(artwork_image.height * w_percent))
-        img_resized = artwork_image.resize(new_size, Image.LANCZOS).convert("RGBA")
+        with self._stage('resize'):
+            w_percent = target_width / artwork_image.width
+            new_size = (target_width, int(artwork_image.height * w_percent))
+            img_resized = artwork_image.resize(new_size, Image.LANCZOS).convert("RGBA")
         mask = self._vignette_side(img_resized.height, img_resized.width, fade_ratio=0.3, fade_power=2.5, position="bottom-left")
         img_resized.putalpha(mask)
 
         # Step 3: Paste artwork and set up for drawing
-        self.canvas.paste(img_resized, (3840 - img_resized.width, 0), img_resized)
+        with self._stage('compose'):
+            self.canvas.paste(img_resized, (self.profile.width - img_resized.width, 0), img_resized)
         self.draw = ImageDraw.Draw(self.canvas)
 
+    def backdrop_color(self, artwork_image, brightness=20, digest=None):
+        """Auto background color of the artwork (same as the Node renderer's auto-color): ((r, g, b), hex)."""
+        with self._stage('edge_color'):
+            return backdrop_edge_color(artwork_image, brightness, digest=digest)
+
+    @traced
     def ensure_high_contrast(self, image, threshold=100):
         """
         Analyzes the brightness of non-transparent pixels.
@@ -98,32 +1381,33 @@ class ImageGenerator:
             return None
             
         img = image.convert("RGBA")
-        data = np.array(img)
-        
-        if data.size == 0: return img
-            
-        r, g, b, a = data[:,:,0], data[:,:,1], data[:,:,2], data[:,:,3]
-        mask = a > 0 # Requirement 2: ONLY for pixels that are not transparent (Alpha > 0)
-        
-        if not np.any(mask): return img
-            
-        # Calculate luminance: 0.299*R + 0.587*G + 0.114*B
-        luminance = 0.299 * r[mask] + 0.587 * g[mask] + 0.114 * b[mask]
-        avg_lum = np.mean(luminance)
-        
-        print(f"[DEBUG] Logo Luminance: {avg_lum:.2f} (Threshold: {threshold})")
-
-        # Requirement 3: If below threshold, recolor to pure White (255, 255, 255)
-        if avg_lum < threshold:
-            print("[DEBUG] -> Recoloring logo to WHITE")
-            white_img = Image.new("RGBA", img.size, (255, 255, 255, 0))
-            white_img.paste((255, 255, 255, 255), (0, 0), mask=img)
-            return white_img
+        if img.width == 0 or img.height == 0: return img
+
+        # Requirement 2: ONLY for pixels that are not transparent (Alpha > 0).
+        # Estimate from a random sample, exact unless the sample is clearly on one side of the threshold
+        estimate = None
+        if img.width * img.height > 2 * LUMA_SAMPLE_PIXELS:
+            estimate = sampled_luminance(img)
+        if estimate and abs(estimate[0] - threshold) > max(LUMA_EXACT_MARGIN, LUMA_CONFIDENCE * estimate[1]):
+            avg_lum = estimate[0]
+        else:
+            avg_lum, estimate = masked_luminance(img), None
+        if avg_lum is None: return img
+
+        recolor = avg_lum < threshold
+        logger.debug("Logo luminance %.2f (threshold %s): %s", avg_lum, threshold,
+                     "recolor to white" if recolor else "keep original",
+                     extra={"luminance": avg_lum, "threshold": threshold, "recolor": recolor, "sampled": estimate is not None})
+
+        # Requirement 3: If below threshold, recolor to pure White (255, 255, 255) keeping the alpha
+        if recolor:
+            white = Image.new("L", img.size, 255)
+            return Image.merge("RGBA", (white, white, white, img.getchannel("A")))
             
-        print("[DEBUG] -> Keeping original logo color")
         # Requirement 4: Return original if bright enough
         return img
 
+    @traced
     def _smart_resize_logo(self, logo_image, max_w=1200, max_h=450):
         """
         Smart resizes the logo:
@@ -156,30 +1440,52 @@ class ImageGenerator:
         
         return logo_image.resize((new_w, new_h), Image.LANCZOS)
 
-    def draw_logo_or_title(self, logo_image=None, title_text=None):
-        """Draws the logo if available, otherwise draws the title text."""
+    @traced
+    def process_logo(self, logo_image, threshold=100, max_w=1200, max_h=450, digest=None):
+        """
+        Contrast fix + smart resize, memoised in LOGOS (max_w/max_h None = contrast fix only).
+        digest: content hash of the source if the caller already has one (see bytes_digest).
+        """
+        if not logo_image:
+            return None
+        digest = digest or image_digest(logo_image)
+        if max_w and max_h:
+            max_w, max_h = self.profile.px(max_w), self.profile.px(max_h)
+        logo = LOGOS.get(digest, threshold, max_w, max_h)
+        if logo is None:
+            logo = self.ensure_high_contrast(logo_image, threshold)
+            if max_w and max_h:
+                logo = self._smart_resize_logo(logo, max_w=max_w, max_h=max_h)
+            LOGOS.put(digest, threshold, max_w, max_h, logo)
+        return logo
+
+    @traced
+    def draw_logo_or_title(self, logo_image=None, title_text=None, processed=False):
+        """
+        Draws the logo if available, otherwise draws the title text.
+        processed: the logo already went through process_logo (e.g. in draw_media_block).
+        """
         if logo_image:
-            logo_image = self.ensure_high_contrast(logo_image)
-            
-            # Use Smart Resize
-            logo_resized = self._smart_resize_logo(logo_image, max_w=1200, max_h=450)
+            logo_resized = logo_image if processed else self.process_logo(logo_image, max_w=1200, max_h=450)
             
             self.canvas.paste(logo_resized, (self.current_x, self.current_y), logo_resized)
             self.current_y += logo_resized.height + self.padding
             self.last_element_width = logo_resized.width
         elif title_text:
             # Fallback to text title
-            self._draw_text_with_shadow((self.current_x - 10, self.current_y), title_text, self.fonts['title'])
+            self._draw_text_with_shadow((self.current_x - self.profile.px(10), self.current_y), title_text, self.fonts['title'])
             bbox = self.draw.textbbox((0,0), title_text, font=self.fonts['title'])
             self.current_y += (bbox[3] - bbox[1]) + self.padding
             self.last_element_width = bbox[2] - bbox[0]
 
+    @traced
     def draw_info_text(self, text):
         """Draws the metadata info line (Year, Genre, Duration, etc.)."""
         self._draw_text_with_shadow((self.current_x, self.current_y), text, self.fonts['info'], fill="white", shadow="black")
         bbox = self.draw.textbbox((0,0), text, font=self.fonts['info'])
         self.current_y += (bbox[3] - bbox[1]) + self.padding
 
+    @traced
     def draw_horizontal_tags(self, tags, font_key='info', separator="  •  ", color="white"):
         """
         Draws a list of tags horizontally, moving the X-cursor to the right.
@@ -226,67 +1532,29 @@ class ImageGenerator:
         if max_height > 0:
             self.current_y += max_height + self.padding
 
+    @traced
     def measure_tags_width(self, tags, font_key='info', separator="  •  "):
-        """Calculates the exact visual width of the tags line using a temporary canvas (Auto-Crop logic)."""
+        """Calculates the exact visual width of the tags line (including shadow) from font metrics."""
         if not tags: return 0
         valid_tags = [str(t) for t in tags if t]
         if not valid_tags: return 0
 
         font = self.fonts.get(font_key, self.fonts['info'])
-        
-        # 1. Estimate size for temp image (make it large enough)
-        sep_width = self.draw.textlength(separator, font=font) if separator else 0
-        est_width = 0
-        for i, tag in enumerate(valid_tags):
-            est_width += self.draw.textlength(tag, font=font)
-            if i > 0: est_width += sep_width
-            
-        temp_w = int(est_width * 1.2) + 200
-        temp_h = int(getattr(font, 'size', 50) * 3) + 100
-        
-        # 2. Create temp image
-        temp_img = Image.new('RGBA', (temp_w, temp_h), (0, 0, 0, 0))
-        temp_draw = ImageDraw.Draw(temp_img)
-        
-        # 3. Draw tags exactly as they would be drawn on canvas (including shadow)
-        cursor_x = 100 # Start with padding to capture left bearing
-        cursor_y = temp_h // 3
-        
+
+        pieces = []
         for i, tag in enumerate(valid_tags):
             if i > 0 and separator:
-                self._draw_text_with_shadow((cursor_x, cursor_y), separator, font, fill="white", shadow="black", draw_obj=temp_draw)
-                cursor_x += temp_draw.textlength(separator, font=font)
-            
-            self._draw_text_with_shadow((cursor_x, cursor_y), tag, font, fill="white", shadow="black", draw_obj=temp_draw)
-            cursor_x += temp_draw.textlength(tag, font=font)
-            
-        # 4. Get bounding box of visible pixels
-        bbox = temp_img.getbbox()
-        if bbox:
-            return bbox[2] - bbox[0]
-            
-        return 0
+                pieces.append(separator)
+            pieces.append(tag)
+        return TEXT_METRICS.run_width(font, pieces, self.shadow_offset)
 
+    @traced
     def _measure_visual_bbox(self, text, font):
-        """Measures the exact visual bounding box of text using a temporary canvas."""
+        """Measures the exact visual bounding box of text (including shadow) from font metrics."""
         if not text: return 0, 0
-        
-        # Estimate size (generous padding)
-        dummy_draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
-        est_bbox = dummy_draw.textbbox((0, 0), text, font=font)
-        temp_w = (est_bbox[2] - est_bbox[0]) + 100
-        temp_h = (est_bbox[3] - est_bbox[1]) + 100
-        
-        temp_img = Image.new('RGBA', (temp_w, temp_h), (0, 0, 0, 0))
-        temp_draw = ImageDraw.Draw(temp_img)
-        
-        self._draw_text_with_shadow((50, 50), text, font, draw_obj=temp_draw)
-        
-        bbox = temp_img.getbbox()
-        if bbox:
-            return bbox[2] - bbox[0], bbox[3] - bbox[1]
-        return 0, 0
+        return TEXT_METRICS.visual_size(font, text, self.shadow_offset)
 
+    @traced
     def draw_media_block(self, logo_image, title_text, tags, align='left', margin_x=50):
         """
         Draws Logo and Tags as a unified block to ensure consistent alignment.
@@ -295,9 +1563,8 @@ class ImageGenerator:
         w_logo = 0
         
         if logo_image:
-            # Use Smart Resize logic for measurement
-            logo_image = self.ensure_high_contrast(logo_image)
-            logo_image = self._smart_resize_logo(logo_image, max_w=1200, max_h=450)
+            # Use Smart Resize logic for measurement (processed once, drawn as-is below)
+            logo_image = self.process_logo(logo_image, max_w=1200, max_h=450)
             w_logo = logo_image.width
         elif title_text:
             bbox = self.draw.textbbox((0,0), title_text, font=self.fonts['title'])
@@ -309,6 +1576,7 @@ class ImageGenerator:
         block_width = max(w_logo, w_tags)
 
         # Step C: Position Block
+        margin_x = self.profile.px(margin_x)
         canvas_width = self.canvas.width
         if align == 'center':
             start_x = (canvas_width - block_width) // 2
@@ -321,7 +1589,7 @@ class ImageGenerator:
         # 1. Draw Logo/Title (Centered in Block)
         logo_x = start_x + (block_width - w_logo) // 2
         self.current_x = logo_x
-        self.draw_logo_or_title(logo_image, title_text)
+        self.draw_logo_or_title(logo_image, title_text, processed=True)
         
         # 2. Draw Tags (Centered in Block)
         tags_x = start_x + (block_width - w_tags) // 2
@@ -331,15 +1599,16 @@ class ImageGenerator:
         self.last_element_width = 0 
         self.draw_horizontal_tags(tags)
 
-    def draw_summary(self, text):
-        """Draws the summary text, truncated and wrapped."""
-        shortened = textwrap.shorten(text or "", width=175, placeholder="...")
-        wrapped = "\n".join(textwrap.wrap(shortened, width=95))
+    @traced
+    def draw_summary(self, text, max_width=2100, max_lines=2):
+        """Draws the summary text, wrapped to max_width (4K pixels) and truncated to max_lines."""
+        wrapped = "\n".join(wrap_text(self.fonts['summary'], text, self.profile.px(max_width), max_lines))
         
         self._draw_text_with_shadow((self.current_x, self.current_y), wrapped, self.fonts['summary'])
         _, visual_height = self._measure_visual_bbox(wrapped, self.fonts['summary'])
         self.current_y += visual_height + self.padding * 2
 
+    @traced
     def draw_custom_text_and_provider_logo(self, text, provider_logo_path):
         """Draws the custom footer text and the provider logo (e.g. Jellyfin/Plex logo)."""
         self._draw_text_with_shadow((self.current_x, self.current_y), text, self.fonts['custom'])
@@ -349,62 +1618,186 @@ class ImageGenerator:
         
         full_logo_path = os.path.join(self.base_path, provider_logo_path)
         if os.path.exists(full_logo_path):
-            p_logo = Image.open(full_logo_path).convert('RGBA')
+            p_logo = _scaled(Image.open(full_logo_path).convert('RGBA'), self.profile.scale)
             p_logo = self.ensure_high_contrast(p_logo)
             # Center vertically relative to text
             metrics = self.fonts['custom'].getmetrics()
             text_height = metrics[0] + metrics[1]
             logo_y = self.current_y + (text_height - p_logo.height) // 2
-            logo_x = self.current_x + text_width + 15
+            logo_x = self.current_x + text_width + self.profile.px(15)
             
             self.canvas.paste(p_logo, (logo_x, logo_y), p_logo)
 
+    @traced
     def _draw_text_with_shadow(self, pos, text, font, fill="white", shadow="black", draw_obj=None):
+        # Single-line text on the canvas goes through the sprite cache (one alpha paste)
+        if draw_obj is None and text and '\n' not in text:
+            sprite, sprite_pos = TEXT_SPRITES.get(text, font, fill, shadow, self.shadow_offset, pos)
+            self.canvas.paste(sprite, sprite_pos, sprite)
+            return
+
         d = draw_obj if draw_obj else self.draw
         x, y = pos
         d.text((x + self.shadow_offset, y + self.shadow_offset), text, font=font, fill=shadow)
         d.text((x, y), text, font=font, fill=fill)
 
+    @traced(finishes_render=True)
+    def encode(self):
+        """Encodes the current canvas with self.encoder; the result is kept as last_encode."""
+        self.last_encode = self.encoder.encode(self.canvas)
+        return self.last_encode
+
+    @traced(finishes_render=True)
     def save(self, path):
-        """Saves the current canvas to a file."""
-        self.canvas.convert('RGB').save(path)
+        """
+        Saves the current canvas to a file. The extension is switched to match the
+        encoder's format if needed; returns the path actually written.
+        """
+        result = self.encode()
+        root, ext = os.path.splitext(path)
+        valid = ('.jpg', '.jpeg') if result.format == 'jpeg' else (result.extension,)
+        if ext.lower() not in valid:
+            path = root + result.extension
+        with self._stage('write'), open(path, 'wb') as f:
+            f.write(result.data)
+        return path
 
+    @traced(finishes_render=True)
     def get_bytes(self):
-        """Returns the image as a BytesIO object (for web serving)."""
-        img_io = BytesIO()
-        self.canvas.convert('RGB').save(img_io, 'JPEG', quality=95)
+        """Returns the image as a BytesIO object (for web serving); see last_encode for its mimetype."""
+        img_io = BytesIO(self.encode().data)
         img_io.seek(0)
         return img_io
 
+    @traced
     def _vignette_side(self, h, w, fade_ratio=5, fade_power=5.0, position="bottom-left"):
-        y, x = np.ogrid[0:h, 0:w]
-        rx, ry = w * fade_ratio, h * fade_ratio
-
-        dist_x, dist_y = np.ones_like(x, dtype=np.float32), np.ones_like(y, dtype=np.float32)
-
-        if "left" in position: dist_x = np.clip(x / rx, 0, 1)
-        elif "right" in position: dist_x = np.clip((w - x) / rx, 0, 1)
-        if "top" in position: dist_y = np.clip(y / ry, 0, 1)
-        elif "bottom" in position: dist_y = np.clip((h - y) / ry, 0, 1)
-
-        alpha = np.minimum(dist_x, dist_y) if ("left" in position or "right" in position) and ("top" in position or "bottom" in position) else dist_x * dist_y
-        alpha = (alpha ** fade_power * 255).astype(np.uint8)
-        mask = Image.fromarray(alpha)
-        return mask.filter(ImageFilter.GaussianBlur(radius=50))
-
-    def _create_blurry_background(self, image, size=(3840, 2160), blur_radius=800, dither_strength=16):
-        bg = image.resize(size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(radius=blur_radius))
-        bg_array = np.array(bg).astype(np.float32)
-        noise = np.random.uniform(-dither_strength, dither_strength, bg_array.shape)
-        bg_array = np.clip(bg_array + noise, 0, 255).astype(np.uint8)
-        bg_img = Image.fromarray(bg_array)
+        return vignette_mask(h, w, fade_ratio, fade_power, position, blur_radius=self.profile.px(50))
+
+    @traced
+    def _create_blurry_background(self, image, size=None, blur_radius=None, dither_strength=16, darken=1.0):
+        # Defaults: full frame of the current profile, 800px (4K) blur
+        size = size or self.profile.size
+        blur_radius = self.profile.px(800) if blur_radius is None else blur_radius
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        with self._stage('blur'):
+            bg = blur_background(image, size=size, blur_radius=blur_radius)
+        with self._stage('dither'):
+            # In memory-budget mode the blurred frame is dithered in place, strip by strip
+            strip_rows = MEMORY_STRIP_ROWS if self.memory_budget else None
+            bg = apply_dither(bg, strength=dither_strength, darken=darken, strip_rows=strip_rows)
         
-        # Detect uniformity
-        gray = np.array(bg_img.convert("L"))
-        is_uniform = gray.std() < 15
+        # Detect uniformity (threshold scales with the darkening)
+        with self._stage('uniformity'):
+            is_uniform = gray_std(bg) < 15 * darken
         
-        return bg_img, is_uniform
+        return bg, is_uniform
+
+    def render(self, spec):
+        """
+        Renders one background from a spec dict:
+          artwork (image bytes, required), logo (image bytes), title, tags (list), summary,
+          footer (text), provider_logo (path, default jellyfinlogo.png), style ('plain' or 'color'),
+          output (file path; without it the encoded bytes are returned).
+        Returns {"path" or "data", "format", "size", "quality", "seconds"}, plus "memory"
+        (see MemoryProbe) in memory-budget mode.
+        """
+        start = time.perf_counter()
+        with self.render_context():
+            artwork = open_image(spec['artwork'])
+            if spec.get('style') == 'color':
+                self.create_color_canvas(artwork)
+            else:
+                self.create_canvas(artwork)
+            # The decoded artwork is not needed once the canvas exists
+            artwork.close()
+
+            logo = open_image(spec['logo']) if spec.get('logo') else None
+            self.draw_logo_or_title(logo_image=logo, title_text=spec.get('title'))
+            if logo is not None:
+                logo.close()
+            if spec.get('tags'):
+                self.draw_horizontal_tags(spec['tags'])
+            if spec.get('summary'):
+                self.draw_summary(spec['summary'])
+            if spec.get('footer'):
+                self.draw_custom_text_and_provider_logo(spec['footer'], spec.get('provider_logo', 'jellyfinlogo.png'))
+
+            result = {}
+            if spec.get('output'):
+                result['path'] = self.save(spec['output'])
+            else:
+                result['data'] = self.encode().data
+            encoded = self.last_encode
+            if self.memory_budget:
+                result['memory'] = self.last_memory
+        result.update(format=encoded.format, size=encoded.size, quality=encoded.quality,
+                      seconds=time.perf_counter() - start)
+        return result
+
+    def render_many(self, specs, workers=None):
+        """
+        Renders a list of specs (see render) on a process pool of `workers` processes
+        (default: one per core). Each worker builds its own engine once, with this engine's
+        font, assets, resolution and encoder settings. In memory-budget mode the pool is capped
+        at render_slots(worker=True) and each worker gets an equal share of the budget.
+        Returns one dict per spec, in input order: render()'s result with ok=True, or
+        ok=False and an error message. Scripts using this need an `if __name__ == '__main__':` guard.
+        """
+        specs = list(specs)
+        workers = min(workers or os.cpu_count() or 1, len(specs))
+        if self.memory_budget:
+            workers = min(workers, self.render_slots(worker=True))
+        if workers <= 1:
+            return [_render_safely(self, spec) for spec in specs]
+
+        settings = self._worker_settings()
+        if self.memory_budget:
+            settings["memory_budget"] = self.memory_budget // workers
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                                 initargs=(settings,)) as pool:
+            futures = [pool.submit(_render_in_worker, spec) for spec in specs]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Worker died or the spec could not be sent (e.g. not picklable)
+                    results.append({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        return results
+
+    def _worker_settings(self):
+        return {
+            "font_path": self.font_path,
+            "background_path": self.background_path,
+            "overlay_path": self.overlay_path,
+            "resolution": self.profile.name,
+            "encoder": dict(vars(self.encoder)),
+        }
 
     @staticmethod
     def clean_filename(filename):
         return "".join(c if c.isalnum() or c in "._-" else "_" for c in filename)
+
+# --- BATCH RENDER WORKERS (render_many) ---
+_WORKER_ENGINE = None
+
+def _init_render_worker(settings):
+    """Process pool initializer: one engine per worker process, reused for every spec."""
+    global _WORKER_ENGINE
+    encoder = settings.pop("encoder")
+    memory_budget = settings.pop("memory_budget", None)
+    _WORKER_ENGINE = ImageGenerator(**settings)
+    _WORKER_ENGINE.encoder = OutputEncoder(**encoder)
+    _WORKER_ENGINE.set_memory_budget(memory_budget)
+
+def _render_safely(engine, spec):
+    try:
+        result = engine.render(spec)
+        result["ok"] = True
+        return result
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+def _render_in_worker(spec):
+    return _render_safely(_WORKER_ENGINE, spec)
@@ -1,4 +1,5 @@
 import requests
+import http_client
 import os
 import time
 from PIL import Image, ImageDraw, ImageFont
@@ -11,7 +12,7 @@ from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
 # --- IMPORT IMAGE ENGINE ---
-from image_engine import ImageGenerator
+from image_engine import ImageGenerator, OutputEncoder, open_image
 
 # Jellyfin Server Configuration (Global Parameters)
 baseurl = os.getenv('JELLYFIN_BASEURL')
@@ -25,7 +26,7 @@ try:
     print(f'token:{token}')
     print(f'user_id:{user_id}')
     url = f"{baseurl}/Users/{user_id}"
-    response = requests.get(url, headers={"X-Emby-Token": token})
+    response = http_client.get(url, headers={"X-Emby-Token": token})
     response.raise_for_status()
     data = response.json()
     print(f"Connected to Jellyfin! User name: {data.get('Name')}")
@@ -39,7 +40,7 @@ truetype_path = 'Roboto-Light.ttf'
 
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = http_client.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -55,11 +56,18 @@ download_movies = True
 download_series = True
 limit = 10
 overwrite_existing = False
+resolution = '2160' # '1080' or '2160', overridden by editor.resolution in config.json
+memory_budget_mb = 0 # 0 = off, overridden by editor.memory_budget_mb in config.json
+output_config = None # editor.output in config.json (format/quality); JPEG q75 if not set
 
 if os.path.exists('config.json'):
     try:
         with open('config.json', 'r') as f:
-            overwrite_existing = json.load(f).get('general', {}).get('overwrite_existing', False)
+            config = json.load(f)
+        overwrite_existing = config.get('general', {}).get('overwrite_existing', False)
+        resolution = config.get('editor', {}).get('resolution', resolution)
+        memory_budget_mb = config.get('editor', {}).get('memory_budget_mb', memory_budget_mb)
+        output_config = config if config.get('editor', {}).get('output') else None
     except: pass
 
 excluded_genres = ['Horror', 'Thriller']
@@ -73,7 +81,10 @@ if os.path.exists(background_dir):
 os.makedirs(background_dir, exist_ok=True)
 
 # Initialize the engine once
-engine = ImageGenerator()
+engine = ImageGenerator(resolution=resolution)
+engine.set_memory_budget(int(memory_budget_mb or 0) * 1024 * 1024)
+if output_config:
+    engine.encoder = OutputEncoder.from_config(output_config)
 def clean_filename(filename):
     cleaned_filename = "".join(c if c.isalnum() or c in "._-" else "_" for c in filename)
     return cleaned_filename
@@ -82,7 +93,7 @@ def download_logo_in_memory(media_item):
     logo_url = f"{baseurl}/Items/{media_item['Id']}/Images/Logo?api_key={token}"
     
     try:
-        response = requests.get(logo_url, timeout=10)
+        response = http_client.get(logo_url, timeout=10)
         if response.status_code == 200:
             logo_image = Image.open(BytesIO(response.content))
             return logo_image  # Return the logo as a PIL Image object
@@ -96,7 +107,7 @@ def download_logo_in_memory(media_item):
 def get_excluded_library_paths():
     """Fetch library IDs based on excluded library names."""
     headers = {'X-Emby-Token': token}
-    response = requests.get(f"{baseurl}/Library/VirtualFolders", headers=headers)
+    response = http_client.get(f"{baseurl}/Library/VirtualFolders", headers=headers)
     
     if response.status_code == 200:
         libraries = response.json()
@@ -121,7 +132,7 @@ def download_latest_media(order_by, limit, media_type):
         'Fields': 'Path,Overview,Genres,CommunityRating,PremiereDate,Tags',
         'ExcludeItemTypes': 'BoxSet'
     }
-    response = requests.get(f"{baseurl}/Users/{user_id}/Items", headers=headers, params=params)
+    response = http_client.get(f"{baseurl}/Users/{user_id}/Items", headers=headers, params=params)
 
     if response.status_code == 200:
         media_items = response.json()['Items']
@@ -159,10 +170,10 @@ def download_latest_media(order_by, limit, media_type):
                     continue
 
                 # Download the background image with a timeout of 10 seconds
-                response = requests.get(background_url, timeout=10)
+                response = http_client.get(background_url, timeout=10)
 
                 if response.status_code == 200:
-                    artwork_image = Image.open(BytesIO(response.content))
+                    artwork_image = open_image(response.content, min_height=engine.art_height)
                     logo_image = download_logo_in_memory(item)
 
                     # 1. Create Canvas
@@ -187,7 +198,7 @@ def download_latest_media(order_by, limit, media_type):
                             duration_minutes = duration_ticks // (10**7 * 60)
                             tags.append(f"{duration_minutes // 60}h{duration_minutes % 60}min")
                     else:  # Series
-                        seasons_response = requests.get(f"{baseurl}/Shows/{item['Id']}/Seasons?api_key={token}", timeout=10)
+                        seasons_response = http_client.get(f"{baseurl}/Shows/{item['Id']}/Seasons?api_key={token}", timeout=10)
                         if seasons_response.ok:
                             seasons_count = len([s for s in seasons_response.json().get('Items', []) if s.get('Type') == 'Season' and s.get('IndexNumber', 0) > 0])
                             if seasons_count > 0:
@@ -0,0 +1,362 @@
+"""
+In-memory catalog of rendered backgrounds and their metadata (the gallery search index).
+
+Records are keyed by path without extension, so an image and its JSON sidecar are one record.
+Secondary indexes are kept up to date on every upsert/delete, all O(1) per record:
+  - layout -> records of that layout
+  - genre / age rating / year -> posting set of record keys (a value disappears from the
+    filter lists once its last record is gone)
+  - integer rating level -> reference count
+  - layout -> LayoutColumns (numpy columns for /api/wallpaper/status, built on the first query)
+The on-disk format (metadata_cache.json) is value lists plus a list of image dicts.
+"""
+import os
+import random
+import threading
+
+import numpy as np
+
+class ImageRecord:
+    """One rendered background; to_dict() gives the metadata_cache.json entry."""
+    __slots__ = ('key', 'path', 'layout', 'genres', 'genre_list', 'official_rating', 'year',
+                 'rating', 'title', 'action_url', 'mtime')
+
+    def __init__(self, key, path, layout, metadata, mtime=0.0):
+        self.key = key
+        self.path = path
+        self.layout = layout
+        self.genres = metadata.get('genres', '')
+        self.genre_list = tuple(g.strip() for g in str(self.genres or '').split(',') if g.strip())
+        self.official_rating = metadata.get('officialRating', '')
+        self.year = metadata.get('year')
+        self.rating = parse_rating(metadata)
+        self.title = metadata.get('title')
+        self.action_url = metadata.get('action_url')
+        self.mtime = mtime
+
+    def facets(self):
+        """(index, value) pairs this record contributes to the genre/age/year posting sets."""
+        pairs = [('genres', g) for g in self.genre_list]
+        if self.official_rating:
+            pairs.append(('ages', str(self.official_rating).strip()))
+        if self.year:
+            pairs.append(('years', str(self.year).strip()))
+        return pairs
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "layout": self.layout,
+            "genres": self.genres,
+            "officialRating": self.official_rating,
+            "year": self.year,
+            "rating": self.rating,
+            "title": self.title,
+            "action_url": self.action_url,
+            "mtime": self.mtime
+        }
+
+    def year_value(self):
+        try:
+            return int(self.year or 0)
+        except (TypeError, ValueError):
+            return 0
+
+def parse_rating(metadata):
+    """First numeric rating among the known fields, 0.0 if none."""
+    for field in ['rating', 'CommunityRating', 'VoteAverage', 'OfficialRating']:
+        val = metadata.get(field)
+        if val is not None:
+            try:
+                return float(val)
+            except (TypeError, ValueError):
+                pass
+    return 0.0
+
+def file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+def normalize_age(value):
+    """Age rating as matched by the age filter: lower case, letters and digits only."""
+    return "".join(k for k in str(value).lower() if k.isalnum())
+
+class LayoutColumns:
+    """
+    Column store of one layout's records for the wallpaper query: numpy year/rating/mtime
+    vectors, an age code per row and a genre bitset (uint64 words) per row. Rows are appended
+    on upsert and tombstoned on delete, in catalog order; compacted once half of them are dead.
+    Filters are vectorised masks and sorted picks use top-k selection instead of a full sort.
+    """
+    def __init__(self, records=(), capacity=64):
+        self.records = []   # row -> record (None once deleted)
+        self.rows = {}      # record key -> row
+        self.dead = 0
+        self.genre_bits = {}             # lower-case genre -> bit
+        self.age_codes = {'': 0}         # normalised age rating -> code
+        self.age_names = ['']
+        self._allocate(capacity, 1)
+        for record in records:
+            self.add(record)
+
+    def _allocate(self, capacity, words):
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.year = np.zeros(capacity, dtype=np.int32)
+        self.rating = np.zeros(capacity, dtype=np.float64)
+        self.mtime = np.zeros(capacity, dtype=np.float64)
+        self.age = np.zeros(capacity, dtype=np.int32)
+        self.genres = np.zeros((capacity, words), dtype=np.uint64)
+
+    def _grow(self, capacity, words):
+        old = (self.alive, self.year, self.rating, self.mtime, self.age, self.genres)
+        self._allocate(capacity, words)
+        n = len(self.records)
+        for new, prev in zip((self.alive, self.year, self.rating, self.mtime, self.age), old):
+            new[:n] = prev[:n]
+        self.genres[:n, :old[5].shape[1]] = old[5][:n]
+
+    def _age_code(self, value):
+        name = normalize_age(value) if value else ''
+        code = self.age_codes.get(name)
+        if code is None:
+            code = self.age_codes[name] = len(self.age_names)
+            self.age_names.append(name)
+        return code
+
+    def add(self, record):
+        bits = []
+        for genre in record.genre_list:
+            bit = self.genre_bits.setdefault(genre.lower(), len(self.genre_bits))
+            bits.append(bit)
+        row = len(self.records)
+        capacity, words = self.genres.shape
+        need_words = max(words, (len(self.genre_bits) + 63) // 64)
+        if row >= capacity or need_words > words:
+            self._grow(max(64, 2 * capacity) if row >= capacity else capacity, need_words)
+
+        self.records.append(record)
+        self.rows[record.key] = row
+        self.alive[row] = True
+        self.year[row] = record.year_value()
+        self.rating[row] = record.rating
+        self.mtime[row] = record.mtime
+        self.age[row] = self._age_code(record.official_rating)
+        for bit in bits:
+            self.genres[row, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.records[row] = None
+        self.dead += 1
+        if self.dead > 64 and self.dead * 2 > len(self.records):
+            self._compact()
+
+    def _compact(self):
+        """Rebuilds the columns from the live rows (drops tombstones and unused genres/ages)."""
+        live = [record for record in self.records if record is not None]
+        self.records, self.rows, self.dead = [], {}, 0
+        self.genre_bits, self.age_codes, self.age_names = {}, {'': 0}, ['']
+        self._allocate(max(64, 2 * len(live)), 1)
+        for record in live:
+            self.add(record)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _genre_mask(self, n, terms):
+        words = np.zeros(self.genres.shape[1], dtype=np.uint64)
+        for genre, bit in self.genre_bits.items():
+            if any(term in genre for term in terms):
+                words[bit // 64] |= np.uint64(1 << (bit % 64))
+        return (self.genres[:n] & words).any(axis=1)
+
+    def _age_mask(self, n, terms):
+        table = np.array([any(term in name for term in terms) for name in self.age_names], dtype=bool)
+        return table[self.age[:n]]
+
+    def select(self, rating_range=None, year_range=None, genre_terms=None, age_terms=None, sort='random', k=1):
+        """
+        Up to k records of this layout matching all given filters (any layout record if none
+        match): rating/year ranges are inclusive (low, high) pairs, genre terms match inside a
+        genre, age terms (already normalised) inside the normalised age rating. sort is
+        'year', 'rating', 'latest' (newest file) or 'random'.
+        """
+        n = len(self.records)
+        alive = self.alive[:n]
+        mask = alive.copy()
+        if rating_range:
+            mask &= (self.rating[:n] >= rating_range[0]) & (self.rating[:n] <= rating_range[1])
+        if year_range:
+            mask &= (self.year[:n] >= year_range[0]) & (self.year[:n] <= year_range[1])
+        if genre_terms:
+            mask &= self._genre_mask(n, genre_terms)
+        if age_terms:
+            mask &= self._age_mask(n, age_terms)
+
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            rows = np.flatnonzero(alive)  # filters too strict: fall back to the whole layout
+        if not len(rows):
+            return []
+
+        column = {'year': self.year, 'rating': self.rating, 'latest': self.mtime}.get(sort)
+        if column is None:
+            picked = [rows[random.randrange(len(rows))]] if k == 1 else random.sample(list(rows), min(k, len(rows)))
+        else:
+            picked = top_rows(column[rows], rows, k)
+        return [self.records[row] for row in picked]
+
+def top_rows(values, rows, k):
+    """The rows with the k largest values, largest first (earliest row first among ties)."""
+    if k == 1:
+        return [rows[int(np.argmax(values))]]
+    if k < len(rows):
+        part = np.argpartition(-values, k - 1)[:k]
+        values, rows = values[part], rows[part]
+    order = np.lexsort((rows, -values))
+    return list(rows[order])
+
+class MetadataCatalog:
+    """Thread-safe record store with layout, facet and rating-level indexes (see module docstring)."""
+    FACETS = ('genres', 'ages', 'years')
+
+    def __init__(self):
+        self._records = {}
+        self._layouts = {}
+        self._postings = {facet: {} for facet in self.FACETS}
+        self._rating_levels = {}
+        self._columns = {}
+        self._lock = threading.Lock()
+        self.version = 0  # bumped on every change
+
+    @staticmethod
+    def key(path):
+        return os.path.normcase(os.path.splitext(path)[0])
+
+    def __len__(self):
+        return len(self._records)
+
+    def _index(self, record):
+        self._records[record.key] = record
+        self._layouts.setdefault(record.layout, {})[record.key] = record
+        columns = self._columns.get(record.layout)
+        if columns is not None:
+            columns.add(record)
+        for facet, value in record.facets():
+            self._postings[facet].setdefault(value, set()).add(record.key)
+        if record.rating > 0:
+            level = int(record.rating)
+            self._rating_levels[level] = self._rating_levels.get(level, 0) + 1
+
+    def _unindex(self, record):
+        del self._records[record.key]
+        layout = self._layouts[record.layout]
+        del layout[record.key]
+        if not layout:
+            del self._layouts[record.layout]
+            self._columns.pop(record.layout, None)
+        elif record.layout in self._columns:
+            self._columns[record.layout].remove(record.key)
+        for facet, value in record.facets():
+            posting = self._postings[facet][value]
+            posting.discard(record.key)
+            if not posting:
+                del self._postings[facet][value]
+        if record.rating > 0:
+            level = int(record.rating)
+            self._rating_levels[level] -= 1
+            if not self._rating_levels[level]:
+                del self._rating_levels[level]
+
+    def upsert(self, path, layout, metadata, mtime=None):
+        """Adds or replaces the record for `path` (mtime defaults to the file's); returns it."""
+        if mtime is None:
+            mtime = file_mtime(path)
+        record = ImageRecord(self.key(path), path, layout, metadata or {}, mtime)
+        with self._lock:
+            old = self._records.get(record.key)
+            if old is not None:
+                self._unindex(old)
+            self._index(record)
+            self.version += 1
+        return record
+
+    def delete(self, path):
+        """Removes the record for `path` (image or JSON); returns True if there was one."""
+        with self._lock:
+            record = self._records.get(self.key(path))
+            if record is None:
+                return False
+            self._unindex(record)
+            self.version += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._layouts.clear()
+            for posting in self._postings.values():
+                posting.clear()
+            self._rating_levels.clear()
+            self._columns.clear()
+            self.version += 1
+
+    def get(self, path):
+        return self._records.get(self.key(path))
+
+    def records(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def layout_records(self, layout):
+        """Records of one layout (a snapshot list)."""
+        with self._lock:
+            return list(self._layouts.get(layout, {}).values())
+
+    def values(self, facet):
+        """Distinct values of 'genres', 'ages' or 'years' that at least one record has."""
+        with self._lock:
+            return set(self._postings[facet])
+
+    def posting(self, facet, value):
+        """Keys of the records carrying a facet value (a snapshot set)."""
+        with self._lock:
+            return set(self._postings[facet].get(value, ()))
+
+    def rating_levels(self):
+        """Integer rating levels present (7 for 7.0-7.9), highest first."""
+        with self._lock:
+            return sorted(self._rating_levels, reverse=True)
+
+    def query(self, layout, **filters):
+        """Picks records of a layout, see LayoutColumns.select(); the columns are built on first use."""
+        with self._lock:
+            columns = self._columns.get(layout)
+            if columns is None:
+                records = self._layouts.get(layout)
+                if not records:
+                    return []
+                columns = self._columns[layout] = LayoutColumns(records.values(), capacity=max(64, 2 * len(records)))
+            return columns.select(**filters)
+
+    def to_dict(self):
+        """metadata_cache.json contents."""
+        with self._lock:
+            return {
+                "genres": sorted(self._postings['genres']),
+                "ages": sorted(self._postings['ages']),
+                "years": sorted(self._postings['years']),
+                "images": [record.to_dict() for record in self._records.values()]
+            }
+
+    def load(self, data):
+        """Replaces the contents with the images of a metadata_cache.json dict."""
+        self.clear()
+        for image in data.get("images", []):
+            if image.get('path') and image.get('layout'):
+                self.upsert(image['path'], image['layout'], image, image.get('mtime'))
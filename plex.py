@@ -11,11 +11,15 @@ from io import BytesIO
 
 # === Third-Party Imports ===
 import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont
 from plexapi.server import PlexServer
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# === Local Imports ===
+from image_engine import get_font, open_image, wrap_text
+
 # === User Configurable Options ===
 
 # NOTE: It's recommended to load these from environment variables
@@ -143,7 +147,7 @@ def download_font(url, path):
     """
     try:
         if not os.path.exists(path):
-            response = requests.get(url, timeout=10)
+            response = http_client.get(url, timeout=10)
             if response.status_code == 200:
                 with open(path, 'wb') as f:
                     f.write(response.content)
@@ -265,47 +269,6 @@ def draw_text_with_shadow(draw, position, text, font, fill_color, shadow_color,
     # The main text is drawn on top of the shadow at the original position (x, y)
     draw.text((x, y), text, font=font, fill=fill_color)
 
-def wrap_text_by_pixel_width(text, font, max_width, draw):
-    """
-    Wraps text to fit within a pixel width using the specified font and draw context.
-
-    :param text: The input text to wrap.
-    :param font: PIL ImageFont object.
-    :param max_width: Maximum width in pixels.
-    :param draw: PIL ImageDraw.Draw object (needed for textbbox).
-    :return: List of lines.
-    """
-    words = text.split()
-    lines = []
-    current_line = ""
-
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        line_width = draw.textlength(test_line, font=font)
-
-        if line_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:  # if line isn't empty, push it
-                lines.append(current_line)
-            # If word alone is longer than max width, forcibly split it
-            if draw.textlength(word, font=font) > max_width:
-                split_word = ""
-                for char in word:
-                    if draw.textlength(split_word + char, font=font) <= max_width:
-                        split_word += char
-                    else:
-                        lines.append(split_word)
-                        split_word = char
-                current_line = split_word
-            else:
-                current_line = word
-
-    if current_line:
-        lines.append(current_line)
-
-    return lines
-
 def clean_filename(filename: str) -> str:
     """
     Sanitizes a filename by replacing problematic characters with underscores.
@@ -325,7 +288,7 @@ def download_logo_in_memory(media_item) -> Image.Image or None:
     logo_url = f"{baseurl}/library/metadata/{media_item.ratingKey}/clearLogo?X-Plex-Token={token}"
 
     try:
-        response = requests.get(logo_url, timeout=10)
+        response = http_client.get(logo_url, timeout=10)
         if response.status_code == 200:
             return Image.open(BytesIO(response.content))
         else:
@@ -380,32 +343,31 @@ def generate_background_for_item(item, media_type, group_type='',
 
     try:
         # Download the background image from Plex
-        response = requests.get(background_url, timeout=10)
+        response = http_client.get(background_url, timeout=10)
         response.raise_for_status()
 
         # Load image directly from bytes into memory
-        image = Image.open(BytesIO(response.content))
+        image = open_image(response.content, min_height=1500)
 
-        # Make copies of cached base background and overlay
+        # Copy the cached base background (the overlay is only read, so it is not copied)
         canvas = base_background.copy()
-        overlay_copy = overlay.copy()
 
         # Resize background image to height=1500
         image = resize_image(image, 1500)
 
         # Paste artwork and overlay on top
         canvas.paste(image, (1175, 0))
-        canvas.paste(overlay_copy, (1175, 0), overlay_copy)
+        canvas.paste(overlay, (1175, 0), overlay)
 
         # Prepare to draw
         draw = ImageDraw.Draw(canvas)
 
         # Load fonts
         try:
-            font_title = ImageFont.truetype(truetype_path, size=190)
-            font_info = ImageFont.truetype(truetype_path, size=55)
-            font_summary = ImageFont.truetype(truetype_path, size=50)
-            font_custom = ImageFont.truetype(truetype_path, size=60)
+            font_title = get_font(truetype_path, size=190)
+            font_info = get_font(truetype_path, size=55)
+            font_summary = get_font(truetype_path, size=50)
+            font_custom = get_font(truetype_path, size=60)
         except (OSError, IOError) as e:
             print(f"[ERROR] Stopped background generation. Failed to load font from '{truetype_path}': {e}")
             return  # Exit the function early; image generation cannot proceed without fonts
@@ -458,7 +420,7 @@ def generate_background_for_item(item, media_type, group_type='',
         summary_max_chars = max_summary_chars if max_summary_chars is not None else 525
         summary_pixel_width = max_summary_width if max_summary_width is not None else 2100
         summary_text, was_truncated = truncate_summary(item.summary, summary_max_chars)
-        wrapped_summary_lines = wrap_text_by_pixel_width(summary_text, font_summary, max_width=summary_pixel_width, draw=draw)
+        wrapped_summary_lines = wrap_text(font_summary, summary_text, summary_pixel_width)
         wrapped_summary = "\n".join(wrapped_summary_lines)
         summary_position = (current_x, current_y)
         draw_text_with_shadow(draw, summary_position, wrapped_summary, font_summary, summary_color, shadow_color, (shadow_offset, shadow_offset))
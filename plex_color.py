@@ -15,11 +15,15 @@ from io import BytesIO
 import re
 import numpy as np
 import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from plexapi.server import PlexServer
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# === Local Imports ===
+from image_engine import blur_background, apply_dither, get_font, open_image, vignette_mask, wrap_text
+
 # === User Configurable Options ===
 
 # NOTE: It's recommended to load these from environment variables
@@ -147,7 +151,7 @@ def download_font(url, path):
     """
     try:
         if not os.path.exists(path):
-            response = requests.get(url, timeout=10)
+            response = http_client.get(url, timeout=10)
             if response.status_code == 200:
                 with open(path, 'wb') as f:
                     f.write(response.content)
@@ -193,43 +197,15 @@ def validate_color(color, default):
             return color
     return default
 
-def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16):
+def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16, darken=1.0):
     """
     Create a blurry canvas background from the input image, with strong noise to prevent banding.
+    The optional darken factor is applied in the same pass as the dithering.
     """
-    bg = image.resize(size, Image.LANCZOS).convert('RGB')
-    bg = bg.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    bg_array = np.array(bg).astype(np.float32)
-
-    # Add dithering noise
-    noise = np.random.uniform(-dither_strength, dither_strength, bg_array.shape)
-    return Image.fromarray(np.clip(bg_array + noise, 0, 255).astype(np.uint8))
-
-def vignette_side(h, w, fade_ratio=5, fade_power=5.0, position="bottom-left"):
-    y, x = np.ogrid[0:h, 0:w]
-    rx, ry = w * fade_ratio, h * fade_ratio
-
-    dist_x, dist_y = np.ones_like(x, dtype=np.float32), np.ones_like(y, dtype=np.float32)
-
-    if "left" in position:
-        dist_x = np.clip(x / rx, 0, 1)
-    elif "right" in position:
-        dist_x = np.clip((w - x) / rx, 0, 1)
+    bg = blur_background(image.convert('RGB'), size=size, blur_radius=blur_radius)
 
-    if "top" in position:
-        dist_y = np.clip(y / ry, 0, 1)
-    elif "bottom" in position:
-        dist_y = np.clip((h - y) / ry, 0, 1)
-
-    if any(corner in position for corner in ["left", "right"]) and \
-       any(corner in position for corner in ["top", "bottom"]):
-        alpha = np.minimum(dist_x, dist_y)
-    else:
-        alpha = dist_x * dist_y
-
-    alpha = (alpha ** fade_power * 255).astype(np.uint8)
-    mask = Image.fromarray(alpha)
-    return mask
+    # Add dithering noise (and darken)
+    return apply_dither(bg, strength=dither_strength, darken=darken)
 
 def generate_background_fast(input_img, target_width=3000):
     """
@@ -239,10 +215,7 @@ def generate_background_fast(input_img, target_width=3000):
     - Pastes resized image top-right
     """
     # Step 1: Create blurry/dark canvas
-    canvas_rgb = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800)
-    canvas_array = np.array(canvas_rgb).astype(np.float32)
-    canvas_array = (canvas_array * 0.4).clip(0, 255).astype(np.uint8)  # darken
-    canvas_rgb = Image.fromarray(canvas_array)
+    canvas_rgb = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800, darken=0.4)
 
     # RGBA base
     canvas = Image.new("RGBA", canvas_rgb.size, (0, 0, 0, 255))
@@ -255,7 +228,7 @@ def generate_background_fast(input_img, target_width=3000):
 
     # Step 3: Apply bottom-left vignette
     h, w = img_resized.height, img_resized.width
-    mask = vignette_side(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left")
+    mask = vignette_mask(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left")
     img_resized.putalpha(mask)
 
     # Step 4: Paste aligned top-right
@@ -340,47 +313,6 @@ def draw_text_with_shadow(draw, position, text, font, fill_color, shadow_color,
     # The main text is drawn on top of the shadow at the original position (x, y)
     draw.text((x, y), text, font=font, fill=fill_color)
 
-def wrap_text_by_pixel_width(text, font, max_width, draw):
-    """
-    Wraps text to fit within a pixel width using the specified font and draw context.
-
-    :param text: The input text to wrap.
-    :param font: PIL ImageFont object.
-    :param max_width: Maximum width in pixels.
-    :param draw: PIL ImageDraw.Draw object (needed for textbbox).
-    :return: List of lines.
-    """
-    words = text.split()
-    lines = []
-    current_line = ""
-
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        line_width = draw.textlength(test_line, font=font)
-
-        if line_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:  # if line isn't empty, push it
-                lines.append(current_line)
-            # If word alone is longer than max width, forcibly split it
-            if draw.textlength(word, font=font) > max_width:
-                split_word = ""
-                for char in word:
-                    if draw.textlength(split_word + char, font=font) <= max_width:
-                        split_word += char
-                    else:
-                        lines.append(split_word)
-                        split_word = char
-                current_line = split_word
-            else:
-                current_line = word
-
-    if current_line:
-        lines.append(current_line)
-
-    return lines
-
 def clean_filename(filename: str) -> str:
     """
     Sanitizes a filename by replacing problematic characters with underscores.
@@ -400,7 +332,7 @@ def download_logo_in_memory(media_item) -> Image.Image | None:
     logo_url = f"{baseurl}/library/metadata/{media_item.ratingKey}/clearLogo?X-Plex-Token={token}"
 
     try:
-        response = requests.get(logo_url, timeout=10)
+        response = http_client.get(logo_url, timeout=10)
         if response.status_code == 200:
             return Image.open(BytesIO(response.content))
         else:
@@ -453,11 +385,11 @@ def generate_background_for_item(item, media_type, group_type='',
 
     try:
         # Download the background image from Plex
-        response = requests.get(background_url, timeout=10)
+        response = http_client.get(background_url, timeout=10)
         response.raise_for_status()
 
         # Load image directly from bytes into memory
-        image = Image.open(BytesIO(response.content))
+        image = open_image(response.content, min_width=3000)
 
         # Make copies of cached base background and overlay
         canvas = generate_background_fast(image)
@@ -468,10 +400,10 @@ def generate_background_for_item(item, media_type, group_type='',
 
         # Load fonts
         try:
-            font_title = ImageFont.truetype(truetype_path, size=190)
-            font_info = ImageFont.truetype(truetype_path, size=55)
-            font_summary = ImageFont.truetype(truetype_path, size=50)
-            font_custom = ImageFont.truetype(truetype_path, size=60)
+            font_title = get_font(truetype_path, size=190)
+            font_info = get_font(truetype_path, size=55)
+            font_summary = get_font(truetype_path, size=50)
+            font_custom = get_font(truetype_path, size=60)
         except (OSError, IOError) as e:
             print(f"[ERROR] Stopped background generation. Failed to load font from '{truetype_path}': {e}")
             return  # Exit the function early; image generation cannot proceed without fonts
@@ -524,7 +456,7 @@ def generate_background_for_item(item, media_type, group_type='',
         summary_max_chars = max_summary_chars if max_summary_chars is not None else 525
         summary_pixel_width = max_summary_width if max_summary_width is not None else 2100
         summary_text, was_truncated = truncate_summary(item.summary, summary_max_chars)
-        wrapped_summary_lines = wrap_text_by_pixel_width(summary_text, font_summary, max_width=summary_pixel_width, draw=draw)
+        wrapped_summary_lines = wrap_text(font_summary, summary_text, summary_pixel_width)
         wrapped_summary = "\n".join(wrapped_summary_lines)
         summary_position = (current_x, current_y)
         draw_text_with_shadow(draw, summary_position, wrapped_summary, font_summary, summary_color, shadow_color, (shadow_offset, shadow_offset))
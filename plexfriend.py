@@ -13,12 +13,15 @@ import textwrap
 import json
 
 # === Third-Party Imports ===
-import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont
 from plexapi.myplex import MyPlexAccount
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# === Local Imports ===
+from image_engine import get_font, open_image, wrap_text
+
 # === User Configurable Options ===
 PLEX_TOKEN = locals().get('token', os.getenv('PLEX_TOKEN'))
 TARGET_FRIEND = None  # e.g. "Alice Dupont"
@@ -70,7 +73,7 @@ os.makedirs(background_dir, exist_ok=True)
 def download_font(url, path):
     try:
         if not os.path.exists(path):
-            r = requests.get(url, timeout=10)
+            r = http_client.get(url, timeout=10)
             if r.status_code == 200:
                 with open(path, 'wb') as f: f.write(r.content)
                 return True
@@ -128,18 +131,6 @@ def truncate_summary(summary: str, max_chars: int) -> Tuple[str, bool]:
     except ValueError:
         return "...", True
 
-def wrap_text_by_pixel_width(text, font, max_width, draw):
-    words, lines, cur = text.split(), [], ''
-    for w in words:
-        test = (cur+' '+w).strip()
-        if draw.textlength(test, font=font) <= max_width:
-            cur = test
-        else:
-            if cur: lines.append(cur)
-            cur = w
-    if cur: lines.append(cur)
-    return lines
-
 def draw_text_with_shadow(draw, pos, text, font, fill, shadow, offset=(2,2)):
     x,y = pos
     draw.text((x+offset[0], y+offset[1]), text, font=font, fill=shadow)
@@ -148,7 +139,7 @@ def draw_text_with_shadow(draw, pos, text, font, fill, shadow, offset=(2,2)):
 def download_logo_in_memory(item, baseurl, token):
     url = f"{baseurl}/library/metadata/{item.ratingKey}/clearLogo?X-Plex-Token={token}"
     try:
-        r = requests.get(url, timeout=10)
+        r = http_client.get(url, timeout=10)
         if r.status_code == 200:
             return Image.open(BytesIO(r.content))
     except:
@@ -171,8 +162,8 @@ def generate_background_for_item(item, media_type, group_type,
     art_url = item.artUrl
     if not art_url: return
     try:
-        r = requests.get(art_url, timeout=10); r.raise_for_status()
-        art = Image.open(BytesIO(r.content))
+        r = http_client.get(art_url, timeout=10); r.raise_for_status()
+        art = open_image(r.content, min_height=1500)
     except:
         return
 
@@ -190,17 +181,16 @@ def generate_background_for_item(item, media_type, group_type,
 
     # compose canvas
     canvas = base_background.copy()
-    over   = overlay.copy()
     art    = resize_image(art, 1500)
-    canvas.paste(art, (1175,0)); canvas.paste(over,(1175,0),over)
+    canvas.paste(art, (1175,0)); canvas.paste(overlay,(1175,0),overlay)
     draw = ImageDraw.Draw(canvas)
 
     # load fonts
     try:
-        ft_title   = ImageFont.truetype(truetype_path, size=190)
-        ft_info    = ImageFont.truetype(truetype_path, size=55)
-        ft_summary = ImageFont.truetype(truetype_path, size=50)
-        ft_custom  = ImageFont.truetype(truetype_path, size=60)
+        ft_title   = get_font(truetype_path, size=190)
+        ft_info    = get_font(truetype_path, size=55)
+        ft_summary = get_font(truetype_path, size=50)
+        ft_custom  = get_font(truetype_path, size=60)
     except Exception as e:
         print(f"[ERROR] Font load: {e}")
         return
@@ -242,7 +232,7 @@ def generate_background_for_item(item, media_type, group_type,
     max_chars  = max_summary_chars or 150
     max_pixels = max_summary_width or 1800
     summary, _ = truncate_summary(item.summary, max_chars)
-    lines      = wrap_text_by_pixel_width(summary, ft_summary, max_pixels, draw)
+    lines      = wrap_text(ft_summary, summary, max_pixels)
     wrapped    = "\n".join(lines)
     draw_text_with_shadow(draw, (current_x, current_y), wrapped, ft_summary, summary_color, shadow_color, (shadow_offset,)*2)
     summary_bbox = draw.textbbox((0,0), wrapped, font=ft_summary)
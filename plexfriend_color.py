@@ -12,13 +12,16 @@ import textwrap
 import json
 
 # === Third-Party Imports ===
-import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import numpy as np
 from plexapi.myplex import MyPlexAccount
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# === Local Imports ===
+from image_engine import blur_background, apply_dither, get_font, open_image, vignette_mask
+
 # === User Configurable Options ===
 PLEX_TOKEN = locals().get('token', os.getenv('PLEX_TOKEN'))
 TARGET_FRIEND = None  # e.g. "Alice Dupont"
@@ -72,7 +75,7 @@ os.makedirs(background_dir, exist_ok=True)
 def download_font(url, path):
     try:
         if not os.path.exists(path):
-            r = requests.get(url, timeout=10)
+            r = http_client.get(url, timeout=10)
             if r.status_code == 200:
                 with open(path, 'wb') as f: f.write(r.content)
                 return True
@@ -162,7 +165,7 @@ def wrap_summary_with_line_limit(text, font, max_width, draw, max_lines=3):
 def download_logo_in_memory(item, baseurl, token):
     url = f"{baseurl}/library/metadata/{item.ratingKey}/clearLogo?X-Plex-Token={token}"
     try:
-        r = requests.get(url, timeout=10)
+        r = http_client.get(url, timeout=10)
         if r.status_code == 200:
             return Image.open(BytesIO(r.content))
     except:
@@ -170,33 +173,12 @@ def download_logo_in_memory(item, baseurl, token):
     return None
 
 # === Background Pipeline ===
-def vignette_side(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left"):
-    y, x = np.ogrid[0:h, 0:w]
-    rx, ry = w * fade_ratio, h * fade_ratio
-    dist_x, dist_y = np.ones_like(x, dtype=np.float32), np.ones_like(y, dtype=np.float32)
-
-    if "left" in position: dist_x = np.clip(x / rx, 0, 1)
-    elif "right" in position: dist_x = np.clip((w - x) / rx, 0, 1)
-    if "top" in position: dist_y = np.clip(y / ry, 0, 1)
-    elif "bottom" in position: dist_y = np.clip((h - y) / ry, 0, 1)
-
-    if any(corner in position for corner in ["left","right"]) and any(corner in position for corner in ["top","bottom"]):
-        alpha = np.minimum(dist_x, dist_y)
-    else:
-        alpha = dist_x * dist_y
-
-    return Image.fromarray((alpha ** fade_power * 255).astype(np.uint8))
-
-def create_blurry_background(image, size=(3840,2160), blur_radius=800, dither_strength=16):
-    bg = image.resize(size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    bg_array = np.array(bg).astype(np.float32)
-    noise = np.random.uniform(-dither_strength, dither_strength, bg_array.shape)
-    return Image.fromarray(np.clip(bg_array+noise,0,255).astype(np.uint8))
+def create_blurry_background(image, size=(3840,2160), blur_radius=800, dither_strength=16, darken=1.0):
+    bg = blur_background(image, size=size, blur_radius=blur_radius)
+    return apply_dither(bg, strength=dither_strength, darken=darken)
 
 def generate_background_fast(input_img, target_width=3000):
-    canvas_rgb = create_blurry_background(input_img, size=(3840,2160), blur_radius=800)
-    canvas_array = (np.array(canvas_rgb).astype(np.float32)*0.4).clip(0,255).astype(np.uint8)
-    canvas_rgb = Image.fromarray(canvas_array)
+    canvas_rgb = create_blurry_background(input_img, size=(3840,2160), blur_radius=800, darken=0.4)
 
     canvas = Image.new("RGBA", canvas_rgb.size, (0,0,0,255))
     canvas.paste(canvas_rgb,(0,0))
@@ -206,8 +188,7 @@ def generate_background_fast(input_img, target_width=3000):
     img_resized = input_img.resize(new_size, Image.LANCZOS).convert("RGBA")
 
     h, w = img_resized.height, img_resized.width
-    mask = vignette_side(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left")
-    mask = mask.filter(ImageFilter.GaussianBlur(radius=50))
+    mask = vignette_mask(h, w, fade_ratio=0.3, fade_power=2.5, position="bottom-left", blur_radius=50)
     img_resized.putalpha(mask)
 
     canvas.paste(img_resized, (3840-w,0), img_resized)
@@ -228,8 +209,8 @@ def generate_background_for_item(item, media_type, order_type, plex_logo, target
         return
 
     try:
-        r = requests.get(art_url, timeout=10); r.raise_for_status()
-        art = Image.open(BytesIO(r.content)).convert("RGB")
+        r = http_client.get(art_url, timeout=10); r.raise_for_status()
+        art = open_image(r.content, min_width=2700).convert("RGB")
     except Exception as e:
         print(f"[ERROR] Could not fetch art for {item.title}: {e}")
         return
@@ -237,10 +218,10 @@ def generate_background_for_item(item, media_type, order_type, plex_logo, target
     canvas = generate_background_fast(art, target_width=2700)
     draw = ImageDraw.Draw(canvas)
 
-    ft_title   = ImageFont.truetype(env_font_name, size=190)
-    ft_info    = ImageFont.truetype(env_font_name, size=55)
-    ft_summary = ImageFont.truetype(env_font_name, size=50)
-    ft_custom  = ImageFont.truetype(env_font_name, size=60)
+    ft_title   = get_font(env_font_name, size=190)
+    ft_info    = get_font(env_font_name, size=55)
+    ft_summary = get_font(env_font_name, size=50)
+    ft_custom  = get_font(env_font_name, size=60)
 
     # --- DYNAMIC LAYOUT ---
     padding = 25
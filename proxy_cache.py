@@ -0,0 +1,233 @@
+"""
+Disk-backed LRU cache for the image proxy (/api/proxy/image).
+
+Entries are keyed by the upstream URL with credentials stripped from the query string
+(api_key, X-Plex-Token, ...) plus a variant ('raw', or 'logo' for contrast-fixed logos),
+so the same artwork requested with different keys or from different pages is stored once.
+Each entry is a body file plus a small JSON sidecar with the mimetype and the upstream
+ETag/Last-Modified. Entries older than max_age seconds are revalidated with a conditional
+GET; bodies are capped at max_bytes in total and evicted least recently used first.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that carry credentials and must not end up in cache keys or on disk
+SECRET_PARAMS = {'api_key', 'apikey', 'api-key', 'x-plex-token', 'token', 'access_token'}
+
+def cache_url(url):
+    """The URL without credentials (query parameters in SECRET_PARAMS, user:password@)."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS]
+    netloc = parts.netloc.rsplit('@', 1)[-1].lower()
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, urlencode(query), ''))
+
+class CacheEntry:
+    """One cached body: where it lives, what it is, and how to revalidate it."""
+    __slots__ = ('key', 'path', 'size', 'mimetype', 'etag', 'last_modified', 'checked')
+
+    def __init__(self, key, path, size, mimetype, etag=None, last_modified=None, checked=0.0):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked = checked
+
+    def is_fresh(self, max_age):
+        return time.time() - self.checked < max_age
+
+    def validators(self):
+        """Request headers for a conditional GET."""
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ProxyCache:
+    """
+    Thread-safe disk cache of proxied images (see module docstring). The in-memory index is
+    rebuilt from the sidecars on first use (not on construction, so the limits can be set from
+    the config first and processes that never proxy never scan or evict), ordered by the
+    bodies' mtimes (touched on every hit). Entries whose body is gone, e.g. evicted by another
+    process sharing the directory, are dropped from the index when looked up.
+    """
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def key(self, url, variant='raw'):
+        return hashlib.sha1(f"{variant}|{cache_url(url)}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load(self):
+        """Builds the index from disk on first use (lock held)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.endswith('.tmp'):
+                self._remove(path)  # left over from an interrupted write
+                continue
+            if not name.endswith('.json'):
+                continue
+            body = path[:-len('.json')]
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                st = os.stat(body)
+            except (OSError, ValueError):
+                self._remove(path)
+                self._remove(body)
+                continue
+            entry = CacheEntry(name[:-len('.json')], body, st.st_size, meta.get('mimetype') or 'application/octet-stream',
+                               meta.get('etag'), meta.get('last_modified'), meta.get('checked', 0.0))
+            found.append((st.st_mtime, entry))
+        for _, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[entry.key] = entry
+            self.current_bytes += entry.size
+        self._evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _write_meta(self, entry):
+        meta = {"mimetype": entry.mimetype, "etag": entry.etag, "last_modified": entry.last_modified, "checked": entry.checked}
+        tmp = entry.path + '.json.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, entry.path + '.json')
+
+    def _evict(self):
+        """Drops least recently used entries until the cap is met (lock held)."""
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, old = self._entries.popitem(last=False)
+            self.current_bytes -= old.size
+            self.evictions += 1
+            self._remove(old.path)
+            self._remove(old.path + '.json')
+
+    def _drop(self, entry):
+        """Forgets an entry whose body is gone (lock held)."""
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+            self.current_bytes -= entry.size
+        self._remove(entry.path + '.json')
+
+    def get(self, url, variant='raw'):
+        """The entry for (url, variant) or None; fresh or not, see CacheEntry.is_fresh()."""
+        key = self.key(url, variant)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.exists(entry.path):
+                self._drop(entry)
+                entry = None
+            if entry is None:
+                self.misses += 1
+            return entry
+
+    def open(self, entry):
+        """Opens an entry's body for serving (None if it was evicted meanwhile) and marks it as used."""
+        with self._lock:
+            if self._entries.get(entry.key) is not entry:
+                return None
+            try:
+                f = open(entry.path, 'rb')
+            except OSError:
+                self._drop(entry)
+                return None
+            self._entries.move_to_end(entry.key)
+            self.hits += 1
+        try:
+            os.utime(entry.path)
+        except OSError:
+            pass
+        return f
+
+    def revalidated_ok(self, entry, headers):
+        """Records a 304 Not Modified: the entry is fresh again (with any updated validators)."""
+        entry.checked = time.time()
+        entry.etag = headers.get('ETag') or entry.etag
+        entry.last_modified = headers.get('Last-Modified') or entry.last_modified
+        with self._lock:
+            self.revalidated += 1
+            if self._entries.get(entry.key) is not entry:
+                return
+        try:
+            self._write_meta(entry)
+        except OSError as e:
+            print(f"Proxy cache: could not update {entry.key}: {e}")
+
+    @staticmethod
+    def cacheable(headers):
+        return 'no-store' not in (headers.get('Cache-Control') or '').lower()
+
+    def put(self, url, variant, chunks, mimetype, headers):
+        """
+        Stores a body (bytes or an iterable of byte chunks) with the upstream response headers
+        and returns its entry. Bodies larger than the whole cache are not kept (None).
+        """
+        key = self.key(url, variant)
+        path = self._path(key)
+        with self._lock:
+            self._load()  # creates the directory
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        size = 0
+        with open(tmp, 'wb') as f:
+            for chunk in ([chunks] if isinstance(chunks, (bytes, bytearray)) else chunks):
+                f.write(chunk)
+                size += len(chunk)
+        if size > self.max_bytes:
+            self._remove(tmp)
+            return None
+
+        entry = CacheEntry(key, path, size, mimetype, headers.get('ETag'), headers.get('Last-Modified'), time.time())
+        with self._lock:
+            os.replace(tmp, path)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._entries[key] = entry
+            self.current_bytes += size
+            self._write_meta(entry)
+            self._evict()
+        return entry
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                    "evictions": self.evictions, "entries": len(self._entries), "bytes": self.current_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for entry in self._entries.values():
+                self._remove(entry.path)
+                self._remove(entry.path + '.json')
+            self._entries.clear()
+            self.current_bytes = 0
@@ -1,6 +1,6 @@
 # TMDB background generator for Radarr and Sonarr upcoming releases
 
-import requests
+import http_client
 from datetime import datetime, timedelta
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
@@ -9,6 +9,9 @@ import json
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# --- IMPORT IMAGE ENGINE ---
+from image_engine import STATIC_LAYERS, get_font, open_image
+
 # --- CONFIGURATION ---
 RADARR_URL = os.getenv('RADARR_URL')
 SONARR_URL = os.getenv('SONARR_URL')
@@ -31,7 +34,7 @@ if os.path.exists('config.json'):
 
 try:
     url = f"{RADARR_URL}/api/v3/system/status"
-    resp = requests.get(url, headers={"X-Api-Key": RADARR_API_KEY})
+    resp = http_client.get(url, headers={"X-Api-Key": RADARR_API_KEY})
     resp.raise_for_status()
     data = resp.json()
     print(f"Radarr: {data.get('appName')} v{data.get('version')}")
@@ -40,7 +43,7 @@ except Exception as e:
 
 try:
     url = f"{SONARR_URL}/api/v3/system/status"
-    resp = requests.get(url, headers={"X-Api-Key": SONARR_API_KEY})
+    resp = http_client.get(url, headers={"X-Api-Key": SONARR_API_KEY})
     resp.raise_for_status()
     data = resp.json()
     print(f"Sonarr: {data.get('appName')} v{data.get('version')}")
@@ -57,7 +60,7 @@ TMDB_HEADERS = {
 # --- UTILITIES ---
 def fetch_json(url, headers=None, params=None):
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+        resp = http_client.get(url, headers=headers, params=params, timeout=10)
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
@@ -112,7 +115,7 @@ def get_logo(media_type, media_id, language):
 
     # Build TMDB API URL
     url = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language={LANGUAGE}"
-    response = requests.get(url, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
+    response = http_client.get(url, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
     if response.status_code != 200:
         return None
 
@@ -121,7 +124,7 @@ def get_logo(media_type, media_id, language):
     # If no logos at all, try English fallback
     if not logos:
         url_en = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language=en"
-        response_en = requests.get(url_en, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
+        response_en = http_client.get(url_en, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
         if response_en.status_code == 200:
             logos_en = response_en.json().get("logos", [])
             if logos_en:
@@ -152,18 +155,15 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         return
 
     try:
-        response = requests.get(image_url, timeout=10)
-        image = Image.open(BytesIO(response.content))
+        response = http_client.get(image_url, timeout=10)
+        image = open_image(response.content, min_height=1500)
         image = resize_image(image, 1500)
 
-        # Base and overlays
-        bckg = Image.open(os.path.join(os.path.dirname(__file__), "bckg.png"))
-        overlay = Image.open(os.path.join(os.path.dirname(__file__), "overlay.png"))
+        # Base and overlays (pre-composed once by the engine's static layer cache)
+        layers = STATIC_LAYERS.get(os.path.join(os.path.dirname(__file__), "bckg.png"), os.path.join(os.path.dirname(__file__), "overlay.png"), (1175, 0))
         logo = Image.open(os.path.join(os.path.dirname(__file__), RADARR_SONARR_LOGO))
 
-        bckg.paste(image, (1175, 0))
-        if overlay:
-            bckg.paste(overlay, (1175, 0), overlay)
+        bckg = layers.compose(image)
         if logo:
         	if is_movie:
         		logo_position = (970, 890)  # position for movies
@@ -176,12 +176,12 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         font_path = "Roboto-Light.ttf"
         if not os.path.exists(font_path):
             font_url = "https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Light.ttf"
-            font_data = requests.get(font_url).content
+            font_data = http_client.get(font_url).content
             with open(font_path, 'wb') as f: f.write(font_data)
 
-        font_title = ImageFont.truetype(font_path, size=90)
-        font_overview = ImageFont.truetype(font_path, size=50)
-        font_custom = ImageFont.truetype(font_path, size=60)
+        font_title = get_font(font_path, size=90)
+        font_overview = get_font(font_path, size=50)
+        font_custom = get_font(font_path, size=60)
 
         # --- DYNAMIC LAYOUT ---
         padding = 25
@@ -194,7 +194,7 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         logo_path = get_logo("movie" if is_movie else "tv", tmdb_id, language="en")
         if logo_path:
             logo_url = f"{TMDB_IMG_BASE}{logo_path}"
-            logo_resp = requests.get(logo_url)
+            logo_resp = http_client.get(logo_url)
             if logo_resp.status_code == 200:
                 logo_img = Image.open(BytesIO(logo_resp.content))
                 logo_img = resize_logo(logo_img, 1000, 500).convert("RGBA")
@@ -228,7 +228,6 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         draw.text((current_x + shadow_offset, current_y + shadow_offset), custom_text, font=font_custom, fill="black")
         draw.text((current_x, current_y), custom_text, font=font_custom, fill="white")
 
-        bckg = bckg.convert('RGB')
         bckg.save(filename)
         print(f"Generated: {filename}")
 
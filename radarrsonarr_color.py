@@ -1,6 +1,6 @@
 # TMDB background generator for Radarr and Sonarr upcoming releases using a colored background and vignetting effect
 
-import requests
+import http_client
 import numpy as np
 from datetime import datetime, timedelta, timezone
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
@@ -10,6 +10,9 @@ import json
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
 
+# --- IMPORT IMAGE ENGINE ---
+from image_engine import blur_background, apply_dither, get_font, open_image, vignette_mask
+
 # --- CONFIGURATION ---
 RADARR_URL = os.getenv('RADARR_URL')
 SONARR_URL = os.getenv('SONARR_URL')
@@ -32,7 +35,7 @@ if os.path.exists('config.json'):
 
 try:
     url = f"{RADARR_URL}/api/v3/system/status"
-    resp = requests.get(url, headers={"X-Api-Key": RADARR_API_KEY})
+    resp = http_client.get(url, headers={"X-Api-Key": RADARR_API_KEY})
     resp.raise_for_status()
     data = resp.json()
     print(f"Radarr: {data.get('appName')} v{data.get('version')}")
@@ -41,7 +44,7 @@ except Exception as e:
 
 try:
     url = f"{SONARR_URL}/api/v3/system/status"
-    resp = requests.get(url, headers={"X-Api-Key": SONARR_API_KEY})
+    resp = http_client.get(url, headers={"X-Api-Key": SONARR_API_KEY})
     resp.raise_for_status()
     data = resp.json()
     print(f"Sonarr: {data.get('appName')} v{data.get('version')}")
@@ -58,7 +61,7 @@ TMDB_HEADERS = {
 # --- UTILITIES ---
 def fetch_json(url, headers=None, params=None):
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+        resp = http_client.get(url, headers=headers, params=params, timeout=10)
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
@@ -113,7 +116,7 @@ def get_logo(media_type, media_id, language):
 
     # Build TMDB API URL
     url = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language={LANGUAGE}"
-    response = requests.get(url, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
+    response = http_client.get(url, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
     if response.status_code != 200:
         return None
 
@@ -122,7 +125,7 @@ def get_logo(media_type, media_id, language):
     # If no logos at all, try English fallback
     if not logos:
         url_en = f"{TMDB_BASE_URL}/{media_type}/{media_id}/images?language=en"
-        response_en = requests.get(url_en, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
+        response_en = http_client.get(url_en, headers={"accept": "application/json","Authorization": f"Bearer {TMDB_BEARER_TOKEN}"})
         if response_en.status_code == 200:
             logos_en = response_en.json().get("logos", [])
             if logos_en:
@@ -145,55 +148,19 @@ def format_duration(minutes):
     hours = minutes // 60
     mins = minutes % 60
     return f"{hours}h{mins:02d}min"
-def vignette_side(h, w, fade_ratio=5, fade_power=5.0, position="bottom-left", offset_left=0, offset_bottom=0):
-    """
-    Create a vignette mask for the given position.
-    offset_left / offset_bottom allow shifting the start of the fade inward in pixels.
-    """
-    y, x = np.ogrid[0:h, 0:w]
-    rx, ry = w * fade_ratio, h * fade_ratio
-
-    dist_x, dist_y = np.ones_like(x, dtype=np.float32), np.ones_like(y, dtype=np.float32)
-
-    if "left" in position:
-        dist_x = np.clip((x - offset_left) / rx, 0, 1)
-    elif "right" in position:
-        dist_x = np.clip((w - x) / rx, 0, 1)
-
-    if "top" in position:
-        dist_y = np.clip(y / ry, 0, 1)
-    elif "bottom" in position:
-        dist_y = np.clip((h - y - offset_bottom) / ry, 0, 1)
-
-    if any(corner in position for corner in ["left", "right"]) and \
-       any(corner in position for corner in ["top", "bottom"]):
-        alpha = np.minimum(dist_x, dist_y)
-    else:
-        alpha = dist_x * dist_y
-
-    alpha = (alpha ** fade_power * 255).astype(np.uint8)
-    mask = Image.fromarray(alpha)
-    return mask
-
-
-
-def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16):
+def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_strength=16, darken=1.0):
     """
     Create a blurry canvas background from the input image, with strong noise to prevent banding.
     Returns a flag indicating if the image is uniform.
     """
-    bg = image.resize(size, Image.LANCZOS)
-    bg = bg.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    bg_array = np.array(bg).astype(np.float32)
+    bg = blur_background(image, size=size, blur_radius=blur_radius)
 
-    # Add dithering noise
-    noise = np.random.uniform(-dither_strength, dither_strength, bg_array.shape)
-    bg_array = np.clip(bg_array + noise, 0, 255).astype(np.uint8)
-    bg_img = Image.fromarray(bg_array)
+    # Add dithering noise (and darken)
+    bg_img = apply_dither(bg, strength=dither_strength, darken=darken)
 
     # Detect uniformity
     gray = np.array(bg_img.convert("L"))
-    is_uniform = gray.std() < 15  # threshold for "too uniform"
+    is_uniform = gray.std() < 15 * darken  # threshold for "too uniform"
 
     if is_uniform:
         print("[Background] Detected uniform image, will soften vignette.")
@@ -204,11 +171,7 @@ def create_blurry_background(image, size=(3840, 2160), blur_radius=800, dither_s
 
 def generate_background_fast(input_img, target_width=3000):
     # Step 1: Create blurry/dark canvas
-    canvas_rgb, is_uniform = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800)
-
-    canvas_array = np.array(canvas_rgb).astype(np.float32)
-    canvas_array = (canvas_array * 0.4).clip(0, 255).astype(np.uint8)  # darken
-    canvas_rgb = Image.fromarray(canvas_array)
+    canvas_rgb, is_uniform = create_blurry_background(input_img, size=(3840, 2160), blur_radius=800, darken=0.4)
 
     canvas = Image.new("RGBA", canvas_rgb.size, (0, 0, 0, 255))
     canvas.paste(canvas_rgb, (0, 0))
@@ -220,15 +183,15 @@ def generate_background_fast(input_img, target_width=3000):
 
     # Step 3: Apply vignette
     h, w = img_resized.height, img_resized.width
-    mask = vignette_side(
+    mask = vignette_mask(
         h, w,
         fade_ratio=0.3,
         fade_power=2.5,
         position="bottom-left",
         offset_left=0,
-        offset_bottom=150
+        offset_bottom=150,
+        blur_radius=60
     )
-    mask = mask.filter(ImageFilter.GaussianBlur(radius=60))
 
     img_resized.putalpha(mask)
 
@@ -248,8 +211,8 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
 
     try:
         # --- Download main image ---
-        response = requests.get(image_url, timeout=10)
-        image = Image.open(BytesIO(response.content)).convert("RGB")
+        response = http_client.get(image_url, timeout=10)
+        image = open_image(response.content, min_width=3000).convert("RGB")
 
         # --- Generate fast 4K background ---
         bckg = generate_background_fast(image, target_width=3000)
@@ -260,13 +223,13 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         font_path = "Roboto-Light.ttf"
         if not os.path.exists(font_path):
             font_url = "https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Light.ttf"
-            font_data = requests.get(font_url).content
+            font_data = http_client.get(font_url).content
             with open(font_path, 'wb') as f:
                 f.write(font_data)
 
-        font_title = ImageFont.truetype(font_path, size=190)
-        font_overview = ImageFont.truetype(font_path, size=50)
-        font_custom = ImageFont.truetype(font_path, size=60)
+        font_title = get_font(font_path, size=190)
+        font_overview = get_font(font_path, size=50)
+        font_custom = get_font(font_path, size=60)
 
         # --- DYNAMIC LAYOUT ---
         padding = 25
@@ -279,7 +242,7 @@ def process_image(image_url, title, overview, genre, year, rating, custom_text,
         logo_path = get_logo("movie" if is_movie else "tv", tmdb_id, language="en")
         if logo_path:
             logo_url = f"{TMDB_IMG_BASE}{logo_path}"
-            logo_resp = requests.get(logo_url)
+            logo_resp = http_client.get(logo_url)
             if logo_resp.status_code == 200:
                 logo_img = Image.open(BytesIO(logo_resp.content))
                 logo_img = resize_logo(logo_img, 1000, 500).convert("RGBA")
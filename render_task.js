@@ -978,6 +978,11 @@ function applyCustomEffects(canvas, settings, mainBg) {
 
         let mainBg = canvas.getObjects().find(o => o.dataTag === 'background');
         
+        // Backdrop already downloaded by cron_runner (temp file) - otherwise fetched from the URL
+        const backdropSrc = assets.backdrop_path && fs.existsSync(assets.backdrop_path)
+            ? `data:${assets.backdrop_type || 'image/jpeg'};base64,${fs.readFileSync(assets.backdrop_path).toString('base64')}`
+            : assets.backdrop_url;
+
         if (assets.backdrop_url) {
             let left = canvas.width / 2;
             let top = canvas.height / 2;
@@ -998,7 +1003,7 @@ function applyCustomEffects(canvas, settings, mainBg) {
             }
 
             await new Promise(resolve => {
-                fabric.Image.fromURL(assets.backdrop_url, (img) => {
+                fabric.Image.fromURL(backdropSrc, (img) => {
                     if (!img) { 
                         console.warn(`DEBUG: Failed to fetch background from ${assets.backdrop_url}`);
                         resolve(); return; 
@@ -1044,9 +1049,12 @@ function applyCustomEffects(canvas, settings, mainBg) {
         // 1. Timing: Executed after backdrop load but before layout updates
         if (mainBg && assets.backdrop_url) {
             try {
-                // Load image specifically for node-canvas sampling
+                // Edge mean precomputed by cron_runner (image_engine.backdrop_edge_color)
+                let edge = Array.isArray(assets.edge_color) && assets.edge_color.length === 3 ? assets.edge_color : null;
+
+                // Otherwise load image specifically for node-canvas sampling
                 // (JSDOM image element from fabric might not work with node-canvas drawImage)
-                const imageForSampling = await canvasModule.loadImage(assets.backdrop_url);
+                const imageForSampling = edge ? null : await canvasModule.loadImage(backdropSrc);
                 if (imageForSampling) {
                     // 2. Sampling Logic: Use temp canvas (min 200px)
                     const sampleSize = 200;
@@ -1070,40 +1078,44 @@ function applyCustomEffects(canvas, settings, mainBg) {
                     
                     if (count > 0) { 
                         // Calculate Average RGB
-                        r = Math.floor(r/count); g = Math.floor(g/count); b = Math.floor(b/count); 
-
-                        // 3. Brightness Correction: Apply factor from settings (default 20)
-                        let bVal = parseInt(settings.bgBrightness);
-                        if (isNaN(bVal)) bVal = 20;
-                        const factor = bVal / 100;
-                        r = Math.floor(r * factor);
-                        g = Math.floor(g * factor);
-                        b = Math.floor(b * factor);
-
-                        const toHex = (c) => {
-                            const hex = Math.max(0, Math.min(255, c)).toString(16);
-                            return hex.length === 1 ? "0" + hex : hex;
-                        };
-                        const detectedHex = "#" + toHex(r) + toHex(g) + toHex(b);
-                        
-                        // 4. State Sync: Update settings.bgColor AND canvas.backgroundColor
-                        // This ensures fade gradients use the correct darkened color
-                        settings.bgColor = detectedHex;
-                        if (typeof canvas.setBackgroundColor === 'function') canvas.setBackgroundColor(detectedHex, () => {});
-                        canvas.backgroundColor = detectedHex;
-                        
-                        console.log(`Auto-Color Applied: ${detectedHex} (Brightness: ${bVal}%)`);
-
-                        // Sync Textbox backgrounds
-                        canvas.getObjects().forEach(obj => {
-                            if (obj.type === 'textbox' && (obj.autoBackgroundColor === true || obj.autoBackgroundColor === "true") && obj.backgroundColor) {
-                                const c = new fabric.Color(obj.backgroundColor);
-                                const currentOpacity = c.getSource()[3];
-                                obj.set('backgroundColor', `rgba(${r}, ${g}, ${b}, ${currentOpacity})`);
-                            }
-                        });
+                        edge = [Math.floor(r/count), Math.floor(g/count), Math.floor(b/count)];
                     }
                 }
+
+                if (edge) {
+                    let [r, g, b] = edge;
+
+                    // 3. Brightness Correction: Apply factor from settings (default 20)
+                    let bVal = parseInt(settings.bgBrightness);
+                    if (isNaN(bVal)) bVal = 20;
+                    const factor = bVal / 100;
+                    r = Math.floor(r * factor);
+                    g = Math.floor(g * factor);
+                    b = Math.floor(b * factor);
+
+                    const toHex = (c) => {
+                        const hex = Math.max(0, Math.min(255, c)).toString(16);
+                        return hex.length === 1 ? "0" + hex : hex;
+                    };
+                    const detectedHex = "#" + toHex(r) + toHex(g) + toHex(b);
+                    
+                    // 4. State Sync: Update settings.bgColor AND canvas.backgroundColor
+                    // This ensures fade gradients use the correct darkened color
+                    settings.bgColor = detectedHex;
+                    if (typeof canvas.setBackgroundColor === 'function') canvas.setBackgroundColor(detectedHex, () => {});
+                    canvas.backgroundColor = detectedHex;
+                    
+                    console.log(`Auto-Color Applied: ${detectedHex} (Brightness: ${bVal}%)`);
+
+                    // Sync Textbox backgrounds
+                    canvas.getObjects().forEach(obj => {
+                        if (obj.type === 'textbox' && (obj.autoBackgroundColor === true || obj.autoBackgroundColor === "true") && obj.backgroundColor) {
+                            const c = new fabric.Color(obj.backgroundColor);
+                            const currentOpacity = c.getSource()[3];
+                            obj.set('backgroundColor', `rgba(${r}, ${g}, ${b}, ${currentOpacity})`);
+                        }
+                    });
+                }
             } catch (e) {
                 console.warn("Auto color detection error:", e.message);
             }
@@ -1304,7 +1316,15 @@ function applyCustomEffects(canvas, settings, mainBg) {
 
         await new Promise((resolve, reject) => {
             const outStream = fs.createWriteStream(outputPath);
-            const canvasStream = canvas.createJPEGStream({ quality: 0.95 });
+            // Output settings come from editor.output (see cron_runner.node_output_options)
+            const output = payload.output || { format: 'jpeg', quality: 0.95 };
+            const canvasStream = output.format === 'png'
+                ? canvas.createPNGStream()
+                : canvas.createJPEGStream({
+                    quality: output.quality ?? 0.95,
+                    progressive: !!output.progressive,
+                    chromaSubsampling: output.chromaSubsampling ?? true
+                });
             canvasStream.pipe(outStream);
             outStream.on('finish', resolve);
             outStream.on('error', reject);
@@ -0,0 +1,33 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+
+class CookieHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = (self.headers.get('Cookie') or '').encode()
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session=caller-a; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), CookieHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}/"
+    srv.shutdown()
+    srv.server_close()
+
+def test_pooled_session_does_not_share_cookies(server):
+    client = http_client.HttpClient()
+    assert client.get(server).cookies.get('session') == 'caller-a'
+    assert client.get(server).text == ''  # the next caller does not get caller A's cookie
+    assert client.get(server, cookies={'token': 'b'}).text == 'token=b'
+    assert client.session(server) is client.session(server)  # still one pooled session per host
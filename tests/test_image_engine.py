@@ -0,0 +1,231 @@
+import copy
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import image_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope='module')
+def artwork():
+    return Image.open(os.path.join(ROOT, 'background.jpg')).convert('RGB')
+
+@pytest.mark.parametrize('size, radius', [
+    ((3840, 2160), 800),
+    ((1920, 1080), 400),
+    ((3840, 2160), 200),
+    ((1920, 1080), 50),
+    ((1280, 720), 12),
+])
+def test_blur_background_matches_full_resolution_blur(artwork, size, radius):
+    assert image_engine.blur_scale(size, radius) > 1.0  # the proxy path is what is being tested
+    reference = artwork.resize(size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(radius=radius))
+    result = image_engine.blur_background(artwork, size, radius)
+    assert result.size == size
+
+    diff = np.abs(np.asarray(result, dtype=np.int16) - np.asarray(reference, dtype=np.int16))
+    assert diff.mean() < 2.0
+    assert diff.max() <= 12
+
+def test_blur_background_small_radius_is_exact(artwork):
+    reference = artwork.resize((640, 360), Image.LANCZOS).filter(ImageFilter.GaussianBlur(radius=4))
+    result = image_engine.blur_background(artwork, (640, 360), 4)
+    assert np.array_equal(np.asarray(result), np.asarray(reference))
+
+def pixel_size(text, font, shadow_offset):
+    """The previous measurement: draw text and shadow on a scratch canvas and scan its pixels."""
+    draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    est = draw.textbbox((0, 0), text, font=font)
+    scratch = Image.new('RGBA', (est[2] - est[0] + 100 + shadow_offset, est[3] - est[1] + 100 + shadow_offset), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(scratch)
+    draw.text((50 + shadow_offset, 50 + shadow_offset), text, font=font, fill='black')
+    draw.text((50, 50), text, font=font, fill='white')
+    bbox = scratch.getbbox()
+    return (bbox[2] - bbox[0], bbox[3] - bbox[1]) if bbox else (0, 0)
+
+def pixel_run_width(pieces, font, shadow_offset):
+    """The previous tags measurement: pieces drawn one after another, advancing by textlength."""
+    scratch = Image.new('RGBA', (int(sum(font.getlength(p) for p in pieces)) + 300, font.size * 3 + 100), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(scratch)
+    x = 100
+    for piece in pieces:
+        draw.text((x + shadow_offset, 50 + shadow_offset), piece, font=font, fill='black')
+        draw.text((x, 50), piece, font=font, fill='white')
+        x += draw.textlength(piece, font=font)
+    bbox = scratch.getbbox()
+    return bbox[2] - bbox[0] if bbox else 0
+
+METRIC_FONTS = ['Andika-Bold.ttf', 'Arvo-Italic.ttf', 'Codystar-Light.ttf', 'FiraSans-Regular.ttf', 'Roboto-Regular.ttf']
+METRIC_TEXTS = ['Breaking Bad', 'Die Heiligen drei Könige', 'Wj,gyq', 'A summary that\nwraps over two lines gjy']
+
+@pytest.mark.parametrize('font_name', METRIC_FONTS)
+@pytest.mark.parametrize('size', [40, 100, 190])
+def test_text_metrics_parity_with_pixel_measurement(font_name, size):
+    path = os.path.join(ROOT, 'fonts', font_name)
+    if not os.path.exists(path):
+        pytest.skip(f"{font_name} not bundled")
+    font = ImageFont.truetype(path, size)
+    metrics = image_engine.TextMetrics()
+    slack = size / 4  # getbbox covers glyph boxes, not just inked pixels
+
+    for text in METRIC_TEXTS:
+        expected = pixel_size(text, font, 4)
+        width, height = metrics.visual_size(font, text, 4)
+        assert expected[0] <= width <= expected[0] + slack, text
+        assert expected[1] <= height <= expected[1] + slack, text
+
+    pieces = ['2008', '  •  ', 'Drama, Krimi', '  •  ', 'FSK-16']
+    expected = pixel_run_width(pieces, font, 4)
+    assert expected <= metrics.run_width(font, pieces, 4) <= expected + slack
+
+def test_text_metrics_cache_is_bounded():
+    font = ImageFont.truetype(os.path.join(ROOT, 'fonts', METRIC_FONTS[0]), 40)
+    metrics = image_engine.TextMetrics(max_entries=16)
+    for i in range(100):
+        metrics.visual_size(font, f"Summary {i}", 4)
+    assert len(metrics._boxes) == 16
+    assert metrics.visual_size(font, ' ', 4) == (0, 0)
+
+def test_set_resolution_does_not_affect_running_render():
+    engine = image_engine.ImageGenerator(font_path=os.path.join('fonts', 'Roboto-Regular.ttf'), resolution='2160')
+    with engine.render_context():
+        fonts = engine.fonts
+        engine.set_resolution('1080')
+        assert engine.profile.name == '2160'
+        assert engine.fonts is fonts and fonts['title'].size == 190
+        assert engine.origin == (210, 200)
+    assert engine.profile.name == '1080'
+    assert engine.fonts['title'].size == engine.profile.px(190)
+
+def memory_engine():
+    engine = image_engine.ImageGenerator(font_path=os.path.join('fonts', 'Roboto-Regular.ttf'), resolution='1080')
+    engine.set_memory_budget(1 << 30)
+    return engine
+
+def test_memory_probe_not_started_outside_render():
+    tracemalloc = pytest.importorskip('tracemalloc')
+    assert not tracemalloc.is_tracing()
+    engine = memory_engine()
+    logo = Image.new('RGBA', (64, 32), (10, 10, 10, 255))
+    engine.ensure_high_contrast(logo)
+    assert not tracemalloc.is_tracing()
+
+def test_memory_probe_released_when_render_fails(artwork):
+    tracemalloc = pytest.importorskip('tracemalloc')
+    engine = memory_engine()
+    with pytest.raises(RuntimeError):
+        with engine.render_context():
+            engine.create_canvas(artwork)
+            assert tracemalloc.is_tracing()
+            raise RuntimeError("render failed")
+    assert not tracemalloc.is_tracing()
+
+    engine.create_canvas(artwork)  # no render_context: the failing traced method releases it
+    with pytest.raises(Exception):
+        engine.draw_summary(object())
+    assert not tracemalloc.is_tracing()
+
+def test_text_sprite_keeps_fill_alpha_and_layout_engine():
+    font = ImageFont.truetype(os.path.join(ROOT, 'fonts', 'Roboto-Regular.ttf'), 60)
+    cache = image_engine.TextSpriteCache()
+    sprite, _ = cache.get('Hi', font, (255, 0, 0, 128), (0, 0, 0, 0), 2, (10, 10))
+    assert sprite.getchannel('A').getextrema()[1] == 128
+    opaque, _ = cache.get('Hi', font, (255, 0, 0), (0, 0, 0, 0), 2, (10, 10))
+    assert opaque.getchannel('A').getextrema()[1] == 255
+
+    other = copy.copy(font)
+    other.layout_engine = ImageFont.Layout.RAQM if font.layout_engine == ImageFont.Layout.BASIC else ImageFont.Layout.BASIC
+    misses = cache.stats()['misses']
+    cache.get('Hi', other, (255, 0, 0), (0, 0, 0, 0), 2, (10, 10))
+    assert cache.stats()['misses'] == misses + 1
+
+def float_luminance_recolor(image, threshold):
+    """The previous decision: float mean of every non-transparent pixel."""
+    data = np.asarray(image.convert('RGBA'), dtype=np.float64)
+    opaque = data[data[..., 3] > 0]
+    if len(opaque) == 0:
+        return False
+    return (0.299 * opaque[:, 0] + 0.587 * opaque[:, 1] + 0.114 * opaque[:, 2]).mean() < threshold
+
+def striped_logo(size, period, bright=255, dark=0, bright_columns=1, phase=0):
+    """Opaque vertical stripes: `bright_columns` bright columns in every `period`."""
+    columns = np.where((np.arange(size[0]) - phase) % period < bright_columns, bright, dark).astype(np.uint8)
+    rgb = np.broadcast_to(columns[None, :, None], (size[1], size[0], 3))
+    alpha = np.full((size[1], size[0], 1), 255, dtype=np.uint8)
+    return Image.fromarray(np.concatenate([rgb, alpha], axis=2), 'RGBA')
+
+def luminance_logos():
+    for name in ['jellyfinlogo.png', 'plexlogo.png', 'plexlogo_color.png', 'tmdblogo.png', 'traktlogo.png']:
+        logo = Image.open(os.path.join(ROOT, name)).convert('RGBA')
+        yield name, logo
+        yield name + ' x12', logo.resize((logo.width * 12, logo.height * 12), Image.NEAREST)  # large enough to be sampled
+    yield 'stripes on the sample stride', striped_logo((1998, 1000), 6, phase=3)  # a strided sample sees only the bright columns
+    yield 'stripes at the threshold', striped_logo((2000, 1000), 2, bright=200)  # mean luminance exactly 100
+    yield 'stripes near the threshold', striped_logo((3001, 997), 3, bright=255, dark=20, bright_columns=1)
+    yield 'sparse bright details', striped_logo((4000, 800), 50, bright=255, dark=90, bright_columns=3)
+
+@pytest.mark.parametrize('threshold', [60, 100, 128])
+def test_ensure_high_contrast_matches_full_pixel_mean(threshold):
+    engine = image_engine.ImageGenerator(font_path=os.path.join('fonts', 'Roboto-Regular.ttf'), resolution='1080')
+    for name, logo in luminance_logos():
+        expected = float_luminance_recolor(logo, threshold)
+        result = engine.ensure_high_contrast(logo, threshold=threshold)
+        assert np.array_equal(np.asarray(result.getchannel('A')), np.asarray(logo.getchannel('A'))), name
+        recolored = not np.array_equal(np.asarray(result), np.asarray(logo))
+        assert recolored == expected, name
+
+def test_edge_color_cache_by_url_skips_the_source(artwork):
+    cache = image_engine.EdgeColorCache()
+    url = 'http://jellyfin/Items/1/Images/Backdrop?tag=abc'
+    assert cache.cached(url) is None
+    mean = cache.get(artwork, digest=url)
+    assert cache.cached(url) == mean == image_engine.edge_mean(artwork)
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+def budget_spec(style='color'):
+    with open(os.path.join(ROOT, 'background.jpg'), 'rb') as f:
+        artwork = f.read()
+    with open(os.path.join(ROOT, 'jellyfinlogo.png'), 'rb') as f:
+        logo = f.read()
+    return dict(artwork=artwork, logo=logo, title='Interstellar', tags=['2014', 'Drama', '2h 49min'],
+                summary='A team of explorers travel through a wormhole in space. ' * 5,
+                footer='Now available on Jellyfin', style=style)
+
+BUDGET_CHILD = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import image_engine
+from tests.test_image_engine import budget_spec
+engine = image_engine.ImageGenerator(font_path='fonts/Roboto-Regular.ttf', resolution='2160')
+footprint = engine.render_footprint()
+engine.set_memory_budget(footprint)
+memory = engine.render(budget_spec())['memory']
+print(json.dumps({"footprint": footprint, "memory": memory, "after": engine.render_footprint()}))
+"""
+
+def test_budget_render_stays_under_footprint():
+    # Fresh process, so the cold render (empty caches) is what gets measured
+    import json, subprocess, sys
+    out = subprocess.run([sys.executable, '-c', BUDGET_CHILD, ROOT], cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    memory = result["memory"]
+    if memory["peak_rss_delta"] is None:
+        pytest.skip("peak RSS cannot be reset here")
+    assert memory["render_peak"] == memory["peak_rss_delta"]
+    assert memory["render_peak"] <= result["footprint"] == memory["budget"]
+    assert result["after"] == result["footprint"]
+
+def test_budget_slots_follow_measured_peaks():
+    engine = memory_engine()
+    engine.set_memory_budget(engine.render_footprint() * 4)
+    assert engine.render_slots() == 4
+    memory = engine.render(budget_spec('plain'))['memory']
+    # Several slots share the process peak RSS: the render is measured by tracemalloc instead
+    assert memory["peak_rss_delta"] is None and memory["render_peak"] == memory["traced_peak"]
+
+    engine._measured_peaks[engine.profile.name] = engine.memory_budget // 2
+    assert engine.render_footprint() == engine.memory_budget // 2
+    assert engine.render_slots() == 2
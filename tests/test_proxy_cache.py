@@ -0,0 +1,37 @@
+import os
+
+from proxy_cache import ProxyCache
+
+URL = 'http://jellyfin/Items/{}/Images/Backdrop?api_key=secret'
+
+def fill(directory, count, size):
+    cache = ProxyCache(directory, max_bytes=count * size)
+    for i in range(count):
+        cache.put(URL.format(i), 'raw', b'x' * size, 'image/jpeg', {})
+    return cache
+
+def test_limits_set_after_construction_apply_before_load(tmp_path):
+    directory = str(tmp_path / 'cache')
+    fill(directory, 8, 1000)
+
+    cache = ProxyCache(directory, max_bytes=1000)  # the default, before the config is applied
+    assert len(os.listdir(directory)) == 16  # nothing loaded or evicted yet
+    cache.max_bytes = 8000
+    assert cache.stats()["entries"] == 8
+    assert cache.stats()["evictions"] == 0
+
+def test_construction_does_not_touch_disk(tmp_path):
+    directory = str(tmp_path / 'cache')
+    ProxyCache(directory)
+    assert not os.path.exists(directory)
+
+def test_lookup_drops_entries_removed_by_another_instance(tmp_path):
+    directory = str(tmp_path / 'cache')
+    server = fill(directory, 2, 1000)
+    assert server.get(URL.format(0)) is not None
+
+    other = ProxyCache(directory, max_bytes=1000)
+    other.put(URL.format(2), 'raw', b'y' * 1000, 'image/jpeg', {})  # evicts entries 0 and 1 from disk
+
+    assert server.get(URL.format(0)) is None
+    assert server.stats()["entries"] == 1 and server.stats()["bytes"] == 1000
@@ -1,4 +1,4 @@
-import requests
+import http_client
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, UnidentifiedImageError
 from io import BytesIO
 import os
@@ -9,6 +9,9 @@ from dotenv import load_dotenv
 
 load_dotenv(verbose=True)
 
+# --- IMPORT IMAGE ENGINE ---
+from image_engine import get_font, open_image
+
 # Replace with your actual Trakt API key, TMDB API Read Access Token, username, and list name
 TRAKT_API_KEY = os.getenv('TRAKT_API_KEY')
 TRAKT_USERNAME = os.getenv('TRAKT_USERNAME')
@@ -34,7 +37,7 @@ truetype_url = 'https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto
 truetype_path = 'Roboto-Light.ttf'
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = http_client.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -65,7 +68,7 @@ def get_trakt_movies_and_shows(api_key, username, list_name):
         "trakt-api-key": api_key
     }
 
-    response = requests.get(url, headers=traktheaders)
+    response = http_client.get(url, headers=traktheaders)
     if response.status_code == 200:
         items = response.json()
         movies = [(item['movie']['title'], item['movie']['ids']['tmdb']) for item in items if item['type'] == 'movie']
@@ -78,7 +81,7 @@ def get_trakt_movies_and_shows(api_key, username, list_name):
 # Function to fetch the logo for a movie or TV show from TMDB
 def get_logo(media_type, media_id, language="en"):
     logo_url = f"{TMDB_BASE_URL}{media_type}/{media_id}/images?language={language}"
-    logo_response = requests.get(logo_url, headers=tmdb_headers)
+    logo_response = http_client.get(logo_url, headers=tmdb_headers)
     logo_data = logo_response.json()
     if logo_response.status_code == 200:
         logos = logo_response.json().get("logos", [])
@@ -109,13 +112,13 @@ def resize_logo(image, width, height):
 # Function to get details of a TV show from TMDB
 def get_tv_show_details(tv_id):
     tv_details_url = f'{TMDB_BASE_URL}tv/{tv_id}?language=en-US'
-    tv_details_response = requests.get(tv_details_url, headers=tmdb_headers)
+    tv_details_response = http_client.get(tv_details_url, headers=tmdb_headers)
     return tv_details_response.json()
 
 # Function to get details of a movie from TMDB
 def get_movie_details(movie_id):
     movie_details_url = f'{TMDB_BASE_URL}movie/{movie_id}?language=en-US'
-    movie_details_response = requests.get(movie_details_url, headers=tmdb_headers)
+    movie_details_response = http_client.get(movie_details_url, headers=tmdb_headers)
     return movie_details_response.json()
 
 # Create a directory to save the backgrounds and clear its contents if it exists
@@ -151,18 +154,18 @@ def fetch_and_save_background_images(movies, shows):
             backdrop_path = show_data.get("backdrop_path")
             if backdrop_path:
                 image_url = f"https://image.tmdb.org/t/p/original{backdrop_path}"
-                image_response = requests.get(image_url)
+                image_response = http_client.get(image_url)
                 if image_response.status_code == 200:
-                    show_image = Image.open(BytesIO(image_response.content))
+                    show_image = open_image(image_response.content, min_height=1500)
                     show_image = resize_image(show_image, 1500)
                     bckg.paste(show_image, (bckg.width - show_image.width, 0))
                     draw = ImageDraw.Draw(bckg)
 
                     # Text font
-                    font_title = ImageFont.truetype(truetype_path, size=190)
-                    font_overview = ImageFont.truetype(truetype_path, size=50)
-                    font_custom = ImageFont.truetype(truetype_path, size=60)
-                    font_info = ImageFont.truetype(truetype_path, size=50)
+                    font_title = get_font(truetype_path, size=190)
+                    font_overview = get_font(truetype_path, size=50)
+                    font_custom = get_font(truetype_path, size=60)
+                    font_info = get_font(truetype_path, size=50)
 
                     # Text color
                     shadow_color = "black"
@@ -180,7 +183,7 @@ def fetch_and_save_background_images(movies, shows):
                     logo_path = get_logo(media_type, tmdb_id)
                     if logo_path:
                         logo_url = f"https://image.tmdb.org/t/p/original{logo_path}"
-                        logo_response = requests.get(logo_url)
+                        logo_response = http_client.get(logo_url)
                         if logo_response.status_code == 200:
                             try:
                                 logo_image = Image.open(BytesIO(logo_response.content))